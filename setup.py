@@ -10,7 +10,8 @@ setup(
     install_requires=[
         ''
         ,'fastapi==0.95.2'
-        ,'uvicorn==0.22.0'
+        ,'uvicorn[standard]==0.22.0'
+        ,'gunicorn==21.2.0'
         ,'opensearch-py==2.0.0'
         ,'pydantic==1.10.11'
         ,'langchain==0.0.332'
@@ -21,5 +22,8 @@ setup(
         ,'python-docx==0.8.11'
         ,'transformers==4.30.0'
         ,'torch==2.0.1'
+        ,'pyarrow==14.0.2'
+        ,'onnx==1.15.0'
+        ,'onnxruntime==1.16.3'
     ],
 )
@@ -1,16 +1,31 @@
 """
 This module provides functionality for creating OpenSearch indices.
 The script allows to create and configure indices to store the company-related data, templates and metrics.
+
+The index names of the configuration are served through aliases pointing to versioned indices (<alias>_v<version>):
+a full rebuild loads a new version with bulk-load settings (no refresh, no replica), restores the serving settings,
+force-merges it, then swaps the alias atomically, so that queries are never served by a partially loaded index.
+The previous versions kept for a rollback are marked by the alias <alias>_previous; the versions never served (e.g. of
+an interrupted rebuild) are deleted at the next swap.
+An update of the served indices (without rebuild) only disables their refresh while loading (see bulk_load_refresh).
 """
 
+import argparse
+import copy
+import re
+from contextlib import contextmanager
+from typing import Iterator
+
 from opensearchpy import OpenSearch
+from utils.client_management import get_client_registry
 from utils.config_management import Config
 from utils.log_management import log, log_error
+from utils.profiling_management import add_profile_argument, script_profile
 
 
 def instantiate_open_search_client(config: Config) -> OpenSearch:
     """
-    Create an OpenSearch client using configuration settings.
+    Get the OpenSearch client shared by the process (see utils.client_management).
 
     Args:
         config (Config): The configuration object to load settings from.
@@ -18,16 +33,7 @@ def instantiate_open_search_client(config: Config) -> OpenSearch:
     Returns:
         OpenSearch: The instantiated OpenSearch client.
     """
-    log("Creating OpenSearch client", "info")
-
-    open_search_client_config   = config.load_config(["open_search", "open_search_client_config"])
-    open_search_admin_login     = config.load_config(["open_search", "open_search_admin_login"])
-    open_search_admin_pwd       = config.load_config_secret_key(config_id_key='opensearch_admin_pwd_path')
-
-    # Format the opensearch config
-    open_search_client_config["http_auth"]  = (open_search_admin_login, open_search_admin_pwd)
-
-    return OpenSearch(**open_search_client_config)
+    return get_client_registry(config).open_search_client
 
 def create_index(client: OpenSearch, index_name: str, index_body: dict) -> None:
     """
@@ -49,21 +55,210 @@ def create_index(client: OpenSearch, index_name: str, index_body: dict) -> None:
         client.indices.create(index=index_name, body=index_body)
         log(f"Index name \"{index_name}\" created successfully", "info")
 
+INDEX_FIELD_TYPES = {"integer", "long", "float", "double", "scaled_float", "keyword", "text", "date", "boolean", "knn_vector"}
+
+
+def validate_index_body(index_name: str, index_body: dict) -> None:
+    """
+    Check that an index body has settings and typed mappings, and that the kNN fields are consistent with the settings.
+
+    Args:
+        index_name (str): The name of the index.
+        index_body (dict): The body of the index configuration.
+
+    Raises:
+        ValueError: If the index body is not valid.
+    """
+    settings    : dict = index_body.get("settings", {})
+    properties  : dict = index_body.get("mappings", {}).get("properties", {})
+    if not properties:
+        log_error(f"The index body of \"{index_name}\" has no mappings properties", exception_to_raise=ValueError)
+
+    for field_name, field_mapping in properties.items():
+        field_type = field_mapping.get("type")
+        if field_type not in INDEX_FIELD_TYPES:
+            log_error(f"Field \"{field_name}\" of index \"{index_name}\" has an unsupported type: {field_type}", exception_to_raise=ValueError)
+        if field_type == "scaled_float" and "scaling_factor" not in field_mapping:
+            log_error(f"Field \"{field_name}\" of index \"{index_name}\" is a scaled_float without scaling_factor", exception_to_raise=ValueError)
+        if field_type == "knn_vector":
+            if not isinstance(field_mapping.get("dimension"), int):
+                log_error(f"Field \"{field_name}\" of index \"{index_name}\" is a knn_vector without dimension", exception_to_raise=ValueError)
+            if not settings.get("index.knn"):
+                log_error(f"Index \"{index_name}\" has a knn_vector field but \"index.knn\" is not enabled", exception_to_raise=ValueError)
+
+
+def get_index_body(config: Config, index_key: str) -> dict:
+    """
+    Get the body of an index from the configuration. With lean company documents, the raw data lines are indexed
+    but excluded from the _source of the company documents (see models.raw_line_store).
+
+    Args:
+        config (Config): The configuration object to load settings from.
+        index_key (str): The key of the index in the database configuration (e.g. "company_data").
+
+    Returns:
+        dict: The body of the index.
+    """
+    index_body: dict = copy.deepcopy(config.load_config(["database", index_key, "index_body"]))
+    if index_key == "company_data" and config.load_config(["database", "company_data", "retrieval", "lean_documents"]):
+        source_excludes = index_body["mappings"].setdefault("_source", {}).setdefault("excludes", [])
+        source_excludes.append("raw_data_line")
+    return index_body
+
+
+def get_index_versions(client: OpenSearch, alias: str) -> list[str]:
+    """
+    Get the versioned indices of an alias, oldest first.
+    """
+    pattern = re.compile(re.escape(alias) + r'_v(\d+)$')
+    index_list = [index for index in client.indices.get(index=f"{alias}_v*", ignore_unavailable=True) if pattern.match(index)]
+    return sorted(index_list, key=lambda index: int(pattern.match(index).group(1)))
+
+
+def resolve_index_name(client: OpenSearch, index_name: str) -> str:
+    """
+    Get the index an alias points to, or the index name itself if it is not an alias (e.g. a versioned index).
+    """
+    if client.indices.exists_alias(name=index_name):
+        return next(iter(client.indices.get_alias(name=index_name)))
+    return index_name
+
+
+def create_versioned_index(client: OpenSearch, alias: str, index_body: dict, lifecycle_config: dict) -> str:
+    """
+    Create the next version of the index of an alias, with the bulk-load settings (see finalize_index to restore the serving settings).
+
+    Args:
+        client (OpenSearch): The OpenSearch client.
+        alias (str): The alias (index name of the configuration).
+        index_body (dict): The body of the index configuration.
+        lifecycle_config (dict): The 'index_lifecycle' section of the database configuration.
+
+    Returns:
+        str: The name of the created index.
+    """
+    validate_index_body(alias, index_body)
+
+    index_versions  = get_index_versions(client, alias)
+    version         = int(index_versions[-1].rsplit("_v", 1)[1]) + 1 if index_versions else 1
+    index_name      = f"{alias}_v{version}"
+
+    index_body = copy.deepcopy(index_body)
+    index_body.setdefault("settings", {}).update(lifecycle_config["bulk_load_settings"])
+
+    client.indices.create(index=index_name, body=index_body)
+    log(f"Index \"{index_name}\" created with the bulk-load settings", "info")
+    return index_name
+
+
+def finalize_index(client: OpenSearch, index_name: str, lifecycle_config: dict) -> None:
+    """
+    Restore the serving settings of an index loaded with the bulk-load settings, refresh and force-merge it.
+    """
+    log(f"Finalizing index \"{index_name}\"", "info")
+
+    client.indices.put_settings(index=index_name, body={"index": lifecycle_config["serving_settings"]})
+    client.indices.refresh(index=index_name)
+    client.indices.forcemerge(index=index_name, max_num_segments=lifecycle_config["force_merge_max_num_segments"],
+                              request_timeout=lifecycle_config["force_merge_timeout_s"])
+
+
+def previous_versions_alias(alias: str) -> str:
+    return f"{alias}_previous"
+
+
+def swap_alias(client: OpenSearch, alias: str, index_name: str, lifecycle_config: dict) -> list[str]:
+    """
+    Point an alias to a new index in a single atomic operation, then delete the versions older than the ones to keep.
+    The versions served until now are marked as previous versions (see previous_versions_alias): only these count in
+    the versions to keep, the older versions never served are deleted.
+
+    Args:
+        client (OpenSearch): The OpenSearch client.
+        alias (str): The alias (index name of the configuration).
+        index_name (str): The new index to serve through the alias.
+        lifecycle_config (dict): The 'index_lifecycle' section of the database configuration.
+
+    Returns:
+        list[str]: The deleted index versions.
+    """
+    previous_alias  = previous_versions_alias(alias)
+    actions         = [{"add": {"index": index_name, "alias": alias}}]
+
+    if client.indices.exists_alias(name=alias):
+        served_index_list = list(client.indices.get_alias(name=alias))
+        actions = [{"remove": {"index": index, "alias": alias}} for index in served_index_list] \
+            + [{"add": {"index": index, "alias": previous_alias}} for index in served_index_list] + actions
+    elif client.indices.exists(index=alias):
+        # Index created before the aliases were introduced: it must be removed for the alias to take its name
+        log(f"Replacing the concrete index \"{alias}\" with an alias", "warning")
+        actions = [{"remove_index": {"index": alias}}] + actions
+
+    client.indices.update_aliases(body={"actions": actions})
+    log(f"Alias \"{alias}\" now points to index \"{index_name}\"", "info")
+
+    previous_index_set = set(client.indices.get_alias(name=previous_alias)) if client.indices.exists_alias(name=previous_alias) else set()
+    index_versions  = get_index_versions(client, alias)
+    # The versions created after the new index (e.g. by a concurrent rebuild) are left untouched
+    older_versions  = index_versions[:index_versions.index(index_name)]
+    orphan_list     = [index for index in older_versions if index not in previous_index_set]
+    previous_list   = [index for index in older_versions if index in previous_index_set]
+    keep_count      = lifecycle_config["keep_previous_versions"]
+
+    deleted_index_list = orphan_list + (previous_list[:len(previous_list) - keep_count] if keep_count else previous_list)
+    for old_index in deleted_index_list:
+        log(f"Deleting the old index version \"{old_index}\"{' (never served)' if old_index in orphan_list else ''}", "info")
+        client.indices.delete(index=old_index)
+    return deleted_index_list
+
+
+@contextmanager
+def bulk_load_refresh(client: OpenSearch, index_name_list: list[str], lifecycle_config: dict) -> Iterator[None]:
+    """
+    Disable the refresh of served indices (the refresh_interval of the bulk-load settings) while documents are loaded
+    into them, then restore the serving refresh interval and refresh them, even if the load fails. In the meantime,
+    the queries are served with the documents of the last refresh.
+    The other bulk-load settings are not applied to served indices: removing their replicas would remove their
+    redundancy during the load and copy them again afterwards.
+    """
+    index_names = ",".join(index_name_list)
+    client.indices.put_settings(index=index_names,
+                                body={"index": {"refresh_interval": lifecycle_config["bulk_load_settings"]["refresh_interval"]}})
+    try:
+        yield
+    finally:
+        client.indices.put_settings(index=index_names,
+                                    body={"index": {"refresh_interval": lifecycle_config["serving_settings"]["refresh_interval"]}})
+        client.indices.refresh(index=index_names)
+
+
+def ensure_index(client: OpenSearch, alias: str, index_body: dict, lifecycle_config: dict) -> None:
+    """
+    Create the first version of the index of an alias if the alias (or a legacy index with the same name) does not exist.
+    """
+    if client.indices.exists(index=alias):
+        log(f"Index name \"{alias}\" exists already", "info")
+        return
+
+    index_name = create_versioned_index(client, alias, index_body, lifecycle_config)
+    finalize_index(client, index_name, lifecycle_config)
+    swap_alias(client, alias, index_name, lifecycle_config)
+
+
 if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Create the OpenSearch indices.")
+    add_profile_argument(_parser)
+    _args = _parser.parse_args()
+
     try:
         _config     : Config        = Config()
         _client     : OpenSearch    = instantiate_open_search_client(_config)
+        _lifecycle  : dict          = _config.load_config(["database", "index_lifecycle"])
 
-        _index_name : str           = _config.load_config(["database", "company_data", "index_name"])
-        _index_body : dict          = _config.load_config(["database", "company_data", "index_body"])
-        create_index(_client, _index_name, _index_body)
-
-        _index_name : str           = _config.load_config(["database", "metrics_data", "index_name"])
-        _index_body : dict          = _config.load_config(["database", "metrics_data", "index_body"])
-        create_index(_client, _index_name, _index_body)
-
-        _index_name : str           = _config.load_config(["database", "templates_data", "index_name"])
-        _index_body : dict          = _config.load_config(["database", "templates_data", "index_body"])
-        create_index(_client, _index_name, _index_body)
+        with script_profile(_config, "create_index_script", _args.profile):
+            for _index_key in ["company_data", "metrics_data", "templates_data"]:
+                _index_name : str       = _config.load_config(["database", _index_key, "index_name"])
+                _index_body : dict      = get_index_body(_config, _index_key)
+                ensure_index(_client, _index_name, _index_body, _lifecycle)
     except Exception as e:
         log_error(f"Failed to create index: {e}", exception_to_raise=RuntimeError)
@@ -0,0 +1,255 @@
+"""
+retrieval_tuning_script.py
+Offline harness tuning the retrieval parameters against the quality and the cost of the retrieved context. It replays a labelled question set against the OpenSearch indices and sweeps:
+    - for the company-related data: the number of fused hits ('size'), the number of kNN hits ('knn_k') and the
+      lexical score cutoff ('min_score');
+    - for the templates: the number of kNN hits ('knn_k').
+For each combination it reports the recall of the needed rows (templates), the prompt tokens of the retrieved
+context and the retrieval time, then recommends the cheapest combination reaching the target recall.
+
+The questions are generated from the company data files, parsed as at ingestion (see
+db_scripts.update_index_script.build_company_document): each data line holding a metric value for a period
+(see models.fact_store) gives the question "What was the <metric> in <period>?", whose needed rows are the lines of
+the company with this metric and period, and whose needed templates are the templates declared for the metric.
+Additional labelled questions can be given as a JSONL file (query, company_id, date, relevant_ids, relevant_templates).
+
+Run this script (see --help) once the indices are loaded.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from typing import Optional
+
+from db_scripts.update_index_script import build_company_document, company_document_id
+from models.conversation_session import estimate_token_count
+from models.llm_request_parser import RequestContext
+from models.llm_utils import get_embeddings
+from models.rag import RagHandler, build_metric_template_routes, reciprocal_rank_fusion
+from utils.config_management import Config
+from utils.log_management import log, log_error
+from utils.profiling_management import add_profile_argument, script_profile
+
+
+def build_labelled_questions(config: Config, templates_json: dict, metric_template_ids: dict[str, list[str]],
+                             questions_per_company: int, seed: int = 0) -> list[dict]:
+    """
+    Generate labelled questions from the company data files (see the module documentation).
+
+    Args:
+        config (Config): The configuration object to load settings from.
+        templates_json (dict): The json content of the template file.
+        metric_template_ids (dict[str, list[str]]): The IDs of the templates of each metric, by lowercase metric name.
+        questions_per_company (int): The maximum number of questions per company (sampled with the seed).
+        seed (int): The seed of the sampling.
+
+    Returns:
+        list[dict]: The questions: {"query", "company_id", "date", "relevant_ids", "relevant_templates"}.
+    """
+    company_data_path   : str = config.load_config(["paths", "company_data_path"])
+    sampler             : random.Random = random.Random(seed)
+    question_list       : list[dict] = []
+
+    for file_name in sorted(os.listdir(company_data_path)):
+        company_id = int(os.path.splitext(file_name)[0])
+        questions: dict[tuple[str, str], dict] = {}
+
+        with open(os.path.join(company_data_path, file_name), 'rb') as file:
+            offset = 0
+            for line in file:
+                data_line = line.decode("utf-8")
+                if not data_line.isspace() and data_line != "":
+                    # The lines are parsed as at ingestion, so that the labels match the indexed documents and facts
+                    _, fact = build_company_document(company_id, data_line, templates_json)
+                    if fact is not None:
+                        question = questions.setdefault((fact["metric"].lower(), fact["period"]), {
+                            "query"             : f"What was the {fact['metric']} in {fact['period']}?",
+                            "company_id"        : company_id,
+                            "date"              : fact["period"],
+                            "relevant_ids"      : [],
+                            "relevant_templates": metric_template_ids.get(fact["metric"].lower(), []),
+                        })
+                        question["relevant_ids"].append(company_document_id(company_id, offset))
+                offset += len(line)
+
+        company_questions = list(questions.values())
+        question_list += sampler.sample(company_questions, min(questions_per_company, len(company_questions)))
+
+    log(f"{len(question_list)} labelled questions generated from {company_data_path}", "info")
+    return question_list
+
+
+def load_labelled_questions(path: str) -> list[dict]:
+    """
+    Load labelled questions from a JSONL file (1 question per line, with the keys of build_labelled_questions).
+    """
+    with open(path, 'r') as questions_file:
+        return [json.loads(line) for line in questions_file if line.strip()]
+
+
+def recall(retrieved_ids: list[str], relevant_ids: list[str]) -> Optional[float]:
+    if not relevant_ids:
+        return None
+    return len(set(retrieved_ids) & set(relevant_ids)) / len(set(relevant_ids))
+
+
+def summarize(results: list[dict]) -> dict:
+    """
+    Average the per-question results of a combination (the questions without labels are ignored for the recall).
+    """
+    recall_list = [result["recall"] for result in results if result["recall"] is not None]
+    time_list   = sorted(result["time_ms"] for result in results)
+    return {
+        "recall"        : sum(recall_list) / len(recall_list) if recall_list else 0.0,
+        "prompt_tokens" : sum(result["prompt_tokens"] for result in results) / len(results),
+        "time_ms_p50"   : time_list[len(time_list) // 2],
+        "time_ms_p95"   : time_list[min(len(time_list) - 1, int(len(time_list) * 0.95))],
+    }
+
+
+def sweep_company_data(rag_handler: RagHandler, question_list: list[dict], embeddings: list, grid: dict[str, list]) -> list[dict]:
+    """
+    Replay the questions with each combination of the company data retrieval parameters.
+
+    Returns:
+        list[dict]: For each combination, its parameters and its summary (see summarize).
+    """
+    company_index   : str = rag_handler.config.load_config(["database", "company_data", "index_name"])
+    base_config     : dict = dict(rag_handler.company_retrieval_config)
+    report          : list[dict] = []
+
+    for size, knn_k, min_score in itertools.product(grid["size"], grid["knn_k"], grid["min_score"]):
+        parameters = {"size": size, "knn_k": knn_k, "min_score": min_score}
+        rag_handler.company_retrieval_config = {**base_config, **parameters}
+
+        results = []
+        for question, embedding in zip(question_list, embeddings):
+            request_context = RequestContext(company_id=question["company_id"], date=question["date"], query=question["query"])
+
+            start       = time.perf_counter()
+            hit_lists   = rag_handler.multi_search(company_index, rag_handler.build_company_data_queries(request_context, embedding))
+            hits        = reciprocal_rank_fusion(hit_lists, rrf_k=base_config["rrf_k"], size=size)
+            elapsed_ms  = 1000 * (time.perf_counter() - start)
+
+            data_lines  = rag_handler.fuse_company_data_hits(hit_lists)
+            results.append({
+                "recall"        : recall([hit["_id"] for hit in hits], question["relevant_ids"]),
+                "prompt_tokens" : estimate_token_count("".join(data_lines)),
+                "time_ms"       : elapsed_ms,
+            })
+
+        report.append({"parameters": parameters, **summarize(results)})
+        log(f"Company data {report[-1]}", "info")
+
+    rag_handler.company_retrieval_config = base_config
+    return report
+
+
+def sweep_templates(rag_handler: RagHandler, question_list: list[dict], embeddings: list, knn_k_list: list[int]) -> list[dict]:
+    """
+    Replay the questions with each number of kNN template hits.
+
+    Returns:
+        list[dict]: For each number of hits, its parameters and its summary (see summarize).
+    """
+    templates_index : str = rag_handler.config.load_config(["database", "templates_data", "index_name"])
+    base_config     : dict = dict(rag_handler.templates_retrieval_config)
+    report          : list[dict] = []
+
+    for knn_k in knn_k_list:
+        rag_handler.templates_retrieval_config = {**base_config, "knn_k": knn_k}
+
+        start       = time.perf_counter()
+        hit_lists   = rag_handler.multi_search(templates_index, [rag_handler.build_templates_query(embedding) for embedding in embeddings])
+        elapsed_ms  = 1000 * (time.perf_counter() - start) / len(question_list)
+
+        results = [{
+            "recall"        : recall([hit["_id"] for hit in hits], question["relevant_templates"]),
+            "prompt_tokens" : estimate_token_count(json.dumps([hit["_source"] for hit in hits])),
+            "time_ms"       : elapsed_ms,
+        } for question, hits in zip(question_list, hit_lists)]
+
+        report.append({"parameters": {"knn_k": knn_k}, **summarize(results)})
+        log(f"Templates {report[-1]}", "info")
+
+    rag_handler.templates_retrieval_config = base_config
+    return report
+
+
+def recommend(report: list[dict], target_recall: float) -> dict:
+    """
+    Recommend the combination with the fewest prompt tokens (then the fastest) among those reaching the target
+    recall, or the combination with the best recall if none reaches it.
+    """
+    eligible = [entry for entry in report if entry["recall"] >= target_recall]
+    if not eligible:
+        log(f"No combination reaches the target recall {target_recall}: recommending the best recall", "warning")
+        return max(report, key=lambda entry: (entry["recall"], -entry["prompt_tokens"]))
+    return min(eligible, key=lambda entry: (entry["prompt_tokens"], entry["time_ms_p50"]))
+
+
+def tune_retrieval(config: Config, question_list: list[dict], company_grid: dict[str, list],
+                   templates_knn_k_list: list[int], target_recall: float) -> dict:
+    """
+    Sweep the retrieval parameters and recommend the configuration values.
+
+    Returns:
+        dict: The reports of the sweeps and the recommended configuration values (to be merged in config.json).
+    """
+    rag_handler = RagHandler(config)
+    embeddings  = list(get_embeddings(config, [question["query"] for question in question_list]))
+
+    company_report      = sweep_company_data(rag_handler, question_list, embeddings, company_grid)
+    templates_report    = sweep_templates(rag_handler, question_list, embeddings, templates_knn_k_list)
+
+    return {
+        "company_data"  : company_report,
+        "templates"     : templates_report,
+        "recommended"   : {
+            "database": {
+                "company_data"  : {"retrieval": recommend(company_report, target_recall)["parameters"]},
+                "templates_data": {"retrieval": recommend(templates_report, target_recall)["parameters"]},
+            }
+        },
+    }
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Tune the retrieval parameters on a labelled question set.")
+    _parser.add_argument("--questions",             help="JSONL file of additional labelled questions")
+    _parser.add_argument("--questions-per-company", type=int,   default=20)
+    _parser.add_argument("--sizes",                 type=int,   nargs="+", default=[2, 4, 6, 8, 10, 15, 20])
+    _parser.add_argument("--knn-ks",                type=int,   nargs="+", default=[5, 10, 20, 40])
+    _parser.add_argument("--min-scores",            type=float, nargs="+", default=[0, 1, 2, 5])
+    _parser.add_argument("--template-knn-ks",       type=int,   nargs="+", default=[1, 2, 3, 4, 5])
+    _parser.add_argument("--target-recall",         type=float, default=0.95)
+    _parser.add_argument("--output",                default="data/retrieval_tuning.json")
+    add_profile_argument(_parser)
+    _args = _parser.parse_args()
+
+    try:
+        _config = Config()
+        with open(_config.load_config(["paths", "templates_data_path"]), 'r') as _templates_file:
+            _templates_json = json.load(_templates_file)
+        with open(_config.load_config(["paths", "metrics_data_path"]), 'r') as _metrics_file:
+            _metric_template_ids = {_metric: [_hit["_id"] for _hit in _hits] for _metric, _hits
+                                    in build_metric_template_routes(json.load(_metrics_file), _templates_json).items()}
+
+        _question_list = build_labelled_questions(_config, _templates_json, _metric_template_ids, _args.questions_per_company)
+        if _args.questions:
+            _question_list += load_labelled_questions(_args.questions)
+
+        with script_profile(_config, "retrieval_tuning_script", _args.profile):
+            _result = tune_retrieval(_config, _question_list,
+                                     company_grid            = {"size": _args.sizes, "knn_k": _args.knn_ks, "min_score": _args.min_scores},
+                                     templates_knn_k_list    = _args.template_knn_ks,
+                                     target_recall           = _args.target_recall)
+
+        with open(_args.output, 'w') as _output_file:
+            json.dump(_result, _output_file, indent=4)
+        log(f"Recommended configuration values: {json.dumps(_result['recommended'])} (full report in {_args.output})", "info")
+    except Exception as _e:
+        log_error(f"Failed to tune the retrieval: {_e}", exception_to_raise=RuntimeError)
@@ -1,65 +1,169 @@
 """
 update_index_script.py
 Connects to an existing opensearch service and updates it with the learning data related to the companies, the metrics and the templates.
+With the --rebuild option, the data is loaded into new versions of the indices, which replace the served ones once
+complete (see db_scripts.create_index_script): the queries are served by the previous indices during the whole rebuild.
 """
 
+import argparse
 import os
-from opensearchpy import OpenSearch
+from typing import Optional
+
+from opensearchpy import OpenSearch, helpers
 import json
 
-from db_scripts.create_index_script import instantiate_open_search_client
+from db_scripts.create_index_script import bulk_load_refresh, create_versioned_index, finalize_index, get_index_body, \
+    instantiate_open_search_client, resolve_index_name, swap_alias
+from db_scripts.warm_up_answers_script import warm_up_answers_after_ingestion
 from utils.config_management import log, log_error
 from utils.config_management import Config
-from models.llm_utils import get_embedding
+from models.fact_store import extract_fact, write_fact_table
+from models.llm_utils import get_embedding, get_embeddings
+from models.raw_line_store import RawLineStore
+from models.retrieval_cache import METRICS_AND_TEMPLATES_GENERATION, RetrievalCache, company_generation_name
+from utils.profiling_management import add_profile_argument, script_profile
 from utils.template_management import match_company_data_line_with_template
+from utils.value_normalization import normalize_key_word_values
+
+
+def build_company_document(company_id: int, data_line: str, templates_json: dict) -> tuple[dict, Optional[dict]]:
+    """
+    Build the document indexed for a company-related data line, and the fact extracted from it (see models.fact_store).
+
+    Args:
+        company_id (int): The identifier of the company.
+        data_line (str): The data line.
+        templates_json (dict): The json content of the template file.
+
+    Returns:
+        tuple[dict, Optional[dict]]: The document, and the fact or None if the line does not hold a metric value.
+    """
+    _, key_word_values = match_company_data_line_with_template(data_line, templates_json)
+    assert("company_id"     not in key_word_values)
+    assert("raw_data_line"  not in key_word_values)
+    fact = extract_fact(company_id, key_word_values)
+
+    key_word_values.update(normalize_key_word_values(key_word_values))
+    key_word_values["company_id"]       = company_id
+    key_word_values["raw_data_line"]    = data_line
+    return key_word_values, fact
+
+
+def company_document_id(company_id: int, offset: int) -> str:
+    """
+    Get the ID of the document of a data line, from its position in the company file: uploading the same line again
+    overwrites its document instead of duplicating it.
+    """
+    return f"{company_id}:{offset}"
+
+
+def index_company_documents(config: Config, client: OpenSearch, index_name: str, documents: dict[str, dict],
+                            replace_raw_lines: bool = False) -> None:
+    """
+    Index company-related documents with the bulk API. If the vector search is enabled, the data lines are embedded
+    in batches and indexed with their embedding. With lean documents, the data lines are stored in the raw line store
+    segments of the index and the documents hold their position in the store (see models.raw_line_store).
+
+    Args:
+        config (Config): The configuration object to load settings from.
+        client (OpenSearch): The OpenSearch client.
+        index_name (str): The index to load.
+        documents (dict[str, dict]): The documents by ID (see company_document_id).
+        replace_raw_lines (bool): If True, the documents are all the documents of their companies: their lines replace
+            the segments of the companies instead of being appended to them.
+    """
+    retrieval_config    : dict = config.load_config(["database", "company_data", "retrieval"])
+    batch_size          : int = retrieval_config["embedding_batch_size"]
+    document_items      : list[tuple[str, dict]] = list(documents.items())
+
+    if retrieval_config["lean_documents"]:
+        raw_line_store      : RawLineStore = RawLineStore(config.load_config(["paths", "raw_line_store_path"]))
+        # The segments belong to the index version the alias points to, and are deleted with it
+        segment_index_name  : str = resolve_index_name(client, index_name)
+        store_lines = raw_line_store.replace if replace_raw_lines else raw_line_store.append
+        for company_id in {document["company_id"] for document in documents.values()}:
+            company_documents = [document for document in documents.values() if document["company_id"] == company_id]
+            position_list = store_lines(segment_index_name, company_id, [document["raw_data_line"] for document in company_documents])
+            for document, (offset, length) in zip(company_documents, position_list):
+                document["raw_data_line_offset"], document["raw_data_line_length"] = offset, length
+
+    for batch_start in range(0, len(document_items), batch_size):
+        document_batch = document_items[batch_start: batch_start + batch_size]
+        if retrieval_config["vector_search"]:
+            embeddings = get_embeddings(config, [document["raw_data_line"] for _, document in document_batch])
+            for (_, document), embedding in zip(document_batch, embeddings):
+                document["raw_data_line_embedding"] = embedding.tolist()
 
+        helpers.bulk(client, [{"_index": index_name, "_id": document_id, "_source": document}
+                              for document_id, document in document_batch])
 
-def upload_company_data(config: Config, client: OpenSearch, templates_json: dict) -> None:
+
+def upload_company_data(config: Config, client: OpenSearch, templates_json: dict, index_name: Optional[str] = None) -> list[int]:
     """
     Upload learning data documents to an existing OpenSearch index.
-    Use the keyword values in each data line as metadata
+    Use the keyword values in each data line as metadata, along with their typed versions (numbers in base units,
+    period start/end dates) so that OpenSearch can range-filter and sort them.
+    The typed facts extracted from the data lines are also written to the fact table (see models.fact_store).
+    If the vector search is enabled, the data lines are embedded in batches and indexed with their embedding.
 
     Args:
         config (Config): The configuration object to load settings from.
         client (OpenSearch): The OpenSearch client.
         templates_json (dict): The json content of the template file.
+        index_name (Optional[str]): The index to load, by default the index name of the configuration.
+
+    Returns:
+        list[int]: The IDs of the uploaded companies.
     """
-    index_name          : str = config.load_config(["database", "company_data", "index_name"])
+    index_name          : str = index_name or config.load_config(["database", "company_data", "index_name"])
     company_data_path   : str = config.load_config(["paths", "company_data_path"])
+    fact_store_path     : str = config.load_config(["paths", "fact_store_path"])
+    fact_list           : list[dict] = []
+    company_id_list     : list[int] = []
 
     log(f"Uploading company-related documents from {company_data_path} to index {index_name}", "info")
 
     for file_name in os.listdir(company_data_path):
         file_path = os.path.join(company_data_path, file_name)
         log(f"\n\nProcessing file: {file_path}", "info")
-        doc_id = os.path.splitext(file_name)[0]
-
-        with open(file_path, 'r') as file:
-            for data_line in file:
-                if data_line.isspace() or data_line == "":
-                    continue
-                _, key_word_values = match_company_data_line_with_template(data_line, templates_json)
-                assert("company_id"     not in key_word_values)
-                assert("raw_data_line"  not in key_word_values)
-                key_word_values["company_id"]       = int(doc_id)
-                key_word_values["raw_data_line"]    = data_line
-
-                client.index(index=index_name, body=key_word_values)
-        log(f"Document {doc_id} indexed successfully", "info")
-
-def upload_metrics_and_templates_data(config: Config, client: OpenSearch) -> dict:
+        company_id = int(os.path.splitext(file_name)[0])
+        documents: dict[str, dict] = {}
+
+        with open(file_path, 'rb') as file:
+            offset = 0
+            for line in file:
+                data_line = line.decode("utf-8")
+                if not data_line.isspace() and data_line != "":
+                    document, fact = build_company_document(company_id, data_line, templates_json)
+                    documents[company_document_id(company_id, offset)] = document
+                    if fact is not None:
+                        fact_list.append(fact)
+                offset += len(line)
+
+        index_company_documents(config, client, index_name, documents, replace_raw_lines=True)
+        company_id_list.append(company_id)
+        log(f"Document {company_id} indexed successfully", "info")
+
+    write_fact_table(fact_store_path, fact_list)
+    return company_id_list
+
+
+def upload_metrics_and_templates_data(config: Config, client: OpenSearch, index_name_metrics: Optional[str] = None,
+                                      index_name_templates: Optional[str] = None) -> dict:
     """
     Upload metrics data documents to an existing OpenSearch index.
 
     Args:
         config (Config): The configuration object to load settings from.
         client (OpenSearch): The OpenSearch client.
+        index_name_metrics (Optional[str]): The metrics index to load, by default the index name of the configuration.
+        index_name_templates (Optional[str]): The templates index to load, by default the index name of the configuration.
 
     Returns:
         dict: the content of the template file.
     """
-    index_name_metrics      : str = config.load_config(["database", "metrics_data",     "index_name"])
-    index_name_templates    : str = config.load_config(["database", "templates_data",   "index_name"])
+    index_name_metrics      : str = index_name_metrics   or config.load_config(["database", "metrics_data",     "index_name"])
+    index_name_templates    : str = index_name_templates or config.load_config(["database", "templates_data",   "index_name"])
     path_metrics            : str  = config.load_config(["paths", "metrics_data_path"])
     path_templates          : str  = config.load_config(["paths", "templates_data_path"])
 
@@ -76,7 +180,7 @@ def upload_metrics_and_templates_data(config: Config, client: OpenSearch) -> dic
             log(f"\t Uploading {key}", "info")
             if extra_param_embedding:
                 value[extra_param_embedding] = embedding
-            client.index(index=index_name, id=key, body=value)
+        helpers.bulk(client, [{"_index": index_name, "_id": key, "_source": value} for key, value in content.items()])
         return content
 
     _   = upload_file(index_name_metrics,     path_metrics)
@@ -85,13 +189,79 @@ def upload_metrics_and_templates_data(config: Config, client: OpenSearch) -> dic
     return res
 
 
+def invalidate_retrieval_cache(config: Config, company_id_list: list[int]) -> None:
+    """
+    Bump the retrieval cache generations of the updated companies and of the metrics and templates (see
+    models.retrieval_cache), once the uploaded data are searchable.
+    """
+    retrieval_cache = RetrievalCache(config)
+    retrieval_cache.bump_generation(METRICS_AND_TEMPLATES_GENERATION)
+    for company_id in company_id_list:
+        retrieval_cache.bump_generation(company_generation_name(company_id))
+
+
+def rebuild_indices(config: Config, client: OpenSearch) -> list[int]:
+    """
+    Load all the data into new versions of the indices with the bulk-load settings, then finalize them and swap the
+    aliases so that the queries switch to the new indices at once.
+
+    Returns:
+        list[int]: The IDs of the uploaded companies.
+    """
+    lifecycle_config    : dict              = config.load_config(["database", "index_lifecycle"])
+    new_index_names     : dict[str, str]    = {}
+
+    for index_key in ["company_data", "metrics_data", "templates_data"]:
+        alias       : str   = config.load_config(["database", index_key, "index_name"])
+        index_body  : dict  = get_index_body(config, index_key)
+        new_index_names[alias] = create_versioned_index(client, alias, index_body, lifecycle_config)
+
+    templates_json = upload_metrics_and_templates_data(
+        config, client,
+        index_name_metrics      = new_index_names[config.load_config(["database", "metrics_data",   "index_name"])],
+        index_name_templates    = new_index_names[config.load_config(["database", "templates_data", "index_name"])],
+    )
+    company_id_list = upload_company_data(config, client, templates_json,
+                                          index_name=new_index_names[config.load_config(["database", "company_data", "index_name"])])
+
+    for alias, index_name in new_index_names.items():
+        finalize_index(client, index_name, lifecycle_config)
+    raw_line_store = RawLineStore(config.load_config(["paths", "raw_line_store_path"]))
+    for alias, index_name in new_index_names.items():
+        for deleted_index in swap_alias(client, alias, index_name, lifecycle_config):
+            raw_line_store.delete_index(deleted_index)
+
+    invalidate_retrieval_cache(config, company_id_list)
+    return company_id_list
+
+
 if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Upload the learning data to the OpenSearch indices.")
+    _parser.add_argument("--rebuild", action="store_true",
+                         help="load the data into new versions of the indices and swap them in once complete")
+    _parser.add_argument("--warm-up", action="store_true",
+                         help="precompute the answers invalidated by the update (see db_scripts.warm_up_answers_script)")
+    add_profile_argument(_parser)
+    _args = _parser.parse_args()
+
     try:
         _config : Config      = Config()
         _client : OpenSearch  = instantiate_open_search_client(_config)
 
-        _templates_json: dict = upload_metrics_and_templates_data(_config, _client)
-        upload_company_data(_config, _client, _templates_json)
+        with script_profile(_config, "update_index_script", _args.profile):
+            if _args.rebuild:
+                _company_id_list = rebuild_indices(_config, _client)
+            else:
+                _index_names = [_config.load_config(["database", _index_key, "index_name"])
+                                for _index_key in ["company_data", "metrics_data", "templates_data"]]
+                with bulk_load_refresh(_client, _index_names, _config.load_config(["database", "index_lifecycle"])):
+                    _templates_json     : dict      = upload_metrics_and_templates_data(_config, _client)
+                    _company_id_list    : list[int] = upload_company_data(_config, _client, _templates_json)
+
+                invalidate_retrieval_cache(_config, _company_id_list)
+
+            # Regenerate the precomputed answers invalidated by the new data
+            warm_up_answers_after_ingestion(_config, _company_id_list, requested=_args.warm_up)
     except FileNotFoundError as e:
         log_error(f"File not found: {e}", exception_to_raise=RuntimeError)
     except Exception as e:
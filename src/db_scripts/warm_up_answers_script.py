@@ -0,0 +1,137 @@
+"""
+warm_up_answers_script.py
+Warm-up job of the precomputed answers: answers the questions of the catalog (paths.question_catalog_path) for the
+companies they are listed for, through the normal answer pipeline, and stores the answers in the answer store served by
+the /query endpoint on exact match (see models.answer_store).
+
+    - The catalog is a list of {"company_ids": [int], "questions": [str]} groups: each question is answered for each
+      company of its group (typically the companies with the most traffic and their standard questions).
+    - The answers still current (generated with the current data and answer pipeline) are not generated again: the job
+      only calls the LLM for the companies updated since its last run.
+    - The LLM calls are issued with a concurrency bounded by precomputed_answers.warm_up_max_concurrency.
+    - The answers of the questions removed from the catalog are deleted.
+
+The job runs after an ingestion run of update_index_script that updated companies, if requested (--warm-up option or
+precomputed_answers.warm_up_after_ingestion, off by default as it calls the LLM), and can be scheduled on its own.
+"""
+
+import argparse
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from models.answer_store import answer_key
+from models.llm_request_answerer import LlmRequestAnswerer
+from models.llm_utils import QueryRequest
+from utils.config_management import Config
+from utils.log_management import log, log_error
+from utils.profiling_management import add_profile_argument, script_profile
+
+
+def load_question_catalog(path: str) -> list[QueryRequest]:
+    """
+    Load the question catalog (see the module documentation).
+
+    Returns:
+        list[QueryRequest]: The query requests to answer, without duplicates.
+    """
+    with open(path, 'r') as catalog_file:
+        catalog: list[dict] = json.load(catalog_file)
+
+    requests: dict[str, QueryRequest] = {}
+    for group in catalog:
+        for company_id in group["company_ids"]:
+            for question in group["questions"]:
+                requests.setdefault(answer_key(company_id, question), QueryRequest(query=question, company_id=company_id))
+    return list(requests.values())
+
+
+def is_answer_current(llm_request_answerer: LlmRequestAnswerer, request: QueryRequest) -> bool:
+    """
+    Check whether the answer stored for a request was generated with the current version (uncounted lookup).
+    """
+    version = llm_request_answerer.answer_version(request.company_id)
+    return llm_request_answerer.answer_store.get(request.company_id, request.query, version, count=False) is not None
+
+
+def warm_up_answer(llm_request_answerer: LlmRequestAnswerer, request: QueryRequest) -> bool:
+    """
+    Generate and store the answer to a request, unless the stored answer is still current.
+
+    Returns:
+        bool: True if the answer was generated.
+    """
+    answer_store = llm_request_answerer.answer_store
+    # The version must be read before answering: an answer generated while the data are updated is stored under the
+    # previous version, and generated again by the next run
+    version = llm_request_answerer.answer_version(request.company_id)
+    if answer_store.get(request.company_id, request.query, version, count=False) is not None:
+        return False
+
+    response = llm_request_answerer.handle_stateless_query(request)
+    answer_store.put(request.company_id, request.query, version, response)
+    return True
+
+
+def warm_up_answers(config: Config, llm_request_answerer: LlmRequestAnswerer) -> dict:
+    """
+    Answer the questions of the catalog and store the answers (see the module documentation).
+
+    Returns:
+        dict: The number of generated, current (not generated again) and failed answers.
+    """
+    request_list    : list[QueryRequest] = load_question_catalog(config.load_config(["paths", "question_catalog_path"]))
+    max_concurrency : int = config.load_config(["precomputed_answers", "warm_up_max_concurrency"])
+    stale_list      : list[QueryRequest] = [request for request in request_list
+                                            if not is_answer_current(llm_request_answerer, request)]
+    counts          : dict[str, int] = {"generated": 0, "current": len(request_list) - len(stale_list), "failed": 0}
+
+    if stale_list:
+        log(f"Warming up the answers to {len(stale_list)} of the {len(request_list)} catalog questions "
+            f"(max concurrency {max_concurrency})", "info")
+    else:
+        log(f"The answers to the {len(request_list)} catalog questions are current: nothing to warm up", "info")
+    with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+        futures = [executor.submit(warm_up_answer, llm_request_answerer, request) for request in stale_list]
+        for request, future in zip(stale_list, futures):
+            try:
+                counts["generated" if future.result() else "current"] += 1
+            except Exception as e:
+                log_error(f"Failed to warm up the answer to \"{request.query}\" for company_id {request.company_id}: {e}")
+                counts["failed"] += 1
+
+    llm_request_answerer.answer_store.delete_other_keys([answer_key(request.company_id, request.query) for request in request_list])
+    log(f"Answer warm-up done: {counts}", "info")
+    return counts
+
+
+def warm_up_answers_after_ingestion(config: Config, company_id_list: list[int], requested: bool = False) -> None:
+    """
+    Run the warm-up job at the end of an ingestion run, if requested (or enabled by
+    precomputed_answers.warm_up_after_ingestion) and if the run updated companies (otherwise no answer was invalidated).
+    """
+    if not config.load_config(["precomputed_answers", "enabled"]):
+        return
+    if not (requested or config.load_config(["precomputed_answers", "warm_up_after_ingestion"])):
+        return
+    if not company_id_list:
+        log("No company updated: the precomputed answers are still current", "info")
+        return
+    warm_up_answers(config, LlmRequestAnswerer(config))
+
+
+if __name__ == "__main__":
+    _parser = argparse.ArgumentParser(description="Precompute the answers to the questions of the catalog.")
+    add_profile_argument(_parser)
+    _args = _parser.parse_args()
+
+    try:
+        _config: Config = Config()
+        if not _config.load_config(["precomputed_answers", "enabled"]):
+            log_error("The precomputed answers are disabled (precomputed_answers.enabled)", exception_to_raise=RuntimeError)
+
+        with script_profile(_config, "warm_up_answers_script", _args.profile):
+            _counts = warm_up_answers(_config, LlmRequestAnswerer(_config))
+        if _counts["failed"]:
+            log_error(f"{_counts['failed']} answers could not be warmed up", exception_to_raise=RuntimeError)
+    except FileNotFoundError as e:
+        log_error(f"File not found: {e}", exception_to_raise=RuntimeError)
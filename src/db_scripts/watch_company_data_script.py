@@ -0,0 +1,258 @@
+"""
+watch_company_data_script.py
+Long-running ingestion daemon: watches the company data directory and indexes the data lines appended to the company
+files within seconds, instead of reloading the whole directory with update_index_script.
+
+    - The directory is watched with inotify when the inotify_simple package is available, otherwise polled.
+    - Only the company files (named <company_id>.txt) are read, the other files of the directory are ignored.
+    - Each file is read from the byte offset reached so far: only the complete lines appended since are processed.
+      On the first start (no checkpoint), the files are assumed to be indexed by update_index_script: they are read
+      from their current size, and the files created afterwards from the start.
+      A file that is truncated or replaced is read again from the start (the documents of its removed lines are kept
+      until the next full reload).
+    - The new documents are indexed in bulk when enough of them are pending or the oldest has waited long enough.
+    - The offsets are checkpointed after each bulk indexing. After a crash, the lines read since the last checkpoint are
+      read again: their documents are overwritten, not duplicated (the document IDs are derived from the offsets).
+"""
+
+import json
+import os
+import re
+import signal
+import time
+from typing import Optional
+
+from opensearchpy import OpenSearch
+
+from db_scripts.create_index_script import instantiate_open_search_client
+from db_scripts.update_index_script import build_company_document, company_document_id, index_company_documents
+from models.fact_store import append_fact_table
+from models.retrieval_cache import RetrievalCache, company_generation_name
+from utils.config_management import Config
+from utils.log_management import log, log_error
+
+COMPANY_FILE_PATTERN = re.compile(r"^\d+\.txt$")
+
+
+def load_checkpoint(path: str) -> dict[str, dict]:
+    """
+    Load the checkpointed read positions of the company files: {file name: {"inode": int, "offset": int}}.
+    """
+    if not os.path.isfile(path):
+        return {}
+    with open(path, 'r') as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(path: str, checkpoint: dict[str, dict]) -> None:
+    """
+    Save the read positions of the company files. The file is replaced atomically.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(path + ".tmp", path)
+
+
+def current_positions(company_data_path: str) -> dict[str, dict]:
+    """
+    Get the positions of the end of the company files, to start reading them from there.
+    """
+    positions = {}
+    for file_name in os.listdir(company_data_path):
+        file_path = os.path.join(company_data_path, file_name)
+        if COMPANY_FILE_PATTERN.match(file_name) and os.path.isfile(file_path):
+            stat = os.stat(file_path)
+            positions[file_name] = {"inode": stat.st_ino, "offset": stat.st_size}
+    return positions
+
+
+def read_new_lines(file_path: str, offset: int, max_bytes: int) -> tuple[list[tuple[int, str]], int]:
+    """
+    Read the complete lines of a file from a byte offset (an incomplete last line is left for the next read).
+
+    Args:
+        file_path (str): The path of the file.
+        offset (int): The byte offset to read from.
+        max_bytes (int): The maximum number of bytes to read.
+
+    Returns:
+        tuple[list[tuple[int, str]], int]: The (offset, line) read, and the offset following the last complete line.
+    """
+    with open(file_path, 'rb') as file:
+        file.seek(offset)
+        data = file.read(max_bytes)
+
+    end = data.rfind(b"\n") + 1
+    line_list = []
+    line_offset = offset
+    # Split on "\n" only, as the file iteration of update_index_script, so that both derive the same document IDs
+    for line in data[:end].split(b"\n")[:-1]:
+        line_list.append((line_offset, line.decode("utf-8") + "\n"))
+        line_offset += len(line) + 1
+    return line_list, offset + end
+
+
+class DirectoryWatcher:
+    """
+    Waits for changes in a directory: with inotify if the inotify_simple package is available, otherwise by polling.
+    """
+
+    def __init__(self, path: str, poll_interval_s: float):
+        self.poll_interval_s    : float = poll_interval_s
+        self.inotify                    = None
+        try:
+            from inotify_simple import INotify, flags
+
+            self.inotify = INotify()
+            self.inotify.add_watch(path, flags.MODIFY | flags.CLOSE_WRITE | flags.CREATE | flags.MOVED_TO)
+            log(f"Watching {path} with inotify", "info")
+        except (ImportError, OSError) as e:
+            log(f"inotify not available ({e}): polling {path} every {poll_interval_s}s", "info")
+
+    def wait(self, timeout_s: float) -> None:
+        """
+        Wait until a file of the directory changes (inotify) or for the poll interval, at most timeout_s.
+        """
+        timeout_s = max(0.0, min(timeout_s, self.poll_interval_s))
+        if self.inotify is not None:
+            self.inotify.read(timeout=int(timeout_s * 1000))
+        else:
+            time.sleep(timeout_s)
+
+
+class CompanyDataIngester:
+    """
+    Incremental ingestion of the company data files (see the module documentation).
+    """
+
+    def __init__(self, config: Config, client: OpenSearch, templates_json: dict):
+        watcher_config = config.load_config("ingestion_watcher")
+
+        self.config             : Config    = config
+        self.client             : OpenSearch = client
+        self.templates_json     : dict      = templates_json
+        self.index_name         : str       = config.load_config(["database", "company_data", "index_name"])
+        self.company_data_path  : str       = config.load_config(["paths", "company_data_path"])
+        self.fact_store_path    : str       = config.load_config(["paths", "fact_store_path"])
+        self.checkpoint_path    : str       = config.load_config(["paths", "ingestion_checkpoint_path"])
+        self.max_read_bytes     : int       = watcher_config["max_read_bytes"]
+        self.batch_max_documents: int       = watcher_config["batch_max_documents"]
+        self.batch_max_delay_s  : float     = watcher_config["batch_max_delay_s"]
+        self.watcher            : DirectoryWatcher = DirectoryWatcher(self.company_data_path, watcher_config["poll_interval_s"])
+        self.retrieval_cache    : RetrievalCache = RetrievalCache(config)
+
+        # Checkpointed positions, and positions reached by the reads (ahead of the checkpoint while documents are pending)
+        self.checkpoint         : dict[str, dict] = load_checkpoint(self.checkpoint_path)
+        self.positions          : dict[str, dict] = {file_name: dict(position) for file_name, position in self.checkpoint.items()}
+        if not os.path.isfile(self.checkpoint_path):
+            log("No ingestion checkpoint: the current content of the company files is assumed to be indexed", "info")
+            self.positions = current_positions(self.company_data_path)
+        self.pending_documents  : dict[str, dict] = {}
+        self.pending_facts      : list[dict] = []
+        self.pending_companies  : set[int] = set()
+        self.pending_since      : Optional[float] = None
+        self.stopped            : bool = False
+
+    def scan(self) -> bool:
+        """
+        Read the lines appended to the company files since the last scan.
+
+        Returns:
+            bool: True if some files have more data to read than max_read_bytes allowed.
+        """
+        more_to_read = False
+        for file_name in sorted(os.listdir(self.company_data_path)):
+            file_path = os.path.join(self.company_data_path, file_name)
+            if not COMPANY_FILE_PATTERN.match(file_name) or not os.path.isfile(file_path):
+                continue
+            stat = os.stat(file_path)
+
+            position = self.positions.get(file_name)
+            if position is None or position["inode"] != stat.st_ino or stat.st_size < position["offset"]:
+                if position is not None:
+                    log(f"File {file_name} was replaced or truncated: reading it from the start", "info")
+                position = self.positions[file_name] = {"inode": stat.st_ino, "offset": 0}
+            if stat.st_size == position["offset"]:
+                continue
+
+            previous_offset = position["offset"]
+            line_list, position["offset"] = read_new_lines(file_path, previous_offset, self.max_read_bytes)
+            # The read was capped by max_read_bytes (and not stuck on an incomplete line)
+            more_to_read |= bool(line_list) and stat.st_size - previous_offset > self.max_read_bytes
+            self.add_lines(int(os.path.splitext(file_name)[0]), line_list)
+
+        return more_to_read
+
+    def add_lines(self, company_id: int, line_list: list[tuple[int, str]]) -> None:
+        for offset, data_line in line_list:
+            if data_line.isspace() or data_line == "":
+                continue
+            document, fact = build_company_document(company_id, data_line, self.templates_json)
+            self.pending_documents[company_document_id(company_id, offset)] = document
+            if fact is not None:
+                self.pending_facts.append(fact)
+            self.pending_companies.add(company_id)
+            if self.pending_since is None:
+                self.pending_since = time.monotonic()
+
+    def flush(self) -> None:
+        """
+        Index the pending documents, make them searchable, invalidate the retrieval cache of their companies and
+        checkpoint the read positions.
+        """
+        if self.pending_documents:
+            log(f"Indexing {len(self.pending_documents)} new documents of the companies {sorted(self.pending_companies)}", "info")
+            index_company_documents(self.config, self.client, self.index_name, self.pending_documents)
+            self.client.indices.refresh(index=self.index_name)
+            append_fact_table(self.fact_store_path, self.pending_facts)
+            for company_id in self.pending_companies:
+                self.retrieval_cache.bump_generation(company_generation_name(company_id))
+
+        self.pending_documents, self.pending_facts, self.pending_companies, self.pending_since = {}, [], set(), None
+        if self.positions != self.checkpoint:
+            self.checkpoint = {file_name: dict(position) for file_name, position in self.positions.items()}
+            save_checkpoint(self.checkpoint_path, self.checkpoint)
+
+    def flush_due(self) -> bool:
+        return len(self.pending_documents) >= self.batch_max_documents or (
+            self.pending_since is not None and time.monotonic() - self.pending_since >= self.batch_max_delay_s)
+
+    def run(self) -> None:
+        """
+        Ingest the new lines until stop() is called, then flush the pending documents.
+        """
+        log(f"Watching {self.company_data_path} for new company-related data", "info")
+        more_to_read = False
+        while not self.stopped:
+            if not more_to_read:
+                timeout_s = self.batch_max_delay_s
+                if self.pending_since is not None:
+                    timeout_s = self.pending_since + self.batch_max_delay_s - time.monotonic()
+                self.watcher.wait(timeout_s)
+
+            more_to_read = self.scan()
+            if self.flush_due() or (not self.pending_documents and self.positions != self.checkpoint):
+                self.flush()
+
+        self.flush()
+        log("Ingestion stopped", "info")
+
+    def stop(self, *_) -> None:
+        self.stopped = True
+
+
+if __name__ == "__main__":
+    try:
+        _config : Config      = Config()
+        _client : OpenSearch  = instantiate_open_search_client(_config)
+
+        with open(_config.load_config(["paths", "templates_data_path"]), 'r') as _templates_file:
+            _templates_json: dict = json.load(_templates_file)
+
+        _ingester = CompanyDataIngester(_config, _client, _templates_json)
+        signal.signal(signal.SIGTERM, _ingester.stop)
+        signal.signal(signal.SIGINT, _ingester.stop)
+        _ingester.run()
+    except Exception as e:
+        log_error(f"Failed to ingest the company data: {e}", exception_to_raise=RuntimeError)
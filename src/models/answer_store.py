@@ -0,0 +1,101 @@
+"""
+This module provides the persistent store of the precomputed answers, backed by SQLite and shared by the web workers
+and the warm-up job (see db_scripts.warm_up_answers_script).
+An answer is identified by the company and the normalized query, and is stored with the version of the data and of the
+answer pipeline it was generated from: a stored answer is only served while this version is current, so that the
+answers generated before an ingestion are never served after it.
+"""
+
+import threading
+import time
+from typing import Optional
+
+from models.request_coalescing import normalize_query
+from utils.log_management import log
+from utils.sqlite_management import ProcessSqliteConnection
+
+
+def answer_key(company_id: int, query: str) -> str:
+    return f"{company_id}|{normalize_query(query)}"
+
+
+class AnswerStore:
+    """
+    SQLite-backed store of the precomputed answers.
+
+    Attributes:
+        path (str): The path of the SQLite file.
+        hit_count (int): The number of queries served from the store.
+        miss_count (int): The number of queries not found in the store (or stale).
+    """
+
+    def __init__(self, path: str):
+        self.path       : str = path
+        self.hit_count  : int = 0
+        self.miss_count : int = 0
+        self._lock      : threading.Lock = threading.Lock()
+
+        self.connection : ProcessSqliteConnection = ProcessSqliteConnection(path, [
+            "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, company_id INTEGER NOT NULL, query TEXT NOT NULL, "
+            "version TEXT NOT NULL, response TEXT NOT NULL, created_at REAL NOT NULL)",
+        ])
+
+    def get(self, company_id: int, query: str, version: str, count: bool = True) -> Optional[str]:
+        """
+        Get the answer stored for a query of a company, if it was generated with the given version.
+
+        Args:
+            count (bool): If False, the lookup is not counted in the hits and misses of the store (e.g. for the
+                lookups of the warm-up job, which are not served queries).
+        """
+        with self._lock:
+            row = self.connection.get().execute("SELECT response FROM answers WHERE key = ? AND version = ?",
+                                                (answer_key(company_id, query), version)).fetchone()
+            if count:
+                if row is None:
+                    self.miss_count += 1
+                else:
+                    self.hit_count += 1
+        return row[0] if row is not None else None
+
+    def put(self, company_id: int, query: str, version: str, response: str) -> None:
+        """
+        Store the answer to a query of a company (replacing the previous one), generated with the given version.
+        """
+        with self._lock:
+            self.connection.get().execute(
+                "INSERT OR REPLACE INTO answers (key, company_id, query, version, response, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (answer_key(company_id, query), company_id, query, version, response, time.time())
+            )
+            self.connection.get().commit()
+
+    def delete_other_keys(self, key_list: list[str]) -> int:
+        """
+        Delete the answers whose key is not in key_list (e.g. of the questions removed from the catalog).
+
+        Returns:
+            int: The number of deleted answers.
+        """
+        with self._lock:
+            self.connection.get().execute("CREATE TEMP TABLE IF NOT EXISTS kept_keys (key TEXT PRIMARY KEY)")
+            self.connection.get().execute("DELETE FROM kept_keys")
+            self.connection.get().executemany("INSERT OR IGNORE INTO kept_keys (key) VALUES (?)", [(key,) for key in key_list])
+            deleted_count = self.connection.get().execute("DELETE FROM answers WHERE key NOT IN (SELECT key FROM kept_keys)").rowcount
+            self.connection.get().commit()
+        if deleted_count:
+            log(f"Deleted {deleted_count} precomputed answers no longer in the catalog", "info")
+        return deleted_count
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: The number of stored answers, the hit count, the miss count and the hit ratio of the store.
+        """
+        with self._lock:
+            request_count = self.hit_count + self.miss_count
+            return {
+                "answer_count"  : self.connection.get().execute("SELECT COUNT(*) FROM answers").fetchone()[0],
+                "hit_count"     : self.hit_count,
+                "miss_count"    : self.miss_count,
+                "hit_ratio"     : self.hit_count / request_count if request_count else 0.0,
+            }
@@ -0,0 +1,186 @@
+"""
+This module provides the conversation sessions: the state kept between the successive requests of a user.
+A session stores the context resolved for the last request (company, period, retrieved data) so that follow-up
+questions about the same company and period skip the date inference and the retrieval, and the history of the
+conversation, summarized beyond a token budget to keep the prompts small.
+The sessions are stored in a SQLite file shared by the workers of the web server, so that the successive requests of a
+conversation can be served by different workers.
+"""
+
+import pickle
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterable, Iterator, Optional
+
+from models.fact_store import find_metrics_in_text
+from models.llm_request_parser import RequestContext
+from models.llm_utils import QueryRequest
+from models.rag import RequestRelatedData
+from utils.config_management import Config
+from utils.log_management import log
+from utils.sqlite_management import ProcessSqliteConnection
+from utils.value_normalization import parse_period_range
+
+
+def estimate_token_count(text: str) -> int:
+    """
+    Roughly estimate the number of tokens of a text (about 4 characters per token for English).
+    """
+    return len(text) // 4 + 1
+
+
+class ConversationSession:
+    """
+    State of a conversation.
+
+    Attributes:
+        request_context (RequestContext): The context resolved for the last request.
+        request_related_data (RequestRelatedData): The data retrieved for the last request.
+        history (list[tuple[str, str]]): The recent (query, answer) turns, oldest first.
+        summary (str): The summary of the turns removed from the history.
+    """
+
+    def __init__(self):
+        self.request_context        : Optional[RequestContext]      = None
+        self.request_related_data   : Optional[RequestRelatedData]  = None
+        self.history                : list[tuple[str, str]]         = []
+        self.summary                : str                           = ""
+
+    def resolved_metrics(self) -> set[str]:
+        """
+        Get the lower-case names of the metrics resolved for the last request (whose data were retrieved).
+        """
+        if self.request_related_data is None:
+            return set()
+        return {metric.lower() for metric in self.request_related_data.metrics_data}
+
+    def get_reusable_context(self, request: QueryRequest, known_metrics: Iterable[str]) -> Optional[RequestContext]:
+        """
+        Get the context of a follow-up request if the data retrieved for the previous request can be reused:
+        same company, either no period mentioned in the query or the same period as the previous request, and no
+        metric mentioned in the query other than the metrics resolved for the previous request.
+
+        Args:
+            request (QueryRequest): The follow-up request.
+            known_metrics (Iterable[str]): The lower-case names of all the metrics (see models.rag.build_metric_template_routes).
+
+        Returns:
+            Optional[RequestContext]: The context of the request (period inherited from the previous request),
+                                      or None if the context must be resolved again.
+        """
+        if self.request_context is None or self.request_related_data is None:
+            return None
+        if self.request_context.company_id != request.company_id:
+            return None
+
+        query_period = parse_period_range(request.query)
+        if query_period[0] is not None and query_period != parse_period_range(self.request_context.date):
+            return None
+
+        # e.g. "And the EBITDA?" after a question about the revenue: the data of the EBITDA were not retrieved
+        if not set(find_metrics_in_text(known_metrics, request.query)) <= self.resolved_metrics():
+            return None
+
+        return RequestContext(company_id=request.company_id, date=self.request_context.date, query=request.query)
+
+    def update(self, request_context: RequestContext, request_related_data: RequestRelatedData,
+               answer: str, history_token_budget: int) -> None:
+        """
+        Store the context of the last request and add its turn to the history. The oldest turns exceeding the token
+        budget are moved to the summary (1 line per turn, answer reduced to its first sentence).
+        """
+        self.request_context        = request_context
+        self.request_related_data   = request_related_data
+        self.history.append((request_context.query, answer))
+
+        while len(self.history) > 1 and self.history_token_count() > history_token_budget:
+            query, answer = self.history.pop(0)
+            self.summary += f"- Q: {query} A: {answer.split('. ')[0].strip()}\n"
+
+        # Keep the most recent part of the summary within the budget
+        max_summary_length = 4 * history_token_budget
+        if len(self.summary) > max_summary_length:
+            self.summary = self.summary[-max_summary_length:].split("\n", 1)[-1]
+
+    def history_token_count(self) -> int:
+        return estimate_token_count(self.summary) + sum(estimate_token_count(query) + estimate_token_count(answer)
+                                                        for query, answer in self.history)
+
+    def history_messages(self) -> list[dict]:
+        """
+        Format the conversation history as chat messages, to be inserted before the new request.
+        """
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": f"Summary of the earlier conversation:\n{self.summary}"})
+        for query, answer in self.history:
+            messages.append({"role": "user",        "content": query})
+            messages.append({"role": "assistant",   "content": answer})
+        return messages
+
+
+class SessionStore:
+    """
+    Store of the conversation sessions shared by the processes of the web server, bounded in number (least recently
+    used evicted first) and in time.
+    The requests of a session are serialized within a process (see lock): concurrent requests of the same session served
+    by different workers are not, the last one to complete overwrites the session.
+    """
+
+    def __init__(self, config: Config):
+        self.session_ttl_s          : float = config.load_config(["conversation", "session_ttl_s"])
+        self.max_sessions           : int   = config.load_config(["conversation", "max_sessions"])
+        self.history_token_budget   : int   = config.load_config(["conversation", "history_token_budget"])
+        self.connection             : ProcessSqliteConnection = ProcessSqliteConnection(
+            config.load_config(["paths", "session_store_path"]), [
+                "CREATE TABLE IF NOT EXISTS sessions (session_id TEXT PRIMARY KEY, session BLOB NOT NULL, last_access REAL NOT NULL)",
+                "CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)",
+            ])
+        # Locks of the sessions being used in this process, with their number of users
+        self.session_locks          : dict[str, list] = {}
+        self._lock                  : threading.Lock = threading.Lock()
+
+    @contextmanager
+    def lock(self, session_id: str) -> Iterator[None]:
+        """
+        Serialize the requests of a session in this process: the lock must be held from get to put.
+        """
+        with self._lock:
+            session_lock = self.session_locks.setdefault(session_id, [threading.Lock(), 0])
+            session_lock[1] += 1
+        try:
+            with session_lock[0]:
+                yield
+        finally:
+            with self._lock:
+                session_lock[1] -= 1
+                if session_lock[1] == 0:
+                    del self.session_locks[session_id]
+
+    def get(self, session_id: str) -> ConversationSession:
+        """
+        Get a session, or a new session if it does not exist or expired.
+        """
+        with self._lock:
+            row = self.connection.get().execute("SELECT session, last_access FROM sessions WHERE session_id = ?",
+                                                (session_id,)).fetchone()
+        if row is None or time.time() - row[1] > self.session_ttl_s:
+            log(f"Starting conversation session {session_id}", "info")
+            return ConversationSession()
+        return pickle.loads(zlib.decompress(row[0]))
+
+    def put(self, session_id: str, session: ConversationSession) -> None:
+        """
+        Store a session, then evict the expired sessions and the least recently used ones beyond max_sessions.
+        """
+        now = time.time()
+        with self._lock:
+            connection = self.connection.get()
+            connection.execute("INSERT OR REPLACE INTO sessions (session_id, session, last_access) VALUES (?, ?, ?)",
+                               (session_id, zlib.compress(pickle.dumps(session)), now))
+            connection.execute("DELETE FROM sessions WHERE last_access < ?", (now - self.session_ttl_s,))
+            connection.execute("DELETE FROM sessions WHERE session_id NOT IN "
+                               "(SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT ?)", (self.max_sessions,))
+            connection.commit()
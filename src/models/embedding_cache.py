@@ -0,0 +1,130 @@
+"""
+This module provides a persistent, content-addressed store of embeddings backed by SQLite.
+An embedding is identified by the hash of the model (ID and runtime) and of the normalized text, so that texts embedded
+before (at ingestion or by a previous query) are never sent to the model again.
+The store is bounded: the least recently used embeddings are evicted when it exceeds its maximum number of entries.
+The reads do not write: the accesses are kept in memory and written in batches (every access_flush_size accesses and
+before each eviction), so that the concurrent readers of the file do not contend for the SQLite write lock.
+"""
+
+import hashlib
+import re
+import threading
+import time
+from functools import lru_cache
+
+import numpy
+
+from utils.log_management import log
+from utils.sqlite_management import ProcessSqliteConnection
+
+
+def embedding_key(model_key: str, text: str) -> str:
+    """
+    Compute the key of the embedding of a text: the hash of the model key and of the text with normalized whitespaces.
+
+    Args:
+        model_key (str): The identifier of the model producing the embedding (e.g. model ID and runtime).
+        text (str): The embedded text.
+
+    Returns:
+        str: The hexadecimal key.
+    """
+    normalized_text = re.sub(r'\s+', ' ', text).strip()
+    return hashlib.sha256(f"{model_key}\0{normalized_text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed LRU store of float32 embeddings.
+
+    Attributes:
+        path (str): The path of the SQLite file.
+        max_entries (int): The maximum number of stored embeddings.
+        access_flush_size (int): The number of pending accesses from which they are written to the file.
+    """
+
+    def __init__(self, path: str, max_entries: int, access_flush_size: int = 256):
+        self.path               : str = path
+        self.max_entries        : int = max_entries
+        self.access_flush_size  : int = access_flush_size
+        self.pending_accesses   : dict[str, float] = {}
+        self._lock              : threading.Lock = threading.Lock()
+
+        self.connection     : ProcessSqliteConnection = ProcessSqliteConnection(path, [
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_access REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS embeddings_last_access ON embeddings (last_access)",
+        ])
+
+    def get_many(self, key_list: list[str]) -> dict[str, numpy.ndarray]:
+        """
+        Get the stored embeddings of a list of keys and mark them as recently used (written in batches, see the module
+        documentation).
+
+        Returns:
+            dict[str, numpy.ndarray]: The embeddings found, by key. The missing keys are absent.
+        """
+        if not key_list:
+            return {}
+
+        unique_key_list = list(dict.fromkeys(key_list))
+        with self._lock:
+            rows = []
+            # SQLite limits the number of parameters of a statement
+            for i in range(0, len(unique_key_list), 500):
+                chunk = unique_key_list[i: i + 500]
+                rows += self.connection.get().execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+            now = time.time()
+            self.pending_accesses.update((key, now) for key, _ in rows)
+            if len(self.pending_accesses) >= self.access_flush_size:
+                self._flush_accesses()
+                self.connection.get().commit()
+
+        return {key: numpy.frombuffer(vector, dtype=numpy.float32) for key, vector in rows}
+
+    def put_many(self, embeddings: dict[str, numpy.ndarray]) -> None:
+        """
+        Store embeddings, then evict the least recently used ones if the store exceeds max_entries.
+        """
+        if not embeddings:
+            return
+
+        now = time.time()
+        with self._lock:
+            # The recent accesses must be written before the eviction
+            self._flush_accesses()
+            self.connection.get().executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_access) VALUES (?, ?, ?)",
+                [(key, numpy.asarray(vector, dtype=numpy.float32).tobytes(), now) for key, vector in embeddings.items()]
+            )
+            count = self.connection.get().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            if count > self.max_entries:
+                self.connection.get().execute(
+                    "DELETE FROM embeddings WHERE key IN (SELECT key FROM embeddings ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self.connection.get().commit()
+
+    def _flush_accesses(self) -> None:
+        """
+        Write the pending accesses (within the caller's transaction, under the lock).
+        """
+        if self.pending_accesses:
+            self.connection.get().executemany("UPDATE embeddings SET last_access = ? WHERE key = ?",
+                                              [(access, key) for key, access in self.pending_accesses.items()])
+            self.pending_accesses = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self.connection.get().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+
+@lru_cache(maxsize=None)
+def load_embedding_cache(path: str, max_entries: int) -> EmbeddingCache:
+    """
+    Open the embedding store. The result is cached: the store is opened once per process.
+    """
+    log(f"Opening the embedding cache {path} (max {max_entries} entries)", "info")
+    return EmbeddingCache(path, max_entries)
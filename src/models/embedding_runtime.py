@@ -0,0 +1,292 @@
+"""
+This module provides the runtimes used to compute the embeddings of texts with the semantic matching model.
+The runtime is selected by the 'runtime' parameter of the 'llm_semantic_matching' configuration section:
+    - "pytorch":        the full-precision PyTorch model.
+    - "pytorch_int8":   the PyTorch model with its linear layers dynamically quantized to int8.
+    - "onnx":           the model exported to ONNX and run with ONNX Runtime.
+    - "onnx_int8":      the ONNX model with its weights dynamically quantized to int8.
+The ONNX models are exported once and cached on disk. If ONNX Runtime is not available or the export fails,
+the PyTorch runtime is used instead.
+
+Run this module as a script to check the parity of the runtimes with PyTorch and benchmark them on the company data.
+"""
+
+import inspect
+import os
+import time
+from functools import lru_cache
+from typing import Optional
+
+import numpy
+import torch
+from transformers import AutoTokenizer, AutoModel, PreTrainedTokenizer, PreTrainedModel
+
+from utils.config_management import Config
+from utils.log_management import log, log_error
+
+EMBEDDING_RUNTIMES = ["pytorch", "pytorch_int8", "onnx", "onnx_int8"]
+
+# Texts of different lengths (so that the batch is padded) embedded to check the parity of the exported ONNX models
+ONNX_PARITY_TEXTS = [
+    "The company's FY2023 Revenue was $72.70 million, compared to FY2022 Revenue in $61.58 million, a YoY increase of 18.04%.",
+    "What was the gross margin in Q1-2023?",
+    "Revenue",
+]
+ONNX_MIN_COSINE         = 0.999
+# Version of the export, part of the cached file names: the models exported by a previous version are exported again
+ONNX_EXPORT_VERSION     = 2
+ONNX_INT8_MIN_COSINE    = 0.95
+
+# Number of threads of the inference runtimes of the process (None: 1 per core), see set_inference_thread_count
+_inference_thread_count: Optional[int] = None
+
+
+def set_inference_thread_count(thread_count: int) -> None:
+    """
+    Set the number of threads used by the inference runtimes of the process (e.g. each worker of the web server gets
+    its share of the cores). Must be called before the runtime is loaded.
+    """
+    global _inference_thread_count
+
+    _inference_thread_count = thread_count
+    torch.set_num_threads(thread_count)
+
+
+def mean_pooling(last_hidden_state: numpy.ndarray, attention_mask: numpy.ndarray) -> numpy.ndarray:
+    """
+    Compute the embedding of each text as the mean of its token embeddings (padding tokens excluded).
+    """
+    mask = attention_mask[..., numpy.newaxis].astype(last_hidden_state.dtype)
+    return (last_hidden_state * mask).sum(axis=1) / mask.sum(axis=1)
+
+
+class TorchEmbeddingRuntime:
+    """
+    Embedding runtime based on the PyTorch model, optionally dynamically quantized to int8.
+    """
+
+    def __init__(self, model_id: str, quantize: bool = False):
+        self.tokenizer  : PreTrainedTokenizer   = AutoTokenizer.from_pretrained(model_id)
+        self.model      : PreTrainedModel       = AutoModel.from_pretrained(model_id)
+        self.model.eval()
+        if quantize:
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+
+    def embed(self, text_list: list[str]) -> numpy.ndarray:
+        inputs = self.tokenizer(text_list, return_tensors='pt', truncation=True, padding=True, max_length=128)
+        with torch.no_grad():
+            outputs = self.model(**inputs)
+        return mean_pooling(outputs.last_hidden_state.numpy(), inputs["attention_mask"].numpy())
+
+
+class OnnxEmbeddingRuntime:
+    """
+    Embedding runtime based on ONNX Runtime. Only the tokenizer and the ONNX session are kept in memory.
+    """
+
+    def __init__(self, model_id: str, cache_path: str, quantize: bool = False):
+        import onnxruntime
+
+        model_path = export_onnx_model(model_id, cache_path, quantize)
+
+        session_options = onnxruntime.SessionOptions()
+        session_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if _inference_thread_count is not None:
+            session_options.intra_op_num_threads = _inference_thread_count
+            session_options.inter_op_num_threads = 1
+
+        self.tokenizer      : PreTrainedTokenizer = AutoTokenizer.from_pretrained(model_id)
+        self.session                              = onnxruntime.InferenceSession(model_path, session_options,
+                                                                                 providers=["CPUExecutionProvider"])
+        self.input_names    : list[str]           = [model_input.name for model_input in self.session.get_inputs()]
+
+    def embed(self, text_list: list[str]) -> numpy.ndarray:
+        inputs = self.tokenizer(text_list, return_tensors='np', truncation=True, padding=True, max_length=128)
+        feed = {name: inputs[name].astype(numpy.int64) for name in self.input_names}
+        last_hidden_state = self.session.run(["last_hidden_state"], feed)[0]
+        return mean_pooling(last_hidden_state, inputs["attention_mask"])
+
+
+def export_onnx_model(model_id: str, cache_path: str, quantize: bool) -> str:
+    """
+    Export the model to ONNX (and quantize it if requested), unless it was already exported in the cache directory.
+    An exported model is only cached if its embeddings match the PyTorch model (see check_onnx_parity).
+
+    Args:
+        model_id (str): The ID of the pre-trained model.
+        cache_path (str): The directory where the exported models are cached.
+        quantize (bool): If True, return the int8 dynamically quantized model.
+
+    Returns:
+        str: The path of the ONNX model.
+
+    Raises:
+        RuntimeError: If the embeddings of the exported model do not match the PyTorch model.
+    """
+    model_dir   = os.path.join(cache_path, model_id.replace("/", "__"))
+    fp32_path   = os.path.join(model_dir, f"model_v{ONNX_EXPORT_VERSION}.onnx")
+    int8_path   = os.path.join(model_dir, f"model_v{ONNX_EXPORT_VERSION}_int8.onnx")
+
+    if os.path.isfile(int8_path if quantize else fp32_path):
+        return int8_path if quantize else fp32_path
+
+    tokenizer   : PreTrainedTokenizer   = AutoTokenizer.from_pretrained(model_id)
+    model       : PreTrainedModel       = AutoModel.from_pretrained(model_id)
+    model.eval()
+
+    if not os.path.isfile(fp32_path):
+        log(f"Exporting the embedding model {model_id} to ONNX: {fp32_path}", "info")
+        os.makedirs(model_dir, exist_ok=True)
+
+        inputs = tokenizer(["Example document text"], return_tensors='pt')
+        # The inputs are passed by name, in the order of the forward signature (not in the order of the tokenizer)
+        input_names = [name for name in inspect.signature(model.forward).parameters if name in inputs]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        torch.onnx.export(model, ({name: inputs[name] for name in input_names},), fp32_path + ".tmp",
+                          input_names=input_names, output_names=["last_hidden_state"],
+                          dynamic_axes=dynamic_axes, opset_version=14)
+        check_onnx_parity(model, tokenizer, fp32_path + ".tmp", ONNX_MIN_COSINE)
+        os.replace(fp32_path + ".tmp", fp32_path)
+
+    if not quantize:
+        return fp32_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    log(f"Quantizing the ONNX embedding model {model_id} to int8: {int8_path}", "info")
+    quantize_dynamic(fp32_path, int8_path + ".tmp", weight_type=QuantType.QInt8)
+    check_onnx_parity(model, tokenizer, int8_path + ".tmp", ONNX_INT8_MIN_COSINE)
+    os.replace(int8_path + ".tmp", int8_path)
+
+    return int8_path
+
+
+def check_onnx_parity(model: PreTrainedModel, tokenizer: PreTrainedTokenizer, model_path: str, min_cosine: float) -> float:
+    """
+    Check that the embeddings computed by an exported ONNX model match the PyTorch model on sample texts.
+    The exported file is deleted if they do not.
+
+    Returns:
+        float: The minimum cosine similarity between the embeddings of both models.
+
+    Raises:
+        RuntimeError: If the minimum cosine similarity is below min_cosine.
+    """
+    import onnxruntime
+
+    inputs = tokenizer(ONNX_PARITY_TEXTS, return_tensors='pt', truncation=True, padding=True, max_length=128)
+    with torch.no_grad():
+        reference = mean_pooling(model(**inputs).last_hidden_state.numpy(), inputs["attention_mask"].numpy())
+
+    session = onnxruntime.InferenceSession(model_path, providers=["CPUExecutionProvider"])
+    feed = {model_input.name: inputs[model_input.name].numpy().astype(numpy.int64) for model_input in session.get_inputs()}
+    embeddings = mean_pooling(session.run(["last_hidden_state"], feed)[0], inputs["attention_mask"].numpy())
+
+    cosine = float(((embeddings * reference).sum(axis=1) /
+                    (numpy.linalg.norm(embeddings, axis=1) * numpy.linalg.norm(reference, axis=1))).min())
+    if cosine < min_cosine:
+        os.remove(model_path)
+        log_error(f"The ONNX model {model_path} does not match the PyTorch model: min cosine {cosine:.4f} < {min_cosine}",
+                  exception_to_raise=RuntimeError)
+    log(f"Parity of the ONNX model {model_path} with the PyTorch model: min cosine {cosine:.4f}", "info")
+    return cosine
+
+
+def prepare_embedding_runtime(model_id: str, runtime: str, cache_path: str) -> None:
+    """
+    Download the model and export it to ONNX if the runtime requires it, without loading it for inference.
+    Used to prepare the model files once before starting several processes that each load the runtime.
+    """
+    log(f"Preparing the embedding model {model_id} for the {runtime} runtime", "info")
+
+    AutoTokenizer.from_pretrained(model_id)
+    AutoModel.from_pretrained(model_id)
+    if runtime.startswith("onnx"):
+        export_onnx_model(model_id, cache_path, quantize=(runtime == "onnx_int8"))
+
+
+@lru_cache(maxsize=None)
+def load_embedding_runtime(model_id: str, runtime: str, cache_path: str):
+    """
+    Load an embedding runtime. The result is cached: each runtime is loaded once per process.
+
+    Args:
+        model_id (str): The ID of the pre-trained model.
+        runtime (str): The runtime name (see EMBEDDING_RUNTIMES).
+        cache_path (str): The directory where the exported ONNX models are cached.
+
+    Returns:
+        TorchEmbeddingRuntime | OnnxEmbeddingRuntime: The runtime, exposing embed(text_list) -> numpy.ndarray.
+
+    Raises:
+        ValueError: If the runtime name is unknown.
+    """
+    log(f"Loading the embedding model {model_id} with the {runtime} runtime", "info")
+
+    if runtime not in EMBEDDING_RUNTIMES:
+        log_error(f"Unknown embedding runtime \"{runtime}\": expected one of {EMBEDDING_RUNTIMES}", exception_to_raise=ValueError)
+
+    if runtime.startswith("onnx"):
+        try:
+            return OnnxEmbeddingRuntime(model_id, cache_path, quantize=(runtime == "onnx_int8"))
+        except Exception as e:
+            log(f"Failed to load the {runtime} embedding runtime ({e}): falling back to pytorch", "warning")
+            runtime = "pytorch"
+
+    return TorchEmbeddingRuntime(model_id, quantize=(runtime == "pytorch_int8"))
+
+
+def compare_embedding_runtimes(config: Config, text_list: list[str], batch_size: int = 32) -> dict:
+    """
+    Check the parity of each runtime with the PyTorch runtime and benchmark them.
+
+    Args:
+        config (Config): Configuration object to load model settings.
+        text_list (list[str]): The texts to embed.
+        batch_size (int): The number of texts embedded per call.
+
+    Returns:
+        dict[str, dict]: For each runtime: the time per text (ms) and the min/mean cosine similarity with PyTorch.
+    """
+    model_id    : str = config.load_config(["llm_semantic_matching", "model"])
+    cache_path  : str = config.load_config(["paths", "embedding_model_cache_path"])
+
+    results     : dict = {}
+    reference   : numpy.ndarray = numpy.empty(0)
+    for runtime in EMBEDDING_RUNTIMES:
+        embedding_runtime = load_embedding_runtime(model_id, runtime, cache_path)
+
+        start = time.perf_counter()
+        embeddings = numpy.concatenate([embedding_runtime.embed(text_list[i: i + batch_size])
+                                        for i in range(0, len(text_list), batch_size)])
+        elapsed = time.perf_counter() - start
+
+        if runtime == "pytorch":
+            reference = embeddings
+        cosine = (embeddings * reference).sum(axis=1) / (numpy.linalg.norm(embeddings, axis=1) * numpy.linalg.norm(reference, axis=1))
+
+        results[runtime] = {
+            "ms_per_text"   : 1000 * elapsed / len(text_list),
+            "min_cosine"    : float(cosine.min()),
+            "mean_cosine"   : float(cosine.mean()),
+        }
+        log(f"{runtime}: {results[runtime]}", "info")
+
+    return results
+
+
+if __name__ == "__main__":
+    try:
+        _config             : Config    = Config()
+        _company_data_path  : str       = _config.load_config(["paths", "company_data_path"])
+
+        _text_list = []
+        for _file_name in sorted(os.listdir(_company_data_path)):
+            with open(os.path.join(_company_data_path, _file_name), 'r') as _file:
+                _text_list.extend(_line.strip() for _line in _file if _line.strip())
+
+        compare_embedding_runtimes(_config, _text_list[:512])
+    except Exception as _e:
+        log_error(f"Failed to compare the embedding runtimes: {_e}", exception_to_raise=RuntimeError)
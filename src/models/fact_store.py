@@ -0,0 +1,286 @@
+"""
+This module provides a columnar store of the facts (metric values) extracted from the company-related data lines at ingest time.
+The facts are persisted in a Parquet file and indexed by (company, metric, period), so that simple lookups
+(e.g. "What was revenue in FY 2023?") can be answered from a few compact rows instead of the retrieved raw data lines.
+"""
+
+import os
+import re
+import threading
+import time
+from typing import Iterable, Optional
+
+import pyarrow
+import pyarrow.parquet
+
+from models.llm_request_parser import RequestContext
+from utils.config_management import Config
+from utils.log_management import log, log_error
+from utils.value_normalization import normalize_period, parse_percentage, parse_value
+
+FACT_TABLE_SCHEMA = pyarrow.schema([
+    ("company_id"           , pyarrow.int32()),
+    ("metric"               , pyarrow.string()),
+    ("period"               , pyarrow.string()),
+    ("value"                , pyarrow.float64()),
+    ("unit"                 , pyarrow.string()),
+    ("comparison_period"    , pyarrow.string()),
+    ("comparison_value"     , pyarrow.float64()),
+    ("pct_change"           , pyarrow.float64()),
+])
+
+# Minimum delay between two checks of the modification of the fact table by a fact store
+FACT_TABLE_CHECK_INTERVAL_S = 5.0
+
+
+def extract_fact(company_id: int, key_word_values: dict) -> Optional[dict]:
+    """
+    Build a fact (row of the fact table) from the keyword values extracted from a company-related data line.
+
+    Args:
+        company_id (int): The identifier of the company.
+        key_word_values (dict): The keyword values returned by match_company_data_line_with_template.
+
+    Returns:
+        Optional[dict]: The fact, or None if the line does not hold a metric value for a period.
+    """
+    metric  : str = key_word_values.get("metric_name", "")
+    period  : str = key_word_values.get("current_period", "")
+    value, unit   = parse_value(key_word_values.get("current_value", ""))
+    if not metric or not period or value is None:
+        return None
+
+    comparison_value, _ = parse_value(key_word_values.get("last_value", ""))
+
+    return {
+        "company_id"        : company_id,
+        "metric"            : metric,
+        "period"            : period,
+        "value"             : value,
+        "unit"              : unit,
+        "comparison_period" : key_word_values.get("last_period", ""),
+        "comparison_value"  : comparison_value,
+        "pct_change"        : parse_percentage(key_word_values.get("pct_change", "")),
+    }
+
+
+def write_fact_table(path: str, fact_list: list[dict]) -> None:
+    """
+    Persist the facts in a Parquet file (overwritten if it exists).
+
+    Args:
+        path (str): The path of the Parquet file.
+        fact_list (list[dict]): The facts built by extract_fact.
+    """
+    log(f"Writing {len(fact_list)} facts to {path}", "info")
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    table = pyarrow.Table.from_pylist(fact_list, schema=FACT_TABLE_SCHEMA)
+    # The file is replaced atomically: the fact stores of the web workers reload it when it changes
+    pyarrow.parquet.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def append_fact_table(path: str, fact_list: list[dict]) -> None:
+    """
+    Append facts to the Parquet file (created if it does not exist). The file is replaced atomically.
+    The facts appended last take precedence over the previous facts of the same company, metric and period.
+
+    Args:
+        path (str): The path of the Parquet file.
+        fact_list (list[dict]): The facts built by extract_fact.
+    """
+    if not fact_list:
+        return
+
+    table = pyarrow.Table.from_pylist(fact_list, schema=FACT_TABLE_SCHEMA)
+    if os.path.isfile(path):
+        table = pyarrow.concat_tables([pyarrow.parquet.read_table(path, schema=FACT_TABLE_SCHEMA), table])
+
+    log(f"Appending {len(fact_list)} facts to {path}", "info")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pyarrow.parquet.write_table(table, path + ".tmp")
+    os.replace(path + ".tmp", path)
+
+
+def format_fact(fact: dict) -> str:
+    """
+    Format a fact as a compact line to be used in a prompt.
+    """
+    return f"{fact['metric']} {fact['period']}: {format_fact_value(fact)}"
+
+
+def format_amount(value: float, unit: str) -> str:
+    """
+    Format a value in base units with its unit, as written in the company-related data (e.g. "$1,200,000.00", "42.00%").
+    """
+    if unit == "USD":
+        return f"${value:,.2f}"
+    return f"{value:,.2f}{unit}"
+
+
+def format_fact_value(fact: dict) -> str:
+    """
+    Format the value of a fact, with its comparison value and change if any.
+    """
+    line = format_amount(fact["value"], fact["unit"])
+    if fact["comparison_value"] is not None:
+        line += f" (vs {fact['comparison_period']}: {format_amount(fact['comparison_value'], fact['unit'])}"
+        if fact["pct_change"] is not None:
+            line += f", {fact['pct_change']:+.2f}%"
+        line += ")"
+    return line
+
+
+def find_metrics_in_text(metric_list: Iterable[str], text: str) -> list[str]:
+    """
+    Find the metrics mentioned in a text. When a metric name is included in another mentioned metric name
+    (e.g. "Revenue" in "Gross Revenue"), only the longest is kept.
+
+    Args:
+        metric_list (Iterable[str]): The lower-case names of the metrics to look for.
+        text (str): The text (e.g. a query).
+
+    Returns:
+        list[str]: The lower-case names of the mentioned metrics.
+    """
+    text = text.lower()
+    found = [metric for metric in metric_list if re.search(r'\b' + re.escape(metric) + r'\b', text)]
+    return [metric for metric in found if not any(metric != other and metric in other for other in found)]
+
+
+class FactStore:
+    """
+    In-memory index of the fact table by (company_id, metric, period).
+    The fact table is loaded again when it is modified (by an ingestion run), checked at most every check_interval_s.
+
+    Attributes:
+        path (str): The path of the fact table.
+        index (dict): (company_id, lower-case metric, normalized period) -> fact.
+        company_metrics (dict): company_id -> lower-case metric -> metric name as written in the data.
+    """
+
+    def __init__(self, config: Config, check_interval_s: float = FACT_TABLE_CHECK_INTERVAL_S):
+        """
+        Load the fact table written at ingest time. If the table does not exist yet, the store is empty.
+
+        Args:
+            config (Config): The configuration object to load settings from.
+            check_interval_s (float): The minimum delay between two checks of the modification of the fact table.
+
+        Raises:
+            RuntimeError: If the fact table cannot be read.
+        """
+        try:
+            log(f"Initializing {self.__class__.__name__}", "info")
+
+            self.path               : str                           = config.load_config(["paths", "fact_store_path"])
+            self.check_interval_s   : float                         = check_interval_s
+            self.index              : dict[tuple, dict]             = {}
+            self.company_metrics    : dict[int, dict[str, str]]     = {}
+            self.table_version      : Optional[tuple[int, int]]     = None
+            self.checked_at         : float                         = time.monotonic()
+            self._lock              : threading.Lock                = threading.Lock()
+
+            if not os.path.isfile(self.path):
+                log(f"No fact table found in {self.path}: the fact store is empty", "warning")
+                return
+
+            self.load()
+            log(f"{self.__class__.__name__} initialized successfully with {len(self.index)} facts", "info")
+        except Exception as e:
+            log_error(f"Failed to initialize {self.__class__.__name__}: {e}", exception_to_raise=RuntimeError)
+
+    def get_table_version(self) -> Optional[tuple[int, int]]:
+        """
+        Get the version of the fact table file (modification time and size), or None if it does not exist.
+        """
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> None:
+        """
+        Load the fact table and replace the index with its facts. The index is replaced at once, so that the concurrent
+        lookups see either the previous or the new facts.
+        """
+        table_version   : Optional[tuple[int, int]] = self.get_table_version()
+        index           : dict[tuple, dict]         = {}
+        company_metrics : dict[int, dict[str, str]] = {}
+
+        for fact in pyarrow.parquet.read_table(self.path).to_pylist():
+            metric_key = fact["metric"].lower()
+            index[(fact["company_id"], metric_key, normalize_period(fact["period"]))] = fact
+            company_metrics.setdefault(fact["company_id"], {})[metric_key] = fact["metric"]
+
+        self.index, self.company_metrics, self.table_version = index, company_metrics, table_version
+
+    def refresh(self) -> None:
+        """
+        Load the fact table again if it was modified since it was loaded (checked at most every check_interval_s).
+        If the new table cannot be read, the facts loaded previously are kept.
+        """
+        now = time.monotonic()
+        if now - self.checked_at < self.check_interval_s:
+            return
+
+        with self._lock:
+            if now - self.checked_at < self.check_interval_s:
+                return
+            self.checked_at = now
+            if self.get_table_version() in (None, self.table_version):
+                return
+
+            try:
+                self.load()
+                log(f"Fact table {self.path} reloaded with {len(self.index)} facts", "info")
+            except Exception as e:
+                log_error(f"Failed to reload the fact table {self.path}: {e}")
+
+    def lookup(self, company_id: int, metric: str, period: str) -> Optional[dict]:
+        """
+        Get the fact of a company for a metric and a period.
+
+        Returns:
+            Optional[dict]: The fact, or None if unknown.
+        """
+        period_key = normalize_period(period)
+        fact = self.index.get((company_id, metric.lower(), period_key))
+        if fact is None and re.fullmatch(r'\d{4}', period_key):
+            # A bare year refers to the fiscal year
+            fact = self.index.get((company_id, metric.lower(), "fy" + period_key))
+        return fact
+
+    def find_metrics_in_query(self, company_id: int, query: str) -> list[str]:
+        """
+        Find the metrics of a company mentioned in a query. When a metric name is included in another mentioned
+        metric name (e.g. "Revenue" in "Gross Revenue"), only the longest is kept.
+
+        Returns:
+            list[str]: The lower-case names of the mentioned metrics.
+        """
+        return find_metrics_in_text(self.company_metrics.get(company_id, {}), query)
+
+    def find_facts(self, request_context: RequestContext) -> list[dict]:
+        """
+        Find the facts answering directly a request: the metrics mentioned in the query for the inferred period.
+
+        Args:
+            request_context (RequestContext): The context of the preparsed client request.
+
+        Returns:
+            list[dict]: The facts found. Empty if the request does not refer to a known metric and period.
+        """
+        if not request_context.date:
+            return []
+
+        self.refresh()
+        fact_list = []
+        for metric in self.find_metrics_in_query(request_context.company_id, request_context.query):
+            fact = self.lookup(request_context.company_id, metric, request_context.date)
+            if fact is None:
+                return []
+            fact_list.append(fact)
+        return fact_list
@@ -1,11 +1,39 @@
-import openai
+import json
+from collections import defaultdict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterator, Optional
 
-from models.llm_request_parser import LlmRequestParser
-from models.llm_utils import QueryRequest
-from models.rag import RagHandler
+from models.answer_store import AnswerStore
+from models.conversation_session import SessionStore
+from models.llm_request_parser import LlmRequestParser, RequestContext
+from models.llm_utils import QueryComparisonRequest, QueryRequest
+from models.prompt_assembly import PromptAssembler, prompt_version
+from models.rag import RagHandler, RequestRelatedData
+from models.request_coalescing import SingleFlight, normalize_query
+from utils.client_management import ClientRegistry, get_client_registry
 from utils.config_management import Config
 from utils.log_management import log, log_error
 
+PIPELINE_TWO_STEP   = "two_step"
+PIPELINE_SINGLE_CALL= "single_call"
+
+# Function the answer model can call (single_call pipeline) to get the company-related data of another period
+FETCH_COMPANY_DATA_FUNCTION = {
+    "name"          : "fetch_company_data",
+    "description"   : "Fetch the company-related data lines of a given period, when the provided company-related data"
+                      " do not cover the period needed to answer the user request.",
+    "parameters"    : {
+        "type"      : "object",
+        "properties": {
+            "period": {
+                "type"          : "string",
+                "description"   : "The period, formatted as in the company-related data (e.g. 'FY2023', 'Q1-2023', 'January 2023')."
+            }
+        },
+        "required"  : ["period"]
+    }
+}
+
 
 class LlmRequestAnswerer:
     def __init__(self, config: Config):
@@ -15,12 +43,21 @@ class LlmRequestAnswerer:
         try:
             log(f"Initializing {self.__class__.__name__}", "info")
 
-            log(f"Setting the OpenAI API key ", "info")
-            openai.api_key = config.load_config_secret_key(config_id_key='openai_api_key_path')
-
-            self.model_id           : str = config.load_config(["llm_request_answerer", "model"])
-            self.llm_request_parser : LlmRequestParser = LlmRequestParser(config)
-            self.rag_handler        : RagHandler = RagHandler(config)
+            self.client_registry        : ClientRegistry = get_client_registry(config)
+            self.model_id               : str = config.load_config(["llm_request_answerer", "model"])
+            self.batch_max_concurrency  : int = config.load_config(["llm_request_answerer", "batch_max_concurrency"])
+            self.pipeline               : str = config.load_config(["llm_request_answerer", "pipeline"])
+            self.max_data_requests      : int = config.load_config(["llm_request_answerer", "max_data_requests"])
+            self.llm_request_parser     : LlmRequestParser = LlmRequestParser(config)
+            self.rag_handler            : RagHandler = RagHandler(config)
+            self.session_store          : SessionStore = SessionStore(config)
+            self.single_flight          : SingleFlight = SingleFlight()
+            self.prompt_assembler       : PromptAssembler = PromptAssembler(
+                config.load_config(["llm_request_answerer", "prompt_cache_max_entries"]))
+            self.prompt_version         : str = prompt_version(self.rag_handler.metrics_json, self.rag_handler.templates_json)
+            self.answer_store           : Optional[AnswerStore] = None
+            if config.load_config(["precomputed_answers", "enabled"]):
+                self.answer_store = AnswerStore(config.load_config(["paths", "answer_store_path"]))
 
             log(f"{self.__class__.__name__} initialized successfully", "info")
         except Exception as e:
@@ -39,38 +76,235 @@ class LlmRequestAnswerer:
         try:
             log(f"Answering to query for company_id {request.company_id}: {request.query}", "info")
 
-            # Parse the user request and get info (date, related metrics, etc)
-            self.llm_request_parser.parse_user_request(request)
-
-            # Set context related to the request (company data, metrics files, etc)
-            self.rag_handler.set_context_related_to_request(self.llm_request_parser)
-
-            # Ping the model with the user request and the necessary data to answer it
-            response = openai.ChatCompletion.create(
-                model=self.model_id,
-                messages=[
-                    {
-                        "role": "system",
-                        "content": f"You will be provided with a user request relative to a company {request.company_id}."
-                                   "Your task is to answer to this request."
-                                   "In order to answer, use the provided company-related data."
-                                   "Also use the provided definition of the metrics used in the request."
-                                   "Finally try to format your answer using the provided templates."
-                    },
-                    {
-                        "role": "user",
-                        "content": "User request"                           + f": \"{request.query}\"."
-                                   "Company-related data"                   + f": \"{self.rag_handler.request_related_data.company_data}\"."
-                                   "Metrics"                                + f": \"{self.rag_handler.request_related_data.metrics_data}\"."
-                                   "Templates you can use in your answer"   + f": \"{self.rag_handler.request_related_data.templates_data}\"."
-                    }
-                ],
-                # temperature=0.7,
-                # max_tokens=64,
-                # top_p=1
-            )
-            response = response['choices'][0]['message']['content']
-            log(f"Response: {response}", "info")
-            return response
+            if request.session_id is not None:
+                return self.handle_session_query(request)
+
+            # Answers precomputed by the warm-up job (see db_scripts.warm_up_answers_script) are served on exact match
+            if self.answer_store is not None:
+                response = self.answer_store.get(request.company_id, request.query, self.answer_version(request.company_id))
+                if response is not None:
+                    log(f"Serving the precomputed answer: {response}", "info")
+                    return response
+
+            # Concurrent identical requests share the same computation
+            return self.single_flight.do((request.company_id, normalize_query(request.query)),
+                                         self.handle_stateless_query, request)
         except Exception as e:
             log_error(f"Error handling query: {e}", exception_to_raise=RuntimeError)
+
+    def handle_stateless_query(self, request: QueryRequest) -> str:
+        """
+        Handle a user query that does not belong to a conversation session. Can be called concurrently.
+
+        Args:
+            request (QueryRequest): The incoming query request containing the company_id and raw query.
+
+        Returns:
+            str: Response from the LLM.
+        """
+        # Parse the user request and get info (date, related metrics, etc)
+        request_context = self.infer_request_context(request)
+
+        # Get the context related to the request (company data, metrics files, etc)
+        request_related_data = self.rag_handler.get_context_related_to_request(request_context)
+
+        # Ping the model with the user request and the necessary data to answer it
+        return self.answer_with_context(request, request_related_data)
+
+    def handle_session_query(self, request: QueryRequest) -> str:
+        """
+        Handle a user query belonging to a conversation session.
+        Follow-up queries about the same company and period reuse the context resolved for the previous query of the
+        session (no date inference nor retrieval). The conversation history is sent along with the query.
+
+        Args:
+            request (QueryRequest): The incoming query request containing the session_id, the company_id and raw query.
+
+        Returns:
+            str: Response from the LLM.
+        """
+        with self.session_store.lock(request.session_id):
+            session = self.session_store.get(request.session_id)
+            request_context = session.get_reusable_context(request, self.rag_handler.metric_template_routes)
+            if request_context is not None:
+                log(f"Follow-up query in session {request.session_id}: reusing the context of the previous query", "info")
+                request_related_data = session.request_related_data
+            else:
+                request_context         = self.infer_request_context(request)
+                request_related_data    = self.rag_handler.get_context_related_to_request(request_context)
+
+            response = self.answer_with_context(request, request_related_data, history_messages=session.history_messages())
+            session.update(request_context, request_related_data, response, self.session_store.history_token_budget)
+            self.session_store.put(request.session_id, session)
+
+        return response
+
+    def handle_comparison_query(self, request: QueryComparisonRequest) -> str:
+        """
+        Answer a user query comparing several companies with a single LLM call.
+        The period is inferred once, the data of the companies are retrieved concurrently (bounded by
+        batch_max_concurrency), then their facts are aligned by metric and period in a compact prompt.
+
+        Args:
+            request (QueryComparisonRequest): The incoming query request containing the company_ids and raw query.
+
+        Returns:
+            str: Response from the LLM.
+        """
+        log(f"Answering to comparison query for company_ids {request.company_ids}: {request.query}", "info")
+
+        company_ids     = list(dict.fromkeys(request.company_ids))
+        date            = self.infer_request_context(QueryRequest(query=request.query, company_id=company_ids[0])).date
+        context_list    = [RequestContext(company_id=company_id, date=date, query=request.query) for company_id in company_ids]
+
+        with ThreadPoolExecutor(max_workers=min(len(context_list), self.batch_max_concurrency)) as executor:
+            data_list: list[RequestRelatedData] = list(executor.map(self.rag_handler.get_context_related_to_request, context_list))
+
+        facts_by_company        : dict[int, list[dict]] = {}
+        other_lines_by_company  : dict[int, list[str]]  = {}
+        metrics_data            : dict[str, dict]       = {}
+        templates_data          : dict[str, dict]       = {}
+        for request_context, request_related_data in zip(context_list, data_list):
+            facts_by_company[request_context.company_id], other_lines_by_company[request_context.company_id] = \
+                self.rag_handler.get_company_facts(request_context, request_related_data)
+            metrics_data.update(request_related_data.metrics_data)
+            for template_hit in request_related_data.templates_data:
+                templates_data.setdefault(template_hit["_id"], template_hit)
+
+        messages = self.prompt_assembler.build_comparison_messages(
+            QueryComparisonRequest(query=request.query, company_ids=company_ids),
+            facts_by_company, other_lines_by_company, metrics_data, list(templates_data.values()),
+            min(request_related_data.definitions_generation for request_related_data in data_list)
+        )
+        response = self.client_registry.chat_completion(model=self.model_id, messages=messages)['choices'][0]['message']['content']
+        log(f"Response: {response}", "info")
+        return response
+
+    def answer_version(self, company_id: int) -> str:
+        """
+        Get the version of the answers to the queries of a company: the answer model, the pipeline, the version of the
+        prompts (see models.prompt_assembly.prompt_version) and the generation of the data of the company (see
+        RetrievalCache.data_generation). A precomputed answer is only served for its version.
+        """
+        return f"{self.model_id}|{self.pipeline}|{self.prompt_version}|{self.rag_handler.retrieval_cache.data_generation(company_id)}"
+
+    def infer_request_context(self, request: QueryRequest) -> RequestContext:
+        """
+        Infer the context of the request with the parser, locally or with the LLM depending on the pipeline.
+        """
+        if self.pipeline == PIPELINE_SINGLE_CALL:
+            return self.llm_request_parser.infer_request_context_locally(request)
+        return self.llm_request_parser.infer_request_context(request)
+
+    def answer_with_context(self, request: QueryRequest, request_related_data: RequestRelatedData,
+                            history_messages: Optional[list[dict]] = None) -> str:
+        """
+        Request the configured LLM model to answer the user query using the data related to the request.
+        In the single_call pipeline, the model can request the company-related data of other periods through
+        function calling (at most max_data_requests times): the median request needs a single LLM round trip.
+
+        Args:
+            request (QueryRequest): The incoming query request containing the company_id and raw query.
+            request_related_data (RequestRelatedData): The company-related data, metrics and templates fetched for the request.
+            history_messages (list[dict]): The previous messages of the conversation, if any.
+
+        Returns:
+            str: Response from the LLM.
+        """
+        messages = self.build_messages(request, request_related_data, history_messages)
+
+        function_kwargs = {}
+        if self.pipeline == PIPELINE_SINGLE_CALL:
+            function_kwargs = {"functions": [FETCH_COMPANY_DATA_FUNCTION], "function_call": "auto"}
+
+        message = self.client_registry.chat_completion(model=self.model_id, messages=messages, **function_kwargs)['choices'][0]['message']
+
+        data_request_count = 0
+        while message.get("function_call"):
+            data_request_count += 1
+            try:
+                period = json.loads(message["function_call"]["arguments"]).get("period", "")
+                log(f"The model requested the company-related data of the period: {period}", "info")
+                company_data = self.rag_handler.fetch_company_data(RequestContext(company_id=request.company_id, date=period, query=request.query))
+                function_result = json.dumps(company_data)
+            except (json.JSONDecodeError, AttributeError) as e:
+                # Malformed arguments: the model is told so, and can retry or answer without the data
+                log(f"Invalid arguments of the function call {message['function_call']['arguments']!r}: {e}", "warning")
+                function_result = json.dumps({"error": f"Invalid arguments: {e}. Expected a JSON object such as {{\"period\": \"FY 2023\"}}."})
+
+            messages.append({"role": "assistant", "content": None, "function_call": dict(message["function_call"])})
+            messages.append({"role": "function", "name": FETCH_COMPANY_DATA_FUNCTION["name"], "content": function_result})
+
+            # The last allowed round trip must produce the answer
+            if data_request_count >= self.max_data_requests:
+                function_kwargs = {}
+            message = self.client_registry.chat_completion(model=self.model_id, messages=messages, **function_kwargs)['choices'][0]['message']
+
+        response = message['content']
+        log(f"Response: {response}", "info")
+        return response
+
+    def build_messages(self, request: QueryRequest, request_related_data: RequestRelatedData,
+                       history_messages: Optional[list[dict]] = None) -> list[dict]:
+        """
+        Build the messages sent to the LLM model to answer the user query (see models.prompt_assembly).
+        """
+        return self.prompt_assembler.build_messages(request, request_related_data, history_messages)
+
+    def handle_query_batch(self, request_list: list[QueryRequest]) -> Iterator[dict]:
+        """
+        Handle a batch of user queries.
+        The requests are grouped by company: the retrieval is done once per group (see RagHandler.get_context_related_to_company_requests).
+        The LLM calls (date inference and answers) are issued with a concurrency bounded by batch_max_concurrency.
+        A request whose context cannot be inferred gets an error result without failing the other requests of its group.
+
+        Args:
+            request_list (list[QueryRequest]): The incoming query requests.
+
+        Returns:
+            Iterator[dict]: The result of each request, in the order of request_list, yielded as soon as available.
+                            Each result is either {"response": str} or {"error": str}.
+        """
+        log(f"Answering to a batch of {len(request_list)} queries", "info")
+
+        with ThreadPoolExecutor(max_workers=self.batch_max_concurrency) as executor:
+            # Infer the context of all the requests concurrently
+            context_futures: list[Future] = [executor.submit(self.infer_request_context, request)
+                                             for request in request_list]
+
+            # Group the requests by company, then fetch the data related to each group
+            company_groups: dict[int, list[int]] = defaultdict(list)
+            for request_index, request in enumerate(request_list):
+                company_groups[request.company_id].append(request_index)
+
+            data_futures: dict[int, tuple[Future, int]] = {}
+            for company_id, request_index_list in company_groups.items():
+                future = executor.submit(self._get_context_related_to_company_requests,
+                                         [context_futures[i] for i in request_index_list])
+                for position, request_index in enumerate(request_index_list):
+                    data_futures[request_index] = (future, position)
+
+            # Answer all the requests concurrently
+            answer_futures: list[Future] = [executor.submit(self._answer_with_context_future, request,
+                                                            context_futures[request_index], *data_futures[request_index])
+                                            for request_index, request in enumerate(request_list)]
+
+            for request, future in zip(request_list, answer_futures):
+                try:
+                    yield {"response": future.result()}
+                except Exception as e:
+                    log_error(f"Error handling query \"{request.query}\" in batch: {e}")
+                    yield {"error": str(e)}
+
+    def _get_context_related_to_company_requests(self, context_future_list: list[Future]) -> list[Optional[RequestRelatedData]]:
+        # A request whose context could not be inferred is left out of the group (its error is raised when answering it)
+        request_context_list: list[Optional[RequestContext]] = [None if future.exception() else future.result()
+                                                                for future in context_future_list]
+        retrieved_list = iter(self.rag_handler.get_context_related_to_company_requests(
+            [request_context for request_context in request_context_list if request_context is not None]))
+        return [None if request_context is None else next(retrieved_list) for request_context in request_context_list]
+
+    def _answer_with_context_future(self, request: QueryRequest, context_future: Future, data_future: Future,
+                                    position: int) -> str:
+        context_future.result()
+        return self.answer_with_context(request, data_future.result()[position])
@@ -4,10 +4,11 @@ These data are extracted using a pre-trained OpenAI model.
 
 """
 
-import openai
 from models.llm_utils import QueryRequest
+from utils.client_management import ClientRegistry, get_client_registry
 from utils.config_management import Config
 from utils.log_management import log, log_error
+from utils.value_normalization import find_periods
 
 NO_DATE_FOUND_STRING = "NO DATE WAS FOUND IN THE USER REQUEST"
 
@@ -43,9 +44,7 @@ class LlmRequestParser:
         try:
             log(f"Initializing {self.__class__.__name__}", "info")
 
-            log(f"Setting the OpenAI API key ", "info")
-            openai.api_key = config.load_config_secret_key(config_id_key='openai_api_key_path')
-
+            self.client_registry: ClientRegistry = get_client_registry(config)
             self.model_id       : str               = config.load_config(["llm_request_parser", "model"])
             self.request_context: RequestContext    = RequestContext()
 
@@ -61,13 +60,59 @@ class LlmRequestParser:
         Args:
             request (QueryRequest): The user query request.
 
+        Raises:
+            RuntimeError: If date inference fails.
+        """
+        self.request_context = self.infer_request_context(request)
+
+    def parse_user_request_locally(self, request: QueryRequest):
+        """
+        Parse the user request to infer the date without requesting the language model (see infer_request_context_locally).
+
+        Args:
+            request (QueryRequest): The user query request.
+        """
+        self.request_context = self.infer_request_context_locally(request)
+
+    @staticmethod
+    def infer_request_context_locally(request: QueryRequest) -> RequestContext:
+        """
+        Infer the context (date) of the user request by matching the period formats of the company data in the query
+        (e.g. "FY 2023", "Q1-2022", "January 2021"). Relative periods (e.g. "last year") are not resolved.
+
+        Args:
+            request (QueryRequest): The user query request.
+
+        Returns:
+            RequestContext: The context of the request.
+        """
+        response_date = " - ".join(find_periods(request.query))
+        log(f"The period was inferred locally from the query: {response_date}", "info")
+
+        return RequestContext(
+            company_id  = request.company_id,
+            date        = response_date,
+            query       = request.query
+        )
+
+    def infer_request_context(self, request: QueryRequest) -> RequestContext:
+        """
+        Infer the context (date) of the user request using the pre-trained language model.
+        Unlike parse_user_request, this method does not modify the parser and can be called concurrently.
+
+        Args:
+            request (QueryRequest): The user query request.
+
+        Returns:
+            RequestContext: The context of the request.
+
         Raises:
             RuntimeError: If date inference fails.
         """
         try:
             log(f"Infer the year from the query", "info")
 
-            response = openai.ChatCompletion.create(
+            response = self.client_registry.chat_completion(
                 model=self.model_id,
                 messages=[
                     {
@@ -91,7 +136,7 @@ class LlmRequestParser:
 
             log(f"The year was successfully inferred from the query: {response_date}", "info")
 
-            self.request_context = RequestContext(
+            return RequestContext(
                 company_id  = request.company_id,
                 date        = response_date,
                 query       = request.query
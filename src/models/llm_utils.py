@@ -2,10 +2,13 @@
 This module provides functionality for handling query requests and generating embeddings using a pre-trained language model.
 """
 
-from pydantic import BaseModel
-from transformers import AutoTokenizer, AutoModel, PreTrainedTokenizer, PreTrainedModel
-import torch
+from typing import List, Optional
 
+import numpy
+from pydantic import BaseModel, conlist
+
+from models.embedding_cache import embedding_key, load_embedding_cache
+from models.embedding_runtime import load_embedding_runtime
 from utils.config_management import Config
 
 
@@ -15,30 +18,74 @@ class QueryRequest(BaseModel):
     """
     query       : str   # The query string provided by the user
     company_id  : int   # The identifier for the company associated with the query
+    session_id  : Optional[str] = None  # The identifier of the conversation session, if the query is a follow-up
 
 
-def get_embedding(config: Config, text: str):
+class QueryComparisonRequest(BaseModel):
     """
-    Generate embeddings for a given text using a pre-trained language model.
+    A data model for storing user query-requests comparing several companies.
+    """
+    query       : str                               # The query string provided by the user
+    company_ids : conlist(int, min_items=2)         # The identifiers of the compared companies
+
+
+class QueryBatchRequest(BaseModel):
+    """
+    A data model for storing a batch of user query-requests.
+    """
+    requests    : List[QueryRequest]    # The query requests, answered in the same order
+    stream      : bool = False          # If True, the answers are streamed as NDJSON as soon as they are available
 
-    This function loads a pre-trained model and tokenizer specified in the configuration, processes the input text,
-    and returns its embedding.
+
+def get_embeddings(config: Config, text_list: List[str]) -> numpy.ndarray:
+    """
+    Generate embeddings for a list of texts in a single forward pass of a pre-trained language model.
+    The embedding of a text is the mean of its token embeddings (padding tokens excluded).
+    The model is run with the runtime configured in llm_semantic_matching (see models.embedding_runtime).
+    The embeddings already computed are read from the embedding cache (see models.embedding_cache), if enabled.
 
     Args:
         config (Config): Configuration object to load model settings.
-        text (str): The input text to generate embeddings for.
+        text_list (List[str]): The input texts to generate embeddings for.
 
     Returns:
-        numpy.ndarray: The generated embedding for the input text.
+        numpy.ndarray: The generated embeddings, 1 row per input text.
     """
     # Load pre-trained model and tokenizer for semantic search within an OpenSearch table
-    model_id    : str                   = config.load_config(["llm_semantic_matching", "model"])
-    tokenizer   : PreTrainedTokenizer   = AutoTokenizer.from_pretrained(model_id)
-    model       : PreTrainedModel       = AutoModel.from_pretrained(model_id)
+    model_id    : str = config.load_config(["llm_semantic_matching", "model"])
+    runtime     : str = config.load_config(["llm_semantic_matching", "runtime"])
+    cache_path  : str = config.load_config(["paths", "embedding_model_cache_path"])
+
+    embedding_runtime = load_embedding_runtime(model_id, runtime, cache_path)
+
+    if not config.load_config(["llm_semantic_matching", "cache_enabled"]):
+        return embedding_runtime.embed(text_list)
 
-    # Tokenize the input text and generate embeddings
-    inputs = tokenizer(text, return_tensors='pt', truncation=True, padding=True, max_length=128)
-    outputs = model(**inputs)
-    embeddings = outputs.last_hidden_state.mean(dim=1)
+    embedding_cache = load_embedding_cache(config.load_config(["paths", "embedding_cache_path"]),
+                                           config.load_config(["llm_semantic_matching", "cache_max_entries"]))
+    key_list        = [embedding_key(f"{model_id}|{runtime}", text) for text in text_list]
+    embeddings      = embedding_cache.get_many(key_list)
 
-    return embeddings.detach().numpy().flatten()
+    # Only the texts missing from the cache go through the model
+    missing_texts: dict[str, str] = {key: text for key, text in zip(key_list, text_list) if key not in embeddings}
+    if missing_texts:
+        missing_embeddings  = embedding_runtime.embed(list(missing_texts.values())).astype(numpy.float32)
+        new_embeddings      = dict(zip(missing_texts.keys(), missing_embeddings))
+        embedding_cache.put_many(new_embeddings)
+        embeddings.update(new_embeddings)
+
+    return numpy.stack([embeddings[key] for key in key_list])
+
+
+def get_embedding(config: Config, text: str) -> numpy.ndarray:
+    """
+    Generate embeddings for a given text using a pre-trained language model.
+
+    Args:
+        config (Config): Configuration object to load model settings.
+        text (str): The input text to generate embeddings for.
+
+    Returns:
+        numpy.ndarray: The generated embedding for the input text.
+    """
+    return get_embeddings(config, [text])[0]
@@ -0,0 +1,171 @@
+"""
+This module assembles the messages sent to the LLM model to answer a user request.
+The messages are laid out from the most to the least stable content, so that consecutive requests share the longest
+possible prefix (which the LLM providers cache, reducing the latency and the cost of the prompt):
+    1. the static instructions;
+    2. the definitions of the metrics and the templates, serialized deterministically (sorted keys, no scores nor
+       embeddings) and memoized per set of metrics and templates and per generation of their definitions;
+    3. the conversation history, if any;
+    4. the per-request data: the company, its data lines and the user request.
+The comparisons of several companies follow the same layout, with the data of the companies aligned in a table.
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from models.fact_store import format_fact_value
+from models.llm_utils import QueryComparisonRequest, QueryRequest
+from models.rag import RequestRelatedData
+from utils.value_normalization import normalize_period
+
+ANSWER_INSTRUCTIONS = (
+    "You will be provided with a user request relative to a company. "
+    "Your task is to answer to this request. "
+    "In order to answer, use the provided company-related data. "
+    "Also use the provided definition of the metrics used in the request. "
+    "Finally try to format your answer using the provided templates."
+)
+
+COMPARISON_INSTRUCTIONS = (
+    "You will be provided with a user request comparing several companies. "
+    "Your task is to answer to this request in a single answer covering all the companies. "
+    "In order to answer, use the provided company-related data, aligned by metric and period. "
+    "Also use the provided definition of the metrics used in the request. "
+    "Finally try to format your answer using the provided templates."
+)
+
+
+# Version of the layout of the answer messages, to be increased when PromptAssembler changes the messages it builds
+PROMPT_LAYOUT_VERSION = 1
+
+
+def prompt_version(metrics_json: dict, templates_json: dict) -> str:
+    """
+    Get the version of the answer prompts: the version of their layout and a digest of the instructions and of the
+    definitions of the metrics and the templates (see LlmRequestAnswerer.answer_version).
+    """
+    digest = hashlib.sha256(ANSWER_INSTRUCTIONS.encode("utf-8"))
+    digest.update(serialize_block("Metrics", metrics_json).encode("utf-8"))
+    digest.update(serialize_block("Templates", templates_json).encode("utf-8"))
+    return f"{PROMPT_LAYOUT_VERSION}.{digest.hexdigest()[:12]}"
+
+
+def serialize_block(title: str, data) -> str:
+    """
+    Serialize a block of the prompt deterministically: the same data always gives the same text.
+    """
+    return f"{title}:\n{json.dumps(data, sort_keys=True, ensure_ascii=False)}"
+
+
+def template_sources(templates_data: list[dict]) -> dict[str, dict]:
+    """
+    Get the templates sent to the model from the template search hits, by template ID, without their embedding.
+    """
+    return {hit["_id"]: {key: value for key, value in hit["_source"].items() if not key.endswith("_embedding")}
+            for hit in templates_data}
+
+
+def format_comparison_table(company_id_list: list[int], facts_by_company: dict[int, list[dict]]) -> str:
+    """
+    Format the facts of several companies as a table aligned by metric and period: 1 row per metric and period,
+    1 column per company ("-" if the company has no fact for the row).
+    """
+    rows: dict[tuple[str, str], dict] = {}
+    for company_id in company_id_list:
+        for fact in facts_by_company.get(company_id, []):
+            row = rows.setdefault((fact["metric"].lower(), normalize_period(fact["period"])),
+                                  {"metric": fact["metric"], "period": fact["period"], "values": {}})
+            row["values"][company_id] = format_fact_value(fact)
+
+    line_list = [" | ".join(["Metric", "Period"] + [f"Company {company_id}" for company_id in company_id_list])]
+    for row in rows.values():
+        line_list.append(" | ".join([row["metric"], row["period"]] +
+                                    [row["values"].get(company_id, "-") for company_id in company_id_list]))
+    return "\n".join(line_list)
+
+
+class PromptAssembler:
+    """
+    Builder of the answer messages, memoizing the serialized reference block (metrics and templates).
+    The block is memoized by the names of the metrics, the IDs of the templates and the generation of their
+    definitions (see models.retrieval_cache.METRICS_AND_TEMPLATES_GENERATION): the definitions can change at each
+    ingestion.
+    """
+
+    def __init__(self, cache_max_entries: int):
+        self.cache_max_entries  : int = cache_max_entries
+        self.reference_blocks   : OrderedDict[tuple, str] = OrderedDict()
+        self._lock              : threading.Lock = threading.Lock()
+
+    def reference_block(self, metrics_data: dict[str, dict], templates_data: list[dict], generation: int) -> str:
+        """
+        Get the serialized definitions of the metrics and templates, memoized per set of metrics and templates and per
+        generation of their definitions (least recently used sets evicted first).
+        """
+        key = (generation, tuple(sorted(metrics_data)), tuple(sorted(hit["_id"] for hit in templates_data)))
+        with self._lock:
+            block = self.reference_blocks.get(key)
+            if block is not None:
+                self.reference_blocks.move_to_end(key)
+                return block
+
+        block = "\n\n".join([
+            serialize_block("Metrics",                              metrics_data),
+            serialize_block("Templates you can use in your answer", template_sources(templates_data)),
+        ])
+        with self._lock:
+            self.reference_blocks[key] = block
+            while len(self.reference_blocks) > self.cache_max_entries:
+                self.reference_blocks.popitem(last=False)
+        return block
+
+    def build_messages(self, request: QueryRequest, request_related_data: RequestRelatedData,
+                       history_messages: list[dict] = None) -> list[dict]:
+        """
+        Build the messages sent to the LLM model to answer the user query (see the module documentation for the layout).
+        """
+        reference_block = self.reference_block(request_related_data.metrics_data, request_related_data.templates_data,
+                                               request_related_data.definitions_generation)
+        company_data    = "\n".join(line.strip() for line in request_related_data.company_data)
+
+        return [
+            {
+                "role": "system",
+                "content": f"{ANSWER_INSTRUCTIONS}\n\n{reference_block}"
+            },
+            *(history_messages or []),
+            {
+                "role": "user",
+                "content": f"Company: {request.company_id}\n"
+                           f"Company-related data:\n{company_data}\n\n"
+                           f"User request: \"{request.query}\""
+            }
+        ]
+
+    def build_comparison_messages(self, request: QueryComparisonRequest, facts_by_company: dict[int, list[dict]],
+                                  other_lines_by_company: dict[int, list[str]], metrics_data: dict[str, dict],
+                                  templates_data: list[dict], generation: int) -> list[dict]:
+        """
+        Build the messages sent to the LLM model to answer a comparison of several companies with a single call:
+        the facts of the companies aligned in a table, then the data lines from which no fact was extracted.
+        The generation is the one under which the definitions of the metrics and templates were retrieved.
+        """
+        reference_block = self.reference_block(metrics_data, templates_data, generation)
+        other_data      = "\n".join(f"Company {company_id}: {line.strip()}"
+                                    for company_id in request.company_ids for line in other_lines_by_company.get(company_id, []))
+
+        return [
+            {
+                "role": "system",
+                "content": f"{COMPARISON_INSTRUCTIONS}\n\n{reference_block}"
+            },
+            {
+                "role": "user",
+                "content": f"Companies: {', '.join(str(company_id) for company_id in request.company_ids)}\n"
+                           f"Company-related data:\n{format_comparison_table(request.company_ids, facts_by_company)}\n\n"
+                           f"Other company-related data:\n{other_data or '-'}\n\n"
+                           f"User request: \"{request.query}\""
+            }
+        ]
@@ -3,14 +3,66 @@ This module provides functionality for fetching the known data (context) that wi
 These fetched data are the company-related data, the templates and the metrics.
 """
 
+import json
 import re
+from typing import Optional
+
+import numpy
 from opensearchpy import OpenSearch
 
 from db_scripts.create_index_script import instantiate_open_search_client
-from models.llm_request_parser import LlmRequestParser
-from models.llm_utils import QueryRequest, get_embedding
+from models.fact_store import FactStore, extract_fact, format_fact
+from models.llm_request_parser import LlmRequestParser, RequestContext
+from models.llm_utils import QueryRequest, get_embedding, get_embeddings
+from models.raw_line_store import RawLineStore
+from models.retrieval_cache import METRICS_AND_TEMPLATES_GENERATION, RetrievalCache
+from utils.client_management import ClientRegistry, get_client_registry
 from utils.config_management import Config
 from utils.log_management import log, log_error
+from utils.template_management import match_company_data_line_with_template
+from utils.value_normalization import parse_period_range
+
+
+def reciprocal_rank_fusion(hit_lists: list[list[dict]], rrf_k: int, size: int) -> list[dict]:
+    """
+    Merge several ranked lists of OpenSearch hits using the reciprocal rank fusion:
+    each hit is scored by the sum over the lists of 1 / (rrf_k + rank).
+
+    Args:
+        hit_lists (list[list[dict]]): The ranked lists of hits (identified by their _id).
+        rrf_k (int): The rank constant, damping the weight of the top ranks.
+        size (int): The number of hits to return.
+
+    Returns:
+        list[dict]: The fused hits, best first.
+    """
+    scores  : dict[str, float]  = {}
+    hits    : dict[str, dict]   = {}
+    for hit_list in hit_lists:
+        for rank, hit in enumerate(hit_list, start=1):
+            scores[hit["_id"]]  = scores.get(hit["_id"], 0.0) + 1.0 / (rrf_k + rank)
+            hits[hit["_id"]]    = hit
+
+    return [hits[hit_id] for hit_id in sorted(scores, key=scores.get, reverse=True)[:size]]
+
+
+def build_metric_template_routes(metrics_json: dict, templates_json: dict) -> dict[str, list[dict]]:
+    """
+    Build the map from each metric to the templates that apply to it (the 'templates' declared in the metrics file),
+    formatted as template search hits.
+
+    Args:
+        metrics_json (dict): The json content of the metrics file.
+        templates_json (dict): The json content of the template file.
+
+    Returns:
+        dict[str, list[dict]]: The template hits ({"_id", "_source"}) by lowercase metric name.
+    """
+    return {
+        metric["metric_name"].lower(): [{"_id": template_id, "_source": templates_json[template_id]}
+                                        for template_id in metric.get("templates", []) if template_id in templates_json]
+        for metric in metrics_json.values()
+    }
 
 
 def keep_only_keywords(query: str) -> list:
@@ -25,12 +77,16 @@ def keep_only_keywords(query: str) -> list:
 
 class RequestRelatedData:
     """
-    Class that stores the data needed to answer a specific request
+    Class that stores the data needed to answer a specific request.
+    definitions_generation is the generation of the metrics and templates (see models.retrieval_cache) when the data
+    were retrieved.
     """
-    def __init__(self, company_data: list = [], metrics_data: dict = {}, templates_data : dict = {}):
-        self.company_data   : list[str]         = company_data
-        self.metrics_data   : dict[str, dict]   = metrics_data
-        self.templates_data : dict              = templates_data
+    def __init__(self, company_data: list = [], metrics_data: dict = {}, templates_data : dict = {},
+                 definitions_generation: int = 0):
+        self.company_data           : list[str]         = company_data
+        self.metrics_data           : dict[str, dict]   = metrics_data
+        self.templates_data         : dict              = templates_data
+        self.definitions_generation : int               = definitions_generation
 
 
 class RagHandler:
@@ -47,8 +103,17 @@ class RagHandler:
         try:
             log("Initializing RAG handler", "info")
 
+            self.client_registry        : ClientRegistry        = get_client_registry(config)
             self.client                 : OpenSearch            = instantiate_open_search_client(config)
             self.config                 : Config                = config
+            self.fact_store             : FactStore             = FactStore(config)
+            self.company_retrieval_config: dict                 = config.load_config(["database", "company_data", "retrieval"])
+            self.templates_retrieval_config: dict               = config.load_config(["database", "templates_data", "retrieval"])
+            self.metrics_json           : dict                  = self.load_json_file(config.load_config(["paths", "metrics_data_path"]))
+            self.templates_json         : dict                  = self.load_json_file(config.load_config(["paths", "templates_data_path"]))
+            self.metric_template_routes : dict[str, list[dict]] = build_metric_template_routes(self.metrics_json, self.templates_json)
+            self.retrieval_cache        : RetrievalCache        = RetrievalCache(config)
+            self.raw_line_store         : RawLineStore          = RawLineStore(config.load_config(["paths", "raw_line_store_path"]))
             self.request_related_data   : RequestRelatedData    = RequestRelatedData()
 
             log("RAG handler initialized successfully", "info")
@@ -62,70 +127,347 @@ class RagHandler:
         Args:
             query_request : The query request received from the client and preparsed.
         """
+        self.request_related_data = self.get_context_related_to_request(query_request.request_context)
+
+    def get_context_related_to_request(self, request_context: RequestContext) -> RequestRelatedData:
+        """
+        Fetch the context related to the client request from OpenSearch, unless it is in the retrieval cache.
+        Unlike set_context_related_to_request, this method does not modify the handler and can be called concurrently.
 
-        log(f"{self.__class__.__name__}: Retrieving company-data, template and metrics related to query for company_id {query_request.request_context.company_id}: {query_request.request_context.query}", "info")
+        Args:
+            request_context (RequestContext): The context of the preparsed client request.
 
-        self.request_related_data = RequestRelatedData(
-            company_data    = self.fetch_company_data(query_request),
-            metrics_data    = self.fetch_metrics(query_request),
-            templates_data  = self.fetch_templates(query_request)
+        Returns:
+            RequestRelatedData: The company-related data, the metrics and the templates related to the request.
+        """
+        cache_key = self.retrieval_cache.key(request_context)
+        request_related_data = self.retrieval_cache.get(cache_key)
+        if request_related_data is None:
+            request_related_data = self.retrieve_context_related_to_request(request_context)
+            self.retrieval_cache.put(cache_key, request_related_data)
+        return request_related_data
+
+    def retrieve_context_related_to_request(self, request_context: RequestContext) -> RequestRelatedData:
+        """
+        Fetch the context related to the client request from OpenSearch (see get_context_related_to_request).
+        """
+        log(f"{self.__class__.__name__}: Retrieving company-data, template and metrics related to query for company_id {request_context.company_id}: {request_context.query}", "info")
+        # Read before the retrieval: data retrieved during an update are labelled with the previous generation
+        definitions_generation = self.retrieval_cache.get_generation(METRICS_AND_TEMPLATES_GENERATION)
+
+        # Simple lookups (known metric and period) are answered with the compact facts instead of the raw data lines
+        fact_list = self.fact_store.find_facts(request_context)
+        if fact_list:
+            log(f"{len(fact_list)} facts found in the fact store: skipping the company-related data retrieval", "info")
+            company_data = [format_fact(fact) for fact in fact_list]
+        else:
+            company_data = self.fetch_company_data(request_context)
+
+        metrics_data    = self.fetch_metrics(request_context)
+        templates_data  = self.route_templates(metrics_data)
+        if templates_data is None:
+            templates_data = self.fetch_templates(request_context)
+
+        return RequestRelatedData(
+            company_data            = company_data,
+            metrics_data            = metrics_data,
+            templates_data          = templates_data,
+            definitions_generation  = definitions_generation
         )
 
-        return
+    def get_company_facts(self, request_context: RequestContext, request_related_data: RequestRelatedData) -> tuple[list[dict], list[str]]:
+        """
+        Get the facts (see models.fact_store) related to a request: from the fact store if it answers the request,
+        otherwise extracted from the retrieved company-related data lines.
+
+        Args:
+            request_context (RequestContext): The context of the preparsed client request.
+            request_related_data (RequestRelatedData): The data retrieved for the request.
 
-    def fetch_company_data(self, query_request: LlmRequestParser) -> list:
+        Returns:
+            tuple[list[dict], list[str]]: The facts, and the retrieved data lines from which no fact was extracted.
         """
-        Fetch the company-related data from OpenSearch.
-        Optimization: extracts from the query some data (period, metric, etc) and uses them to retrieve the company-related data from the index table.
+        fact_list = self.fact_store.find_facts(request_context)
+        if fact_list:
+            return fact_list, []
+
+        other_line_list = []
+        for data_line in request_related_data.company_data:
+            _, key_word_values = match_company_data_line_with_template(data_line, self.templates_json)
+            fact = extract_fact(request_context.company_id, key_word_values)
+            if fact is not None:
+                fact_list.append(fact)
+            else:
+                other_line_list.append(data_line)
+        return fact_list, other_line_list
+
+    def get_context_related_to_company_requests(self, request_context_list: list[RequestContext]) -> list[RequestRelatedData]:
+        """
+        Fetch the context related to several client requests about the same company.
+        The requests found in the retrieval cache are served from it, the others are retrieved together
+        (see retrieve_context_related_to_company_requests).
 
         Args:
-            query_request : The query request received from the client and preparsed.
+            request_context_list (list[RequestContext]): The contexts of the preparsed client requests (same company_id).
 
         Returns:
-            str: The company-related data.
+            list[RequestRelatedData]: The data related to each request, in the order of request_context_list.
         """
+        cache_keys                  = [self.retrieval_cache.key(request_context) for request_context in request_context_list]
+        request_related_data_list   = [self.retrieval_cache.get(cache_key) for cache_key in cache_keys]
 
-        log("Fetch company-related data relative to the query", "info")
+        missing_indices = [i for i, request_related_data in enumerate(request_related_data_list) if request_related_data is None]
+        retrieved_list  = self.retrieve_context_related_to_company_requests([request_context_list[i] for i in missing_indices])
+        for i, request_related_data in zip(missing_indices, retrieved_list):
+            request_related_data_list[i] = request_related_data
+            self.retrieval_cache.put(cache_keys[i], request_related_data)
 
-        company_index: str = self.config.load_config(["database", "company_data", "index_name"])
+        return request_related_data_list
+
+    def retrieve_context_related_to_company_requests(self, request_context_list: list[RequestContext]) -> list[RequestRelatedData]:
+        """
+        Fetch the context related to several client requests about the same company from OpenSearch.
+        As in retrieve_context_related_to_request, the requests answered by the fact store skip the company-related
+        data retrieval. The company-related data, the metrics and the templates of the other requests are each fetched
+        in a single multi-search, and all the queries are embedded in one pass.
+        The templates are routed from the metrics when possible (see route_templates), without search.
+
+        Args:
+            request_context_list (list[RequestContext]): The contexts of the preparsed client requests (same company_id).
+
+        Returns:
+            list[RequestRelatedData]: The data related to each request, in the order of request_context_list.
+        """
+        if not request_context_list:
+            return []
+
+        log(f"{self.__class__.__name__}: Retrieving company-data, template and metrics related to {len(request_context_list)} queries for company_id {request_context_list[0].company_id}", "info")
+        definitions_generation = self.retrieval_cache.get_generation(METRICS_AND_TEMPLATES_GENERATION)
+
+        company_index   : str = self.config.load_config(["database", "company_data", "index_name"])
+        templates_index : str = self.config.load_config(["database", "templates_data", "index_name"])
+        metrics_index   : str = self.config.load_config(["database", "metrics_data", "index_name"])
+
+        # Simple lookups (known metric and period) are answered with the compact facts instead of the raw data lines
+        company_data_list: list[Optional[list[str]]] = []
+        for request_context in request_context_list:
+            fact_list = self.fact_store.find_facts(request_context)
+            company_data_list.append([format_fact(fact) for fact in fact_list] if fact_list else None)
+        log(f"{sum(company_data is not None for company_data in company_data_list)} queries answered by the fact store: "
+            f"skipping their company-related data retrieval", "info")
+
+        # The metrics of each request are matched on its own query, in a single round trip
+        metrics_hits        = self.multi_search(metrics_index, [self.build_metrics_query(request_context)
+                                                                for request_context in request_context_list])
+        metrics_data_list   = [{hit["_source"]["metric_name"]: hit["_source"] for hit in hits} for hits in metrics_hits]
+        templates_data_list = [self.route_templates(metrics_data) for metrics_data in metrics_data_list]
+
+        # The queries are embedded only for the vector searches: kNN over the data lines, or templates not routed
+        embedded_indices = [i for i in range(len(request_context_list))
+                            if (company_data_list[i] is None and self.company_retrieval_config["vector_search"])
+                            or templates_data_list[i] is None]
+        embeddings: list[Optional[numpy.ndarray]] = [None] * len(request_context_list)
+        if embedded_indices:
+            for i, embedding in zip(embedded_indices, get_embeddings(self.config, [request_context_list[i].query
+                                                                                   for i in embedded_indices])):
+                embeddings[i] = embedding
+
+        # The lexical (and vector) searches of all the requests are sent in a single round trip
+        searched_indices = [i for i, company_data in enumerate(company_data_list) if company_data is None]
+        if searched_indices:
+            company_bodies      = [self.build_company_data_queries(request_context_list[i], embeddings[i])
+                                   for i in searched_indices]
+            company_hits        = self.multi_search(company_index, [body for bodies in company_bodies for body in bodies])
+            queries_per_request = len(company_bodies[0])
+            for position, i in enumerate(searched_indices):
+                start = position * queries_per_request
+                company_data_list[i] = self.fuse_company_data_hits(company_hits[start: start + queries_per_request])
+
+        unrouted_indices = [i for i, templates_data in enumerate(templates_data_list) if templates_data is None]
+        if unrouted_indices:
+            templates_hits = self.multi_search(templates_index, [self.build_templates_query(embeddings[i])
+                                                                 for i in unrouted_indices])
+            for i, hits in zip(unrouted_indices, templates_hits):
+                templates_data_list[i] = hits
+
+        return [
+            RequestRelatedData(
+                company_data            = company_data,
+                metrics_data            = metrics_data,
+                templates_data          = templates_data,
+                definitions_generation  = definitions_generation
+            )
+            for company_data, metrics_data, templates_data in zip(company_data_list, metrics_data_list, templates_data_list)
+        ]
+
+    @staticmethod
+    def load_json_file(path: str) -> dict:
+        with open(path, 'r') as json_file:
+            return json.load(json_file)
+
+    def route_templates(self, metrics_data: dict[str, dict]) -> Optional[list[dict]]:
+        """
+        Get the templates that apply to the metrics related to a request, from the metric-to-templates map.
+
+        Args:
+            metrics_data (dict[str, dict]): The metrics related to the request, by metric name.
+
+        Returns:
+            Optional[list[dict]]: The template hits, or None if no metric is routed to a template (the templates must
+                                  then be searched with fetch_templates).
+        """
+        templates_data: dict[str, dict] = {}
+        for metric_name in metrics_data:
+            for template_hit in self.metric_template_routes.get(metric_name.lower(), []):
+                templates_data.setdefault(template_hit["_id"], template_hit)
+
+        if not templates_data:
+            return None
+        log(f"Templates routed from the metrics {list(metrics_data)}: {list(templates_data)}", "info")
+        return list(templates_data.values())
+
+    def multi_search(self, index_name: str, body_list: list[dict]) -> list[list[dict]]:
+        """
+        Run several searches on the same index in a single OpenSearch round trip.
+
+        Args:
+            index_name (str): The name of the index to search.
+            body_list (list[dict]): The bodies of the searches.
 
-        body = {
+        Returns:
+            list[list[dict]]: The hits of each search, in the order of body_list.
+        """
+        msearch_body = []
+        for body in body_list:
+            msearch_body.append({"index": index_name})
+            msearch_body.append(body)
+
+        response = self.client_registry.call_open_search(self.client.msearch, body=msearch_body)
+        return [sub_response["hits"]["hits"] for sub_response in response["responses"]]
+
+    @staticmethod
+    def build_company_data_filter(request_context: RequestContext) -> list[dict]:
+        """
+        Build the filter shared by the lexical and vector searches of company-related data: the lines of the company and,
+        if a period can be parsed from the inferred date, only the lines whose current period overlaps it. The lines
+        without a parsed period (not matching a template) are kept: their relevance is left to the scoring.
+        """
+        filter_list = [{"term": {"company_id": request_context.company_id}}]
+
+        period_start, period_end = parse_period_range(request_context.date)
+        if period_start is not None:
+            filter_list.append({"bool": {
+                "should": [
+                    {"bool": {"filter": [
+                        {"range": {"current_period_start"   : {"lte": period_end.isoformat()}}},
+                        {"range": {"current_period_end"     : {"gte": period_start.isoformat()}}},
+                    ]}},
+                    {"bool": {"must_not": {"exists": {"field": "current_period_start"}}}},
+                ],
+                "minimum_should_match": 1
+            }})
+
+        return filter_list
+
+    def build_company_data_queries(self, request_context: RequestContext, embedding: Optional[numpy.ndarray] = None) -> list[dict]:
+        """
+        Build the OpenSearch queries retrieving the company-related data relative to a request:
+        a filtered BM25 query and, if the vector search is enabled, a filtered kNN query over the line embeddings.
+
+        Args:
+            request_context (RequestContext): The context of the preparsed client request.
+            embedding (numpy.ndarray): The embedding of the query. Computed if needed and not provided.
+
+        Returns:
+            list[dict]: The bodies of the searches, to be fused with fuse_company_data_hits.
+        """
+        size: int = self.company_retrieval_config["size"]
+
+        # Only the fields needed to get the data lines are returned
+        if self.company_retrieval_config["lean_documents"]:
+            source_fields = ["company_id", "raw_data_line_offset", "raw_data_line_length"]
+        else:
+            source_fields = ["raw_data_line"]
+
+        body_list = [{
+            "size": size,
+            "_source": source_fields,
             "query": {
                 "bool": {
+                    "filter": self.build_company_data_filter(request_context),
                     "should": [
-                        {"match": {"company_id"     : query_request.request_context.company_id}},
-                        {"match": {"current_period" : query_request.request_context.date}},
-
-                        # TODO Find the metric in the request and use it in requesting the index
-                        #{"match": {"metric_name": keyword}} for keyword in keywords
+                        {"match": {"current_period" : request_context.date}},
+                        {"match": {"raw_data_line"  : request_context.query}},
                     ]
                 }
             }
-        }
+        }]
+        # Lexical hits scoring below the cutoff are not relevant enough to be sent to the model
+        if self.company_retrieval_config["min_score"] > 0:
+            body_list[0]["min_score"] = self.company_retrieval_config["min_score"]
+
+        if self.company_retrieval_config["vector_search"]:
+            if embedding is None:
+                embedding = get_embedding(self.config, request_context.query)
+            knn_k: int = self.company_retrieval_config["knn_k"]
+            # The filter is applied during the kNN search (efficient filtering of the lucene engine, see the index
+            # mapping) rather than on its k hits: a filtered-out hit would otherwise take the place of a line of the company
+            body_list.append({
+                "size": knn_k,
+                "_source": source_fields,
+                "query": {
+                    "knn": {
+                        "raw_data_line_embedding": {
+                            "vector": embedding.tolist(),
+                            "k"     : knn_k,
+                            "filter": {"bool": {"filter": self.build_company_data_filter(request_context)}},
+                        }
+                    }
+                }
+            })
 
-        response = self.client.search(index=company_index, body=body)
-        response = [hit["_source"] for hit in response["hits"]["hits"]]
-        return [data_dict['raw_data_line'] for data_dict in response]
+        return body_list
 
-    def fetch_metrics(self, query_request: LlmRequestParser) -> dict:
+    def fuse_company_data_hits(self, hit_lists: list[list[dict]]) -> list[str]:
         """
-        Fetch from the input  index tables the metrics related to the query from OpenSearch using
-        keyword matching between the query and the metric_name parameter of the metrics table.
-
-        Args:
-            query_request : The query request received from the client and preparsed.
-
-        Returns:
-            dict[str, dict]: The list of all the metrics that match a keyword in the request (1 dictionary per metric).
+        Fuse the hits of the searches built by build_company_data_queries and return the matching data lines.
+        """
+        hits = reciprocal_rank_fusion(hit_lists,
+                                      rrf_k   = self.company_retrieval_config["rrf_k"],
+                                      size    = self.company_retrieval_config["size"])
+        if self.company_retrieval_config["lean_documents"]:
+            return [self.raw_line_store.get(hit["_index"], hit["_source"]["company_id"], hit["_source"]["raw_data_line_offset"],
+                                            hit["_source"]["raw_data_line_length"]) for hit in hits]
+        return [hit["_source"]['raw_data_line'] for hit in hits]
+
+    def build_templates_query(self, embedding: numpy.ndarray) -> dict:
         """
+        Build the OpenSearch kNN query retrieving the templates semantically close to an embedded request.
+        """
+        knn_param: int = self.templates_retrieval_config["knn_k"]
 
-        log("Fetch metrics data relative to the query", "info")
+        return {
+            "size": knn_param,
+            "_source": {"excludes": ["template_embedding"]},
+            "query": {
+                "knn": {
+                    "template_embedding": {
+                        "vector": embedding.tolist(),
+                        "k": knn_param
+                    }
+                }
+            }
+        }
 
-        metrics_index   : str       = self.config.load_config(["database", "metrics_data", "index_name"])
-        keywords        : list[str] = keep_only_keywords(query_request.request_context.query)
+    @staticmethod
+    def build_metrics_query(request_context: RequestContext) -> dict:
+        """
+        Build the OpenSearch query retrieving the metrics whose metric_name matches a keyword of a request.
+        """
+        keywords: list[str] = list(dict.fromkeys(keep_only_keywords(request_context.query)))
 
         # Construct a bool query to match any of the keywords in the metric_name field
-        body = {
+        return {
             "query": {
                 "bool": {
                     "should": [
@@ -135,17 +477,54 @@ class RagHandler:
             }
         }
 
-        response = self.client.search(index=metrics_index, body=body)
+    def fetch_company_data(self, request_context: RequestContext) -> list:
+        """
+        Fetch the company-related data from OpenSearch.
+        Optimization: extracts from the query some data (period, metric, etc) and uses them to retrieve the company-related data from the index table.
+        The lexical and vector searches are sent in a single round trip and fused by reciprocal rank.
+
+        Args:
+            request_context (RequestContext): The context of the preparsed client request.
+
+        Returns:
+            str: The company-related data.
+        """
+
+        log("Fetch company-related data relative to the query", "info")
+
+        company_index: str = self.config.load_config(["database", "company_data", "index_name"])
+
+        hit_lists = self.multi_search(company_index, self.build_company_data_queries(request_context))
+        return self.fuse_company_data_hits(hit_lists)
+
+    def fetch_metrics(self, request_context: RequestContext) -> dict:
+        """
+        Fetch from the input  index tables the metrics related to the query from OpenSearch using
+        keyword matching between the query and the metric_name parameter of the metrics table.
+
+        Args:
+            request_context (RequestContext): The context of the preparsed client request.
+
+        Returns:
+            dict[str, dict]: The list of all the metrics that match a keyword in the request (1 dictionary per metric).
+        """
+
+        log("Fetch metrics data relative to the query", "info")
+
+        metrics_index: str = self.config.load_config(["database", "metrics_data", "index_name"])
+
+        body = self.build_metrics_query(request_context)
+        response = self.client_registry.call_open_search(self.client.search, index=metrics_index, body=body)
         metrics_list = [hit["_source"] for hit in response["hits"]["hits"]]
         return {metric['metric_name']: metric for metric in metrics_list}
 
-    def fetch_templates(self, query_request: LlmRequestParser) -> dict:
+    def fetch_templates(self, request_context: RequestContext) -> dict:
         """
         Fetch from the input  index tables the templates related to the query from OpenSearch using
         semantic matching between the query and the analysis_type parameter of the templates table.
 
         Args:
-            query_request : The query request received from the client and preparsed.
+            request_context (RequestContext): The context of the preparsed client request.
 
         Returns:
             dict[str, dict]: The list of all the templates that match the query (1 dictionary per template).
@@ -155,23 +534,11 @@ class RagHandler:
 
         templates_index: str = self.config.load_config(["database", "templates_data", "index_name"])
 
-        embedding = get_embedding(self.config, query_request.request_context.query)
-
-        knn_param = 5 #TODO optimize
+        embedding = get_embedding(self.config, request_context.query)
 
-        query = {
-            "size": knn_param,
-            "query": {
-                "knn": {
-                    "template_embedding": {
-                        "vector": embedding.tolist(),
-                        "k": knn_param
-                    }
-                }
-            }
-        }
+        query = self.build_templates_query(embedding)
 
-        response = self.client.search(index=templates_index, body=query)
+        response = self.client_registry.call_open_search(self.client.search, index=templates_index, body=query)
         return response['hits']['hits']
 
 
@@ -0,0 +1,108 @@
+"""
+This module provides the local store of the raw company-related data lines, used when the company documents are lean
+(the 'lean_documents' parameter of the company data retrieval configuration): OpenSearch indexes the lines for the
+search but does not store them in the _source of the documents, which only hold the position of the line in the store.
+
+The lines of each company are stored in a segment file per index version (<index_name>/<company_id>.seg), so that the
+documents of an index always refer to the segments written for it. A full upload of a company replaces its segment,
+the incremental updates append to it, and the segments of an index version are deleted with it.
+The segments are memory-mapped on the first read: a hit is resolved to its line by slicing the mapping, without reading
+the file.
+"""
+
+import mmap
+import os
+import shutil
+import threading
+
+from utils.log_management import log
+
+
+class RawLineStore:
+    """
+    Store of data lines, with one memory-mapped segment file per index version and company.
+
+    Attributes:
+        path (str): The directory of the segment files.
+    """
+
+    def __init__(self, path: str):
+        self.path       : str = path
+        self.segments   : dict[tuple[str, int], tuple[mmap.mmap, int]] = {}
+        self._lock      : threading.Lock = threading.Lock()
+
+    def index_path(self, index_name: str) -> str:
+        return os.path.join(self.path, index_name)
+
+    def segment_path(self, index_name: str, company_id: int) -> str:
+        return os.path.join(self.index_path(index_name), f"{company_id}.seg")
+
+    def append(self, index_name: str, company_id: int, line_list: list[str]) -> list[tuple[int, int]]:
+        """
+        Append lines to the segment of a company in an index.
+
+        Returns:
+            list[tuple[int, int]]: The (offset, length) in bytes of each line in the segment.
+        """
+        os.makedirs(self.index_path(index_name), exist_ok=True)
+        with self._lock, open(self.segment_path(index_name, company_id), 'ab') as segment_file:
+            return self.write_lines(segment_file, line_list)
+
+    def replace(self, index_name: str, company_id: int, line_list: list[str]) -> list[tuple[int, int]]:
+        """
+        Replace the segment of a company in an index with the given lines (all the lines of the company). The segment
+        file is replaced atomically.
+
+        Returns:
+            list[tuple[int, int]]: The (offset, length) in bytes of each line in the segment.
+        """
+        os.makedirs(self.index_path(index_name), exist_ok=True)
+        segment_path = self.segment_path(index_name, company_id)
+        with self._lock:
+            with open(segment_path + ".tmp", 'wb') as segment_file:
+                position_list = self.write_lines(segment_file, line_list)
+            os.replace(segment_path + ".tmp", segment_path)
+        return position_list
+
+    @staticmethod
+    def write_lines(segment_file, line_list: list[str]) -> list[tuple[int, int]]:
+        position_list = []
+        offset = segment_file.tell()
+        for line in line_list:
+            data = line.encode("utf-8")
+            segment_file.write(data)
+            position_list.append((offset, len(data)))
+            offset += len(data)
+        return position_list
+
+    def get(self, index_name: str, company_id: int, offset: int, length: int) -> str:
+        """
+        Get a line from its position in the segment of a company in an index.
+        """
+        segment, inode = self.segments.get((index_name, company_id), (None, None))
+        if segment is None or offset + length > len(segment) \
+                or os.stat(self.segment_path(index_name, company_id)).st_ino != inode:
+            # Not mapped yet, lines were appended since the segment was mapped, or the segment was replaced
+            segment = self.map_segment(index_name, company_id)
+        return str(memoryview(segment)[offset: offset + length], "utf-8")
+
+    def map_segment(self, index_name: str, company_id: int) -> mmap.mmap:
+        with self._lock:
+            log(f"Mapping the raw line segment of company {company_id} in index {index_name}", "info")
+            with open(self.segment_path(index_name, company_id), 'rb') as segment_file:
+                segment = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+                inode   = os.fstat(segment_file.fileno()).st_ino
+            # The previous mapping is released by the garbage collector once no line is being read from it
+            self.segments[(index_name, company_id)] = (segment, inode)
+        return segment
+
+    def delete_index(self, index_name: str) -> None:
+        """
+        Delete the segments of an index (e.g. of a deleted index version).
+        """
+        with self._lock:
+            for key in [key for key in self.segments if key[0] == index_name]:
+                del self.segments[key]
+            if os.path.isdir(self.index_path(index_name)):
+                log(f"Deleting the raw line segments of index {index_name}", "info")
+                shutil.rmtree(self.index_path(index_name))
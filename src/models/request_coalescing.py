@@ -0,0 +1,91 @@
+"""
+This module provides the single-flight deduplication of identical in-flight requests:
+while a computation is running for a key, the concurrent calls with the same key wait for its result instead of
+running the same computation again.
+"""
+
+import re
+import threading
+from typing import Any, Callable, Hashable
+
+from utils.log_management import log
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so that trivially different spellings of the same query are coalesced (case, whitespaces).
+    """
+    return re.sub(r'\s+', ' ', query).strip().lower()
+
+
+class _Call:
+    def __init__(self):
+        self.done       : threading.Event = threading.Event()
+        self.result     : Any = None
+        self.exception  : BaseException = None
+
+
+class SingleFlight:
+    """
+    Single-flight executor.
+
+    Attributes:
+        call_count (int): The number of calls.
+        coalesced_count (int): The number of calls served by the computation of another call.
+    """
+
+    def __init__(self):
+        self.call_count         : int = 0
+        self.coalesced_count    : int = 0
+        self._calls             : dict[Hashable, _Call] = {}
+        self._lock              : threading.Lock = threading.Lock()
+
+    def do(self, key: Hashable, func: Callable, *args, **kwargs) -> Any:
+        """
+        Call func(*args, **kwargs), unless a call with the same key is in flight: then wait for its result.
+        The exception raised by the computation, if any, is raised to all the coalesced callers.
+
+        Args:
+            key (Hashable): The key identifying identical calls.
+            func (Callable): The computation.
+
+        Returns:
+            Any: The result of the computation.
+        """
+        with self._lock:
+            self.call_count += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.coalesced_count += 1
+
+        if not leader:
+            log(f"Coalescing with the identical in-flight request {key}", "info")
+            call.done.wait()
+        else:
+            try:
+                call.result = func(*args, **kwargs)
+            except BaseException as e:
+                call.exception = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+
+        if call.exception is not None:
+            raise call.exception
+        return call.result
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: The call count, the coalesced call count and the coalescing ratio (coalesced / calls).
+        """
+        with self._lock:
+            return {
+                "call_count"        : self.call_count,
+                "coalesced_count"   : self.coalesced_count,
+                "coalescing_ratio"  : self.coalesced_count / self.call_count if self.call_count else 0.0,
+            }
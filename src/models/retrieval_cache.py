@@ -0,0 +1,215 @@
+"""
+This module provides the cache of the data retrieved for the requests (see models.rag.RagHandler).
+The retrieved data only depend on the company, the period and the query, until the indexed data change: an entry is
+keyed on these normalized inputs and on the generations of the data it was retrieved from. The ingestion scripts bump
+the generation of each company they update (and the generation of the metrics and templates), so that the stale
+entries are never served again and age out of the cache.
+
+Two backends are available (the 'backend' parameter of the 'retrieval_cache' configuration section):
+    - "local":  the entries are kept in process (bounded LRU), the generations in a SQLite file shared with the
+                ingestion scripts;
+    - "redis":  the entries (with a TTL) and the generations are kept in Redis, shared by all the processes.
+"""
+
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from models.llm_request_parser import RequestContext
+from models.request_coalescing import normalize_query
+from utils.config_management import Config
+from utils.log_management import log, log_error
+from utils.sqlite_management import ProcessSqliteConnection
+from utils.value_normalization import parse_period_range
+
+METRICS_AND_TEMPLATES_GENERATION = "metrics_and_templates"
+
+
+def company_generation_name(company_id: int) -> str:
+    return f"company:{company_id}"
+
+
+def retrieval_cache_key(request_context: RequestContext) -> str:
+    """
+    Compute the key of the retrieval inputs of a request: the company, the period (parsed, so that different spellings
+    of the same period share the key) and the normalized query.
+    """
+    period_start, period_end = parse_period_range(request_context.date or "")
+    period = f"{period_start}/{period_end}" if period_start is not None else normalize_query(request_context.date or "")
+    return f"{request_context.company_id}|{period}|{normalize_query(request_context.query)}"
+
+
+class LocalRetrievalCacheBackend:
+    """
+    In-process LRU store of the entries, with the generations stored in a SQLite file.
+    """
+
+    def __init__(self, generations_path: str, max_entries: int, ttl_s: float):
+        self.max_entries    : int   = max_entries
+        self.ttl_s          : float = ttl_s
+        self.entries        : OrderedDict[str, tuple[float, object]] = OrderedDict()
+        self._lock          : threading.Lock = threading.Lock()
+
+        self.connection     : ProcessSqliteConnection = ProcessSqliteConnection(generations_path, [
+            "CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, generation INTEGER NOT NULL)",
+        ])
+
+    def get_generation(self, name: str) -> int:
+        with self._lock:
+            row = self.connection.get().execute("SELECT generation FROM generations WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self, name: str) -> None:
+        with self._lock:
+            self.connection.get().execute("INSERT INTO generations (name, generation) VALUES (?, 1) "
+                                     "ON CONFLICT(name) DO UPDATE SET generation = generation + 1", (name,))
+            self.connection.get().commit()
+
+    def get(self, key: str) -> Optional[object]:
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if time.monotonic() > expires_at:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: object) -> None:
+        with self._lock:
+            self.entries[key] = (time.monotonic() + self.ttl_s, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+class RedisRetrievalCacheBackend:
+    """
+    Redis store of the entries (pickled, expiring after ttl_s) and of the generations.
+    """
+
+    def __init__(self, redis_url: str, ttl_s: float, key_prefix: str = "retrieval_cache"):
+        import redis
+
+        self.client     = redis.Redis.from_url(redis_url)
+        self.ttl_s      : float = ttl_s
+        self.key_prefix : str   = key_prefix
+
+    def get_generation(self, name: str) -> int:
+        generation = self.client.get(f"{self.key_prefix}:generation:{name}")
+        return int(generation) if generation is not None else 0
+
+    def bump_generation(self, name: str) -> None:
+        self.client.incr(f"{self.key_prefix}:generation:{name}")
+
+    def get(self, key: str) -> Optional[object]:
+        value = self.client.get(f"{self.key_prefix}:entry:{key}")
+        return pickle.loads(value) if value is not None else None
+
+    def put(self, key: str, value: object) -> None:
+        self.client.set(f"{self.key_prefix}:entry:{key}", pickle.dumps(value), ex=int(self.ttl_s))
+
+
+class RetrievalCache:
+    """
+    Cache of the data retrieved for the requests, invalidated by the generations of the companies.
+    The generations are read from the backend at most every generation_check_interval_s: an update of the indices is
+    visible after at most this delay.
+
+    Attributes:
+        hit_count (int): The number of requests served from the cache.
+        miss_count (int): The number of requests not found in the cache.
+    """
+
+    def __init__(self, config: Config):
+        cache_config = config.load_config("retrieval_cache")
+
+        self.enabled                        : bool  = cache_config["enabled"]
+        self.generation_check_interval_s    : float = cache_config["generation_check_interval_s"]
+        self.hit_count                      : int   = 0
+        self.miss_count                     : int   = 0
+        self.generations                    : dict[str, tuple[float, int]] = {}
+        self._lock                          : threading.Lock = threading.Lock()
+
+        if cache_config["backend"] == "local":
+            self.backend = LocalRetrievalCacheBackend(config.load_config(["paths", "retrieval_generations_path"]),
+                                                      cache_config["max_entries"], cache_config["ttl_s"])
+        elif cache_config["backend"] == "redis":
+            self.backend = RedisRetrievalCacheBackend(cache_config["redis_url"], cache_config["ttl_s"])
+        else:
+            log_error(f"Unknown retrieval cache backend \"{cache_config['backend']}\": expected \"local\" or \"redis\"",
+                      exception_to_raise=ValueError)
+
+    def get_generation(self, name: str) -> int:
+        """
+        Get the generation of a company (or of the metrics and templates), read from the backend at most every
+        generation_check_interval_s.
+        """
+        now = time.monotonic()
+        with self._lock:
+            checked_at, generation = self.generations.get(name, (None, 0))
+        if checked_at is None or now - checked_at > self.generation_check_interval_s:
+            generation = self.backend.get_generation(name)
+            with self._lock:
+                self.generations[name] = (now, generation)
+        return generation
+
+    def bump_generation(self, name: str) -> None:
+        """
+        Invalidate the entries retrieved from the data of a company (or from the metrics and templates).
+        """
+        log(f"Bumping the retrieval cache generation of {name}", "info")
+        self.backend.bump_generation(name)
+        with self._lock:
+            self.generations.pop(name, None)
+
+    def data_generation(self, company_id: int) -> str:
+        """
+        Get the current generation of the data retrieved for a company: the generation of the metrics and templates and
+        the generation of the company.
+        """
+        return (f"{self.get_generation(METRICS_AND_TEMPLATES_GENERATION)}"
+                f".{self.get_generation(company_generation_name(company_id))}")
+
+    def key(self, request_context: RequestContext) -> str:
+        """
+        Compute the key of the entry of a request, with the current generations of its data. The key must be computed
+        before the retrieval: data retrieved while the indices are updated are stored under the previous generation.
+        """
+        return f"{self.data_generation(request_context.company_id)}|{retrieval_cache_key(request_context)}"
+
+    def get(self, key: str) -> Optional[object]:
+        """
+        Get the data retrieved for an identical request (see key), if any and not invalidated since.
+        """
+        if not self.enabled:
+            return None
+
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.miss_count += 1
+            else:
+                self.hit_count += 1
+        return value
+
+    def put(self, key: str, value: object) -> None:
+        if self.enabled:
+            self.backend.put(key, value)
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: The hit count, the miss count and the hit ratio of the cache.
+        """
+        with self._lock:
+            request_count = self.hit_count + self.miss_count
+            return {
+                "hit_count"     : self.hit_count,
+                "miss_count"    : self.miss_count,
+                "hit_ratio"     : self.hit_count / request_count if request_count else 0.0,
+            }
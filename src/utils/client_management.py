@@ -0,0 +1,304 @@
+"""
+client_management.py
+
+This module owns the network clients shared by all the components of a process: the OpenSearch client and the
+HTTP session used to request the LLM provider.
+Both keep their connections alive in pools sized from the 'clients' section of the configuration, so that TLS
+handshakes are paid once per connection instead of once per request.
+Calls going through the registry are retried with a jittered exponential backoff and protected by a circuit breaker.
+Only the transient errors (timeouts, connection errors, throttling and server errors) are retried and counted by the
+circuit breaker: a rejected request (e.g. malformed or unauthorized) fails immediately.
+"""
+
+import random
+import threading
+import time
+from typing import Any, Callable, Optional
+
+import openai
+import openai.api_requestor
+import opensearchpy
+import requests
+from opensearchpy import OpenSearch
+from requests.adapters import HTTPAdapter
+
+from utils.config_management import Config
+from utils.log_management import log, log_error
+
+
+class CircuitOpenError(RuntimeError):
+    """
+    Raised when a call is rejected because the circuit breaker of the targeted service is open.
+    """
+
+
+class CircuitBreaker:
+    """
+    Minimal circuit breaker: after `failure_threshold` consecutive failures, the circuit opens and rejects every call
+    during `reset_timeout_s` seconds. Then a single trial call is let through (half-open state): its success closes the
+    circuit, its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout_s: float):
+        self.name               : str   = name
+        self.failure_threshold  : int   = failure_threshold
+        self.reset_timeout_s    : float = reset_timeout_s
+        self.failure_count      : int   = 0
+        self.opened_at          : Optional[float] = None
+        self._lock              : threading.Lock = threading.Lock()
+
+    def allow_request(self) -> bool:
+        """
+        Returns:
+            bool: True if the call can be sent to the service.
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout_s:
+                # Half-open: let one trial call through, the next ones wait for its result
+                self.opened_at = time.monotonic()
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failure_count  = 0
+            self.opened_at      = None
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failure_count += 1
+            if self.failure_count >= self.failure_threshold:
+                if self.opened_at is None:
+                    log(f"Circuit breaker \"{self.name}\" opened after {self.failure_count} failures", "warning")
+                self.opened_at = time.monotonic()
+
+
+def backoff_delay(attempt: int, base_delay_s: float, max_delay_s: float) -> float:
+    """
+    Compute the delay to wait before a retry, using an exponential backoff with full jitter.
+
+    Args:
+        attempt (int): The index of the failed attempt (starting from 0).
+        base_delay_s (float): The delay of the first retry before jitter.
+        max_delay_s (float): The upper bound of the delay.
+
+    Returns:
+        float: The delay in seconds.
+    """
+    return random.uniform(0, min(max_delay_s, base_delay_s * (2 ** attempt)))
+
+
+def is_transient_error(error: Exception) -> bool:
+    """
+    Determine if an error raised by a call to a service is transient, i.e. if the same call may succeed if retried:
+    timeouts, connection errors, throttling (429) and server errors (5xx).
+    """
+    if isinstance(error, (ConnectionError, TimeoutError, requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                          openai.error.Timeout, openai.error.APIConnectionError, openai.error.TryAgain,
+                          openai.error.RateLimitError, openai.error.ServiceUnavailableError,
+                          opensearchpy.ConnectionError)):
+        return True
+
+    if isinstance(error, openai.error.OpenAIError):
+        status_code = error.http_status
+    elif isinstance(error, opensearchpy.TransportError):
+        status_code = error.status_code
+    else:
+        return False
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+def call_with_retry(func: Callable, circuit_breaker: CircuitBreaker, retry_config: dict, *args, **kwargs) -> Any:
+    """
+    Call func(*args, **kwargs), retrying on transient failures (see is_transient_error) with a jittered exponential
+    backoff. The other failures are raised immediately and are not counted by the circuit breaker (the service answered).
+
+    Args:
+        func (Callable): The function to call.
+        circuit_breaker (CircuitBreaker): The circuit breaker of the service requested by func.
+        retry_config (dict): The 'retry' section of the clients configuration (max_attempts, base_delay_s, max_delay_s).
+
+    Returns:
+        Any: The value returned by func.
+
+    Raises:
+        CircuitOpenError: If the circuit of the service is open.
+        Exception: The exception raised by func if it is not transient, or the last one if all the attempts failed.
+    """
+    max_attempts: int = retry_config["max_attempts"]
+
+    for attempt in range(max_attempts):
+        if not circuit_breaker.allow_request():
+            raise CircuitOpenError(f"Circuit breaker \"{circuit_breaker.name}\" is open: call rejected")
+        try:
+            res = func(*args, **kwargs)
+            circuit_breaker.record_success()
+            return res
+        except Exception as e:
+            if not is_transient_error(e):
+                circuit_breaker.record_success()
+                raise
+            circuit_breaker.record_failure()
+            if attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, retry_config["base_delay_s"], retry_config["max_delay_s"])
+            log(f"Call to \"{circuit_breaker.name}\" failed ({e}): retry {attempt + 1}/{max_attempts - 1} in {delay:.2f}s", "warning")
+            time.sleep(delay)
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of the network clients. Use get_client_registry to access it.
+    The clients are created on first use, so that a process only needing OpenSearch (e.g. the db scripts) does not
+    require the LLM provider key.
+
+    Attributes:
+        open_search_client (OpenSearch): The OpenSearch client, keeping a pool of keep-alive connections.
+        llm_session (requests.Session): The HTTP session used by the openai module, keeping a pool of keep-alive connections.
+    """
+
+    def __init__(self, config: Config):
+        """
+        Load the settings of the clients.
+
+        Args:
+            config (Config): The configuration object to load settings from.
+
+        Raises:
+            RuntimeError: If the initialization fails.
+        """
+        try:
+            log(f"Initializing {self.__class__.__name__}", "info")
+
+            self.config                 : Config = config
+            self.retry_config           : dict = config.load_config(["clients", "retry"])
+            circuit_breaker_config      : dict = config.load_config(["clients", "circuit_breaker"])
+            self.llm_config             : dict = config.load_config(["clients", "llm"])
+
+            self.open_search_breaker    : CircuitBreaker = CircuitBreaker("open_search", **circuit_breaker_config)
+            self.llm_breaker            : CircuitBreaker = CircuitBreaker("llm", **circuit_breaker_config)
+
+            self._open_search_client    : Optional[OpenSearch]          = None
+            self._llm_session           : Optional[requests.Session]    = None
+            self._lock                  : threading.Lock                = threading.Lock()
+
+            log(f"{self.__class__.__name__} initialized successfully", "info")
+        except Exception as e:
+            log_error(f"Failed to initialize {self.__class__.__name__}: {e}", exception_to_raise=RuntimeError)
+
+    @property
+    def open_search_client(self) -> OpenSearch:
+        if self._open_search_client is None:
+            with self._lock:
+                if self._open_search_client is None:
+                    self._open_search_client = self.create_open_search_client(self.config)
+        return self._open_search_client
+
+    @property
+    def llm_session(self) -> requests.Session:
+        if self._llm_session is None:
+            with self._lock:
+                if self._llm_session is None:
+                    self._llm_session = self.create_llm_session(self.config)
+        return self._llm_session
+
+    @staticmethod
+    def create_open_search_client(config: Config) -> OpenSearch:
+        """
+        Create an OpenSearch client using configuration settings.
+        The retries are handled by the registry (call_open_search), so they are disabled at the transport level.
+
+        Args:
+            config (Config): The configuration object to load settings from.
+
+        Returns:
+            OpenSearch: The instantiated OpenSearch client.
+        """
+        log("Creating OpenSearch client", "info")
+
+        open_search_client_config   = dict(config.load_config(["open_search", "open_search_client_config"]))
+        open_search_pool_config     = config.load_config(["clients", "open_search"])
+        open_search_admin_login     = config.load_config(["open_search", "open_search_admin_login"])
+        open_search_admin_pwd       = config.load_config_secret_key(config_id_key='opensearch_admin_pwd_path')
+
+        # Format the opensearch config
+        open_search_client_config.update(open_search_pool_config)
+        open_search_client_config["http_auth"]      = (open_search_admin_login, open_search_admin_pwd)
+        open_search_client_config["max_retries"]    = 0
+
+        return OpenSearch(**open_search_client_config)
+
+    def create_llm_session(self, config: Config) -> requests.Session:
+        """
+        Create the pooled HTTP session used by the openai module and set the OpenAI API key once for the process.
+
+        Args:
+            config (Config): The configuration object to load settings from.
+
+        Returns:
+            requests.Session: The HTTP session.
+        """
+        log("Creating the LLM provider HTTP session", "info")
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.llm_config["pool_maxsize"])
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        openai.api_key = config.load_config_secret_key(config_id_key='openai_api_key_path')
+        if hasattr(openai, "requestssession"):
+            openai.requestssession = session
+        else:
+            # The pinned openai version creates one session per thread (api_requestor._make_session), each with its own
+            # connections: all the threads share the pooled session instead
+            openai.api_requestor._make_session = lambda: session
+
+        return session
+
+    def call_open_search(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Call a method of the OpenSearch client with retries and circuit breaking.
+        Example: registry.call_open_search(registry.open_search_client.search, index=index_name, body=body)
+        """
+        return call_with_retry(func, self.open_search_breaker, self.retry_config, *args, **kwargs)
+
+    def chat_completion(self, model: str, messages: list, **kwargs) -> dict:
+        """
+        Request the chat completion API of the LLM provider with retries and circuit breaking.
+
+        Args:
+            model (str): The ID of the model to request.
+            messages (list): The messages of the conversation.
+
+        Returns:
+            dict: The raw response of the LLM provider.
+        """
+        _ = self.llm_session  # Make sure the API key and the pooled session are set
+        kwargs.setdefault("request_timeout", self.llm_config["request_timeout"])
+        return call_with_retry(openai.ChatCompletion.create, self.llm_breaker, self.retry_config,
+                               model=model, messages=messages, **kwargs)
+
+
+_client_registry        : Optional[ClientRegistry]  = None
+_client_registry_lock   : threading.Lock            = threading.Lock()
+
+
+def get_client_registry(config: Config) -> ClientRegistry:
+    """
+    Get the client registry of the process, creating it on the first call.
+
+    Args:
+        config (Config): The configuration object to load settings from (only used on the first call).
+
+    Returns:
+        ClientRegistry: The client registry shared by all the components of the process.
+    """
+    global _client_registry
+
+    if _client_registry is None:
+        with _client_registry_lock:
+            if _client_registry is None:
+                _client_registry = ClientRegistry(config)
+    return _client_registry
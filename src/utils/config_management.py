@@ -5,20 +5,109 @@ This module handles the loading and management of configuration files for the ap
 WARNING: the variable CONFIG_PATH needs to be modified according to any changes in the path of the JSON config file.
 """
 
+import copy
 import json
 import os
-from typing import Union, List
+import threading
+from typing import Union, List, Optional
 
 from utils.log_management import log, log_error
 from utils.path_management import path_to_absolute
 
 CONFIG_PATH = path_to_absolute("config/config.json")
 
+# Environment variables overriding configuration values: FINANCIAL_INSIGHTS__<key>__<nested key>=<JSON or string value>
+# Example: FINANCIAL_INSIGHTS__llm_request_answerer__pipeline=single_call
+ENV_OVERRIDE_PREFIX     = "FINANCIAL_INSIGHTS__"
+ENV_OVERRIDE_SEPARATOR  = "__"
+
+
+def read_only(*_args, **_kwargs):
+    raise TypeError("The configuration is read-only: modify a copy of it (copy.deepcopy)")
+
+
+class FrozenDict(dict):
+    """
+    Read-only dict of the configuration snapshot. copy.deepcopy returns a modifiable dict.
+    """
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = read_only
+
+    def __deepcopy__(self, memo: dict) -> dict:
+        return {key: copy.deepcopy(value, memo) for key, value in self.items()}
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class FrozenList(list):
+    """
+    Read-only list of the configuration snapshot. copy.deepcopy returns a modifiable list.
+    """
+
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = append = clear = extend = insert = pop = remove = reverse = sort = read_only
+
+    def __deepcopy__(self, memo: dict) -> list:
+        return [copy.deepcopy(value, memo) for value in self]
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def freeze(value: object) -> object:
+    """
+    Convert the containers of a configuration value to read-only containers, recursively.
+    """
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(sub_value)) for key, sub_value in value.items())
+    if isinstance(value, list):
+        return FrozenList(freeze(sub_value) for sub_value in value)
+    return value
+
+
 class Config:
+    """
+    Process-wide, read-only view of the configuration.
+    The JSON config file is parsed once per process (see reload to parse it again): constructing a Config is cheap.
+    The snapshot is frozen once parsed (see FrozenDict): the values returned by load_config are shared, and the callers
+    modifying them must copy them first.
+    The key lookups and the secret keys read from files are memoized.
+    """
+
+    _snapshot       : Optional[dict]            = None
+    _lookups        : dict[tuple, object]       = {}
+    _secret_keys    : dict[str, str]            = {}
+    _lock           : threading.RLock           = threading.RLock()
+
     def __init__(self):
         """
         Load configuration from a JSON config file. Handle errors if the file is not found or the JSON is invalid.
         """
+        with Config._lock:
+            if Config._snapshot is None:
+                Config._snapshot = freeze(self.read_config_file())
+            self.config_dict : dict = Config._snapshot
+
+    @classmethod
+    def reload(cls) -> None:
+        """
+        Drop the configuration snapshot, the memoized lookups and the cached secret keys:
+        the next Config constructed parses the JSON config file (and the environment overrides) again.
+        The Config objects constructed before the reload keep the previous snapshot.
+        """
+        with cls._lock:
+            cls._snapshot       = None
+            cls._lookups        = {}
+            cls._secret_keys    = {}
+        log("Configuration reload requested", "info")
+
+    def read_config_file(self) -> dict:
+        """
+        Parse the JSON config file, apply the environment overrides and convert the paths to absolute paths.
+
+        Returns:
+            dict: The configuration.
+        """
         self.config_dict : dict = {}
 
         try:
@@ -26,6 +115,7 @@ class Config:
                 res = json.load(config_file)
                 self.config_dict =  res
                 log("Configuration loaded successfully", "info")
+                self.apply_env_overrides()
                 self.paths_to_absolute()
         except FileNotFoundError:
             log_error(f"Configuration file not found: {CONFIG_PATH}", exception_to_raise=RuntimeError)
@@ -34,6 +124,29 @@ class Config:
         except Exception as e:
             log_error(f"Unexpected error: {e}", exception_to_raise=RuntimeError)
 
+        return self.config_dict
+
+    def apply_env_overrides(self) -> None:
+        """
+        Override configuration values with the environment variables prefixed by ENV_OVERRIDE_PREFIX.
+        The values are parsed as JSON if possible (numbers, booleans, objects), otherwise used as strings.
+        """
+        for env_key, env_value in os.environ.items():
+            if not env_key.startswith(ENV_OVERRIDE_PREFIX):
+                continue
+
+            key_hierarchy = env_key[len(ENV_OVERRIDE_PREFIX):].split(ENV_OVERRIDE_SEPARATOR)
+            try:
+                value = json.loads(env_value)
+            except json.JSONDecodeError:
+                value = env_value
+
+            sub_config_dict = self.config_dict
+            for key in key_hierarchy[:-1]:
+                sub_config_dict = sub_config_dict.setdefault(key, {})
+            sub_config_dict[key_hierarchy[-1]] = value
+            log(f"Configuration value {key_hierarchy} overridden by the environment variable {env_key}", "info")
+
     def load_config(self, key_to_search: Union[str, List[str]]) -> Union[str, dict]:
         """
                 Load configuration value based on the key or nested keys provided.
@@ -42,29 +155,34 @@ class Config:
                     key_to_search (Union[str, List[str]]): Key or nested keys used to retrieve the configuration value.
 
                 Returns:
-                    Union[str, dict]: The value from the configuration corresponding to the key.
+                    Union[str, dict]: The value from the configuration corresponding to the key. The dicts and lists are
+                                      the read-only containers of the shared snapshot (FrozenDict, FrozenList), not
+                                      copies: modifying them raises a TypeError, copy.deepcopy gives plain containers.
 
                 Raises:
                     ValueError: If the specified key or nested key path does not exist in the configuration.
                 """
         if isinstance(key_to_search, str):
-            key_hierarchy = [key_to_search]
+            key_hierarchy = (key_to_search,)
         else:
-            key_hierarchy = key_to_search
-
-        def get_conf(_key_hierarchy: List[str], sub_config_dict: dict) -> Union[str, dict, None]:
-            key = _key_hierarchy[0]
-            if not key in sub_config_dict:
-                return None
-            if len(_key_hierarchy) == 1:
-                return sub_config_dict[key]
-            else:
-                return get_conf(_key_hierarchy[1:], sub_config_dict[key])
-
-        res = get_conf(key_hierarchy, self.config_dict)
+            key_hierarchy = tuple(key_to_search)
+
+        lookups = Config._lookups if self.config_dict is Config._snapshot else {}
+        res = lookups.get(key_hierarchy)
+
         if res is None:
-            message = f"The required '{key_hierarchy}' parameter is missing in the configuration file specified in {CONFIG_PATH}."
-            log_error(message, exception_to_raise=ValueError)
+            res = self.config_dict
+            for key in key_hierarchy:
+                if not isinstance(res, dict) or key not in res:
+                    res = None
+                    break
+                res = res[key]
+
+            if res is None:
+                message = f"The required '{list(key_hierarchy)}' parameter is missing in the configuration file specified in {CONFIG_PATH}."
+                log_error(message, exception_to_raise=ValueError)
+            with Config._lock:
+                lookups[key_hierarchy] = res
 
         return res
 
@@ -83,6 +201,10 @@ class Config:
             FileNotFoundError: If the file specified in the config file is not correct.
         """
 
+        key_value = Config._secret_keys.get(config_id_key)
+        if key_value is not None:
+            return key_value
+
         # Retrieve the path of the file containing the OpenAI API key
         key_path = self.load_config(["paths", config_id_key])
 
@@ -100,6 +222,8 @@ class Config:
             log_error(message, exception_to_raise=ValueError)
 
         log(f"{config_id_key} key retrieved successfully from file: {key_path}", "info")
+        with Config._lock:
+            Config._secret_keys[config_id_key] = key_value
         return key_value
 
     def paths_to_absolute(self):
@@ -111,7 +235,7 @@ class Config:
         """
         log(f"Setting the paths in the config file {CONFIG_PATH} to absolute paths", "info")
 
-        config_paths = self.load_config('paths')
+        config_paths = self.config_dict.get('paths')
         if not config_paths or not isinstance(config_paths, dict):
             message = f"The configuration file specified in {CONFIG_PATH} has errors in the 'paths' section."
             log_error(message, exception_to_raise=ValueError)
@@ -0,0 +1,183 @@
+"""
+profiling_management.py
+
+This module provides the opt-in profiling of the application, configured in the 'profiling' configuration section.
+Three profilers are available:
+    - "sampling":       a sampling profiler of the profiled thread, writing its stacks in the folded format read by
+                        the flamegraph tools (flamegraph.pl, speedscope, inferno): <name>.folded;
+    - "cprofile":       the deterministic profiler of the standard library: <name>.prof (pstats dump, e.g. for
+                        snakeviz) and <name>.txt (functions sorted by cumulative time);
+    - "pyinstrument":   the pyinstrument sampling profiler, if installed: <name>.html.
+When profiling is disabled, the profiled code runs unchanged: the overhead is a single check.
+
+The scripts accept a --profile [PROFILER] option (see add_profile_argument).
+"""
+
+import argparse
+import cProfile
+import hmac
+import io
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from typing import ContextManager, Iterator, Optional
+
+from utils.config_management import Config
+from utils.log_management import log
+
+PROFILERS = ["sampling", "cprofile", "pyinstrument"]
+
+
+class StackSampler:
+    """
+    Sampling profiler of a thread (or of all the threads if thread_id is None): the stacks are collected every
+    interval_s by a background thread.
+
+    Attributes:
+        stack_counts (Counter): The number of samples of each stack, as "outermost;...;innermost" frame names.
+    """
+
+    def __init__(self, thread_id: Optional[int], interval_s: float):
+        self.thread_id      : Optional[int] = thread_id
+        self.interval_s     : float = interval_s
+        self.stack_counts   : Counter = Counter()
+        self._stopped       : threading.Event = threading.Event()
+        self._thread        : threading.Thread = threading.Thread(target=self._sample, daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _sample(self) -> None:
+        sampler_thread_id = threading.get_ident()
+        while not self._stopped.wait(self.interval_s):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == sampler_thread_id or (self.thread_id is not None and thread_id != self.thread_id):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.stack_counts[";".join(reversed(stack))] += 1
+
+    def write_folded_stacks(self, path: str) -> None:
+        with open(path, 'w') as folded_file:
+            for stack, count in self.stack_counts.most_common():
+                folded_file.write(f"{stack} {count}\n")
+
+
+@contextmanager
+def profile(name: str, output_path: str, profiler: str = "sampling", sampling_interval_s: float = 0.005,
+            all_threads: bool = False) -> Iterator[None]:
+    """
+    Profile the code run in the context, in the current thread, and write the results in output_path.
+
+    Args:
+        name (str): The prefix of the output files (a timestamp and the process ID are appended).
+        output_path (str): The directory of the output files.
+        profiler (str): The profiler (see PROFILERS).
+        sampling_interval_s (float): The sampling interval of the sampling profiler.
+        all_threads (bool): If True, the sampling profiler samples all the threads of the process (e.g. for code
+                            running in a thread pool). The other profilers always profile the current thread only.
+    """
+    os.makedirs(output_path, exist_ok=True)
+    output_prefix = os.path.join(output_path, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}")
+
+    if profiler == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            log("pyinstrument is not installed: using the sampling profiler", "warning")
+            profiler = "sampling"
+
+    start = time.perf_counter()
+    if profiler == "cprofile":
+        cprofile_profiler = cProfile.Profile()
+        cprofile_profiler.enable()
+        try:
+            yield
+        finally:
+            cprofile_profiler.disable()
+            cprofile_profiler.dump_stats(f"{output_prefix}.prof")
+            summary = io.StringIO()
+            pstats.Stats(cprofile_profiler, stream=summary).sort_stats("cumulative").print_stats(50)
+            with open(f"{output_prefix}.txt", 'w') as summary_file:
+                summary_file.write(summary.getvalue())
+            output_file = f"{output_prefix}.prof"
+    elif profiler == "pyinstrument":
+        pyinstrument_profiler = Profiler(interval=sampling_interval_s)
+        pyinstrument_profiler.start()
+        try:
+            yield
+        finally:
+            pyinstrument_profiler.stop()
+            output_file = f"{output_prefix}.html"
+            with open(output_file, 'w') as html_file:
+                html_file.write(pyinstrument_profiler.output_html())
+    else:
+        sampler = StackSampler(None if all_threads else threading.get_ident(), sampling_interval_s)
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            output_file = f"{output_prefix}.folded"
+            sampler.write_folded_stacks(output_file)
+
+    log(f"Profile of {name} ({time.perf_counter() - start:.3f}s) written to {output_file}", "info")
+
+
+class RequestProfiler:
+    """
+    Opt-in profiling of the web requests: a request is profiled if it carries the admin profiling token in its
+    X-Profile header, or at random with the probability request_sample_rate.
+    """
+
+    def __init__(self, config: Config):
+        profiling_config = config.load_config("profiling")
+
+        self.admin_token            : Optional[str] = profiling_config["admin_token"]
+        self.request_sample_rate    : float         = profiling_config["request_sample_rate"]
+        self.profiler               : str           = profiling_config["request_profiler"]
+        self.sampling_interval_s    : float         = profiling_config["sampling_interval_s"]
+        self.output_path            : str           = config.load_config(["paths", "profiling_output_path"])
+
+    def should_profile(self, profile_header: Optional[str]) -> bool:
+        if profile_header is not None and self.admin_token and hmac.compare_digest(profile_header, self.admin_token):
+            return True
+        return self.request_sample_rate > 0 and random.random() < self.request_sample_rate
+
+    def profile(self, name: str, profile_header: Optional[str] = None, all_threads: bool = False) -> ContextManager:
+        """
+        Get the context profiling a request, or a no-op context if the request is not profiled.
+        """
+        if not self.should_profile(profile_header):
+            return nullcontext()
+        return profile(name, self.output_path, self.profiler, self.sampling_interval_s, all_threads)
+
+
+def add_profile_argument(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the --profile [PROFILER] option to the argument parser of a script (see script_profile).
+    """
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=PROFILERS, default=None,
+                        help="profile the script and write the results in the profiling output directory (default profiler: cprofile)")
+
+
+def script_profile(config: Config, name: str, profiler: Optional[str]) -> ContextManager:
+    """
+    Get the context profiling a script run with the profiler of its --profile option, or a no-op context if None.
+    """
+    if profiler is None:
+        return nullcontext()
+    return profile(name, config.load_config(["paths", "profiling_output_path"]), profiler,
+                   config.load_config(["profiling", "sampling_interval_s"]), all_threads=True)
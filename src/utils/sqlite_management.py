@@ -0,0 +1,47 @@
+"""
+sqlite_management.py
+
+This module provides the SQLite connections of the stores shared by the processes of the application (embedding cache,
+retrieval cache generations, answer store, conversation sessions).
+A SQLite connection must not be used across a fork: the web server imports the application in its master process before
+forking the workers (see web_app.server), so each process opens its own connection on first use.
+"""
+
+import os
+import sqlite3
+import threading
+from typing import Optional
+
+
+class ProcessSqliteConnection:
+    """
+    SQLite connection (WAL mode, shared by the threads of a process) opened lazily in each process using it.
+
+    Attributes:
+        path (str): The path of the SQLite file.
+        schema (list[str]): The statements creating the tables and indexes, run when the connection is opened.
+    """
+
+    def __init__(self, path: str, schema: list[str]):
+        self.path           : str = path
+        self.schema         : list[str] = schema
+        self._connection    : Optional[sqlite3.Connection] = None
+        self._pid           : Optional[int] = None
+        self._lock          : threading.Lock = threading.Lock()
+
+    def get(self) -> sqlite3.Connection:
+        """
+        Get the connection of the current process, opening it on the first call (in this process).
+        """
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    connection = sqlite3.connect(self.path, check_same_thread=False)
+                    connection.execute("PRAGMA journal_mode=WAL")
+                    for statement in self.schema:
+                        connection.execute(statement)
+                    connection.commit()
+                    # The connection inherited from the parent process (if any) is left untouched
+                    self._connection, self._pid = connection, os.getpid()
+        return self._connection
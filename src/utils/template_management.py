@@ -3,6 +3,16 @@ from typing import List
 
 from utils.log_management import log_error, log
 
+# Patterns of the keywords whose values have a known shape (the other keywords match any text), so that they cannot
+# absorb the words of a neighbouring keyword: the words of a multi-word {metric_name}, or the "(LTM)" qualifier of the
+# {current_period} preceding it
+KEYWORD_PATTERNS = {
+    "metric_name"                           : r"[^\s(].*?",
+    "increased_decreased_remainedunchanged" : r"increased|decreased|remained unchanged|changed",
+    "increase_decrease_nochange"            : r"increase|decrease|no change",
+    "timeframe"                             : r"MoM|QoQ|HoH|YoY",
+}
+
 
 def match_company_data_line_with_template(data_line: str, templates_json: dict) -> (bool, dict):
     """
@@ -15,7 +25,8 @@ def match_company_data_line_with_template(data_line: str, templates_json: dict)
 
     Returns:
         tuple: (bool, dict) where the bool indicates if a match was found,
-               and the dict contains the {keyword} and their corresponding values in data_line.
+               and the dict contains the {keyword} of the matched template and their corresponding values in data_line
+               (all the keywords of the templates, with empty values, if no match was found).
     """
     log(f"Try matching  the company-data line with a template: {data_line}", "info")
 
@@ -27,27 +38,20 @@ def match_company_data_line_with_template(data_line: str, templates_json: dict)
         # Extract all {keywords} from the template
         found_keywords = set(re.findall(r'{(.*?)}', template))
 
-        # Create a regex pattern from the template
+        # Create a regex pattern from the template: the first {keyword} is a named capturing group and its repetitions
+        # must match the same value (e.g. the {metric_name} of both periods), which disambiguates the lazy groups
         pattern = re.escape(template)
         for keyword in found_keywords:
-            suffix = ""
-            # Replace {keyword} with named capturing group
-            while True:
-                pattern0 = pattern.replace(r'\{' + keyword + r'\}', r'(?P<' + keyword+suffix + r'>.*?)', 1)
-                if pattern0 == pattern:
-                    pattern = pattern0
-                    break
-                pattern = pattern0
-                suffix += "a"
-
-        # Match the data_line with the regex pattern
-        match = re.match(pattern, data_line)
+            escaped_keyword = r'\{' + keyword + r'\}'
+            pattern = pattern.replace(escaped_keyword, r'(?P<' + keyword + r'>' + KEYWORD_PATTERNS.get(keyword, r'.*?') + r')', 1)
+            pattern = pattern.replace(escaped_keyword, r'(?P=' + keyword + r')')
+
+        # Match the whole data_line (up to its line break), so that the last group is not cut at its first character
+        match = re.fullmatch(pattern + r'\s*', data_line)
         if match:
-            # Extract the values of the {keywords}
-            for keyword in found_keywords:
-                template_keywords[keyword] = match.group(keyword)
+            # Extract the values of the {keywords} of the matched template
             log(f"\t-> Successfully matched with {template}")
-            return True, template_keywords
+            return True, {keyword: match.group(keyword) for keyword in found_keywords}
 
     log(f"\t-> No matching found")
     return False, template_keywords
@@ -0,0 +1,201 @@
+"""
+value_normalization.py
+
+This module converts the values extracted from the company-related data lines (see template_management) into typed values.
+Example: "$37.06 million" -> (37060000.0, "USD"), "102.15%" -> (102.15, "%"),
+"October 2021 (LTM)" -> (2020-11-01, 2021-10-31, "ltm").
+"""
+
+import calendar
+import datetime
+import re
+from typing import Optional, Tuple
+
+VALUE_SCALES = {
+    ""          : 1.0,
+    "thousand"  : 1e3,
+    "k"         : 1e3,
+    "million"   : 1e6,
+    "m"         : 1e6,
+    "billion"   : 1e9,
+    "b"         : 1e9,
+}
+
+MONTHS = {month.lower(): index for index, month in enumerate(calendar.month_name) if month}
+
+PERIOD_PATTERN = re.compile(
+    r'(?P<fy>\bFY\s*(?P<fy_year>\d{4})\b)'
+    r'|(?P<quarter>\bQ(?P<quarter_index>[1-4])\s*[-/ ]?\s*(?P<quarter_year>\d{4})\b)'
+    r'|(?P<half>\bH(?P<half_index>[12])\s*[-/ ]?\s*(?P<half_year>\d{4})\b)'
+    r'|(?P<month>\b(?P<month_name>' + '|'.join(MONTHS) + r')\s+(?P<month_year>\d{4})\b(?P<ltm>\s*\(LTM\))?)'
+    r'|(?P<year>\b(?P<year_value>(?:19|20)\d{2})\b)',
+    re.IGNORECASE
+)
+
+VALUE_PATTERN = re.compile(r'^\s*(?P<currency>\$)?\s*(?P<number>[-+]?\d[\d,]*(?:\.\d+)?|[-+]?\.\d+)\s*(?P<percent>%)?\s*(?P<scale>[a-zA-Z]*)\s*$')
+
+
+def parse_value(text: str) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Parse a value extracted from a company-related data line into a float in base units.
+
+    Args:
+        text (str): The extracted value (e.g. "$37.06 million", "$-5.2 thousand", "45.3%").
+
+    Returns:
+        tuple: (float, str) the value and its unit ("USD", "%" or "" if no unit is given),
+               or (None, None) if the text is not a value.
+    """
+    if not text:
+        return None, None
+
+    match = VALUE_PATTERN.match(text)
+    if not match:
+        return None, None
+
+    scale = match.group("scale").lower()
+    if scale not in VALUE_SCALES:
+        return None, None
+
+    value = float(match.group("number").replace(",", "")) * VALUE_SCALES[scale]
+
+    if match.group("percent"):
+        return value, "%"
+    if match.group("currency"):
+        return value, "USD"
+    return value, ""
+
+
+def parse_percentage(text: str) -> Optional[float]:
+    """
+    Parse a percentage extracted from a company-related data line (e.g. "102.15%" -> 102.15).
+
+    Args:
+        text (str): The extracted percentage.
+
+    Returns:
+        Optional[float]: The percentage, or None if the text is not a percentage.
+    """
+    value, unit = parse_value(text)
+    if unit != "%":
+        return None
+    return value
+
+
+def normalize_period(period: str) -> str:
+    """
+    Normalize a period string so that different spellings of the same period are equal
+    (e.g. "FY 2023" and "FY2023", "Q1 2022" and "Q1-2022").
+
+    Args:
+        period (str): The period string.
+
+    Returns:
+        str: The normalized period.
+    """
+    return re.sub(r'[\s\-_]+', '', period.lower())
+
+
+def _month_end(year: int, month: int) -> datetime.date:
+    return datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+
+def _period_from_match(match: re.Match) -> Tuple[datetime.date, datetime.date, str]:
+    if match.group("fy"):
+        year = int(match.group("fy_year"))
+        return datetime.date(year, 1, 1), datetime.date(year, 12, 31), "year"
+    if match.group("quarter"):
+        year, quarter = int(match.group("quarter_year")), int(match.group("quarter_index"))
+        return datetime.date(year, 3 * quarter - 2, 1), _month_end(year, 3 * quarter), "quarter"
+    if match.group("half"):
+        year, half = int(match.group("half_year")), int(match.group("half_index"))
+        return datetime.date(year, 6 * half - 5, 1), _month_end(year, 6 * half), "half"
+    if match.group("month"):
+        year, month = int(match.group("month_year")), MONTHS[match.group("month_name").lower()]
+        if match.group("ltm"):
+            # Last twelve months ending with the given month
+            start_year, start_month = (year, month + 1) if month < 12 else (year + 1, 1)
+            return datetime.date(start_year - 1, start_month, 1), _month_end(year, month), "ltm"
+        return datetime.date(year, month, 1), _month_end(year, month), "month"
+    year = int(match.group("year_value"))
+    return datetime.date(year, 1, 1), datetime.date(year, 12, 31), "year"
+
+
+def parse_period(text: str) -> Tuple[Optional[datetime.date], Optional[datetime.date], Optional[str]]:
+    """
+    Parse a period extracted from a company-related data line.
+    Supported formats: "FY2023", "2023", "Q1-2023", "H1-2023", "January 2023" and "October 2021 (LTM)".
+    Fiscal years are assumed to match calendar years.
+
+    Args:
+        text (str): The extracted period.
+
+    Returns:
+        tuple: (start date, end date, granularity) where granularity is one of "year", "half", "quarter", "month", "ltm",
+               or (None, None, None) if the text is not a period.
+    """
+    match = PERIOD_PATTERN.fullmatch(text.strip()) if text else None
+    if not match:
+        return None, None, None
+    return _period_from_match(match)
+
+
+def find_periods(text: str) -> list[str]:
+    """
+    Find the periods mentioned in a free text (e.g. "revenue in FY 2023 vs Q1-2022" -> ["FY 2023", "Q1-2022"]).
+
+    Args:
+        text (str): The free text.
+
+    Returns:
+        list[str]: The periods, in order of appearance.
+    """
+    return [match.group(0) for match in PERIOD_PATTERN.finditer(text or "")]
+
+
+def parse_period_range(text: str) -> Tuple[Optional[datetime.date], Optional[datetime.date]]:
+    """
+    Parse the range of dates covered by all the periods mentioned in a free text
+    (e.g. the date inferred from a user request: "FY 2023", "from 1990 until 2000").
+
+    Args:
+        text (str): The free text.
+
+    Returns:
+        tuple: (start date, end date), or (None, None) if no period is mentioned.
+    """
+    period_list = [_period_from_match(match) for match in PERIOD_PATTERN.finditer(text or "")]
+    if not period_list:
+        return None, None
+    return min(start for start, _, _ in period_list), max(end for _, end, _ in period_list)
+
+
+def normalize_key_word_values(key_word_values: dict) -> dict:
+    """
+    Compute the typed fields of a company-related data line from its keyword values
+    (see match_company_data_line_with_template). The fields that cannot be parsed are omitted.
+
+    Args:
+        key_word_values (dict): The keyword values of the data line.
+
+    Returns:
+        dict: The typed fields: current_value_num, last_value_num, pct_change_num (floats in base units),
+              current_period_start, current_period_end, last_period_start, last_period_end (ISO dates),
+              current_period_granularity.
+    """
+    fields = {}
+
+    for key in ["current_value", "last_value", "pct_change"]:
+        value, _ = parse_value(key_word_values.get(key, ""))
+        if value is not None:
+            fields[key + "_num"] = value
+
+    for key in ["current_period", "last_period"]:
+        start, end, granularity = parse_period(key_word_values.get(key, ""))
+        if start is not None:
+            fields[key + "_start"]  = start.isoformat()
+            fields[key + "_end"]    = end.isoformat()
+            if key == "current_period":
+                fields[key + "_granularity"] = granularity
+
+    return fields
@@ -0,0 +1,180 @@
+"""
+admission_control.py
+
+This module bounds the load that the web application accepts, so that spikes are rejected early instead of turning into
+timeouts everywhere at once:
+    - a concurrency limiter with a bounded wait queue; when a slot frees, the waiting tenants (API key or company)
+      are served in round robin so that a single tenant cannot monopolize the application;
+    - a token bucket budgeting the calls to the LLM provider against its rate limit.
+Rejected requests get a 503 (saturated queue) or 429 (LLM budget exhausted) status with a Retry-After delay.
+The limits apply per process: when the application is served by several workers (see web_app.server), the LLM budget
+is split between them.
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+
+from utils.config_management import Config
+from utils.log_management import log
+
+# Environment variable holding the number of worker processes serving the application (set by web_app.server)
+WORKER_COUNT_ENV = "WEB_SERVER_WORKER_COUNT"
+
+
+class AdmissionRejected(Exception):
+    """
+    Raised when a request is not admitted.
+
+    Attributes:
+        status_code (int): The HTTP status to return (429 or 503).
+        retry_after_s (int): The delay after which the client may retry.
+    """
+
+    def __init__(self, message: str, status_code: int, retry_after_s: float):
+        super().__init__(message)
+        self.status_code    : int = status_code
+        self.retry_after_s  : int = max(1, math.ceil(retry_after_s))
+
+
+class TokenBucket:
+    """
+    Token bucket refilled continuously at `rate_per_s` tokens per second, holding at most `capacity` tokens.
+    """
+
+    def __init__(self, rate_per_s: float, capacity: float):
+        self.rate_per_s : float = rate_per_s
+        self.capacity   : float = capacity
+        self.tokens     : float = capacity
+        self.updated_at : float = time.monotonic()
+        self._lock      : threading.Lock = threading.Lock()
+
+    def try_consume(self, cost: float) -> float:
+        """
+        Consume `cost` tokens if available.
+
+        Returns:
+            float: 0 if the tokens were consumed, otherwise the delay (s) after which they will be available.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens     = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate_per_s)
+            self.updated_at = now
+
+            if self.tokens >= cost:
+                self.tokens -= cost
+                return 0.0
+            return (cost - self.tokens) / self.rate_per_s
+
+    def refund(self, cost: float) -> None:
+        with self._lock:
+            self.tokens = min(self.capacity, self.tokens + cost)
+
+
+class AdmissionController:
+    """
+    Concurrency limiter with a bounded wait queue, fair between tenants, and LLM budget.
+    """
+
+    def __init__(self, config: Config):
+        admission_config = config.load_config(["admission_control"])
+
+        self.max_concurrency            : int   = admission_config["max_concurrency"]
+        self.max_queue_size             : int   = admission_config["max_queue_size"]
+        self.max_queue_size_per_tenant  : int   = admission_config["max_queue_size_per_tenant"]
+        self.queue_timeout_s            : float = admission_config["queue_timeout_s"]
+        self.llm_calls_per_query        : int   = admission_config["llm_calls_per_query"]
+        # The budget of the provider is shared by the workers
+        llm_requests_per_minute         : float = admission_config["llm_requests_per_minute"] / int(os.environ.get(WORKER_COUNT_ENV, "1"))
+
+        self.llm_budget     : TokenBucket = TokenBucket(rate_per_s  = llm_requests_per_minute / 60,
+                                                        capacity    = llm_requests_per_minute / 60 * admission_config["llm_burst_s"])
+        self.running        : int = 0
+        self.queue_size     : int = 0
+        # Waiting requests by tenant, tenants in round-robin order
+        self.waiting        : OrderedDict[str, deque] = OrderedDict()
+        self._lock          : threading.Lock = threading.Lock()
+
+    def max_thread_count(self) -> int:
+        """
+        Get the number of threads the admitted and waiting requests can block at once: the synchronous endpoints wait
+        for their slot in a thread of the thread pool of the server, which must be larger for the queue to be reached.
+        """
+        return self.max_concurrency + self.max_queue_size
+
+    def acquire(self, tenant: str, query_count: int = 1) -> None:
+        """
+        Admit a request: consume its LLM budget and wait for a concurrency slot. The slot must be released with release()
+        once the request is processed.
+
+        Args:
+            tenant (str): The identifier of the tenant (API key or company) sending the request.
+            query_count (int): The number of queries in the request (used to budget the LLM calls).
+
+        Raises:
+            AdmissionRejected: If the request is not admitted.
+        """
+        # A batch larger than the burst capacity is admitted once the bucket is full
+        cost = min(query_count * self.llm_calls_per_query, self.llm_budget.capacity)
+        retry_after_s = self.llm_budget.try_consume(cost)
+        if retry_after_s > 0:
+            raise AdmissionRejected("LLM provider budget exhausted", status_code=429, retry_after_s=retry_after_s)
+
+        try:
+            self.acquire_slot(tenant)
+        except AdmissionRejected:
+            self.llm_budget.refund(cost)
+            raise
+
+    def acquire_slot(self, tenant: str) -> None:
+        """
+        Take a concurrency slot, waiting in the queue of the tenant (at most queue_timeout_s) if none is free.
+        """
+        with self._lock:
+            if self.running < self.max_concurrency and not self.waiting:
+                self.running += 1
+                return
+
+            tenant_queue = self.waiting.get(tenant)
+            if self.queue_size >= self.max_queue_size or (tenant_queue is not None and len(tenant_queue) >= self.max_queue_size_per_tenant):
+                raise AdmissionRejected("Server saturated: wait queue full", status_code=503, retry_after_s=self.queue_timeout_s)
+
+            slot_granted = threading.Event()
+            self.waiting.setdefault(tenant, deque()).append(slot_granted)
+            self.queue_size += 1
+
+        if slot_granted.wait(self.queue_timeout_s):
+            return
+
+        with self._lock:
+            # The slot may have been granted between the timeout and the lock
+            if slot_granted.is_set():
+                return
+            tenant_queue = self.waiting[tenant]
+            tenant_queue.remove(slot_granted)
+            if not tenant_queue:
+                del self.waiting[tenant]
+            self.queue_size -= 1
+        log(f"Request of tenant {tenant} timed out in the admission queue", "warning")
+        raise AdmissionRejected("Server saturated: queue timeout", status_code=503, retry_after_s=self.queue_timeout_s)
+
+    def release(self) -> None:
+        """
+        Release a concurrency slot, handing it over to a waiting request if any.
+        """
+        with self._lock:
+            if not self.waiting:
+                self.running -= 1
+                return
+
+            # Hand the slot over to the next tenant in round robin, then move this tenant to the end of the round
+            tenant, tenant_queue = next(iter(self.waiting.items()))
+            slot_granted = tenant_queue.popleft()
+            self.queue_size -= 1
+            if tenant_queue:
+                self.waiting.move_to_end(tenant)
+            else:
+                del self.waiting[tenant]
+            slot_granted.set()
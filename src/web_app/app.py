@@ -1,14 +1,23 @@
-from fastapi import FastAPI, HTTPException
+import json
+from typing import Optional
+
+import anyio.to_thread
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.responses import StreamingResponse
 
 from models.llm_request_answerer import LlmRequestAnswerer
-from models.llm_utils import QueryRequest
+from models.llm_utils import QueryBatchRequest, QueryComparisonRequest, QueryRequest
 from utils.config_management import Config
 from utils.log_management import log, log_error
+from utils.profiling_management import RequestProfiler
+from web_app.admission_control import AdmissionController, AdmissionRejected
 
 
 # Initialize the different LLM models
 config              : Config                = Config()
 llm_request_answerer: LlmRequestAnswerer    = LlmRequestAnswerer(config)
+admission_controller: AdmissionController   = AdmissionController(config)
+request_profiler    : RequestProfiler       = RequestProfiler(config)
 
 
 # Initialize the FastAPI app
@@ -18,9 +27,38 @@ app = FastAPI()
 # Log that the web application has been initialized
 log("Web application initialized", "info")
 
+# Threads of the thread pool left to the endpoints outside the admission control (e.g. /metrics)
+SPARE_THREAD_COUNT = 8
+
+
+@app.on_event("startup")
+async def size_thread_pool() -> None:
+    """
+    Size the thread pool running the synchronous endpoints so that the requests waiting for an admission slot cannot
+    exhaust it (40 threads by default): the saturated queue is then rejected instead of blocking all the endpoints.
+    """
+    thread_limiter = anyio.to_thread.current_default_thread_limiter()
+    thread_limiter.total_tokens = max(thread_limiter.total_tokens, admission_controller.max_thread_count() + SPARE_THREAD_COUNT)
+    log(f"Thread pool sized to {thread_limiter.total_tokens} threads", "info")
+
+
+def admit_request(tenant: str, query_count: int = 1) -> None:
+    """
+    Admit a request through the admission controller (see web_app.admission_control).
+
+    Raises:
+        HTTPException: 429 or 503 with a Retry-After header if the request is rejected.
+    """
+    try:
+        admission_controller.acquire(tenant, query_count)
+    except AdmissionRejected as e:
+        log(f"Request of tenant {tenant} rejected: {e}", "warning")
+        raise HTTPException(status_code=e.status_code, detail=str(e), headers={"Retry-After": str(e.retry_after_s)})
+
 
 @app.post("/query")
-def query(request: QueryRequest) -> dict:
+def query(request: QueryRequest, x_api_key: Optional[str] = Header(default=None),
+          x_profile: Optional[str] = Header(default=None)) -> dict:
     """
     Handle incoming queries to the /query endpoint.
 
@@ -33,12 +71,14 @@ def query(request: QueryRequest) -> dict:
     Raises:
         HTTPException: If an error occurs while processing the request.
     """
+    admit_request(x_api_key or f"company:{request.company_id}")
     try:
         # Log the received query
         log(f"Received query: {request.query} for company_id: {request.company_id}", "info")
 
-        # Handle the query and get the response
-        response: str = llm_request_answerer.handle_query(request)
+        # Handle the query and get the response (profiled on demand, see utils.profiling_management)
+        with request_profiler.profile("query", x_profile):
+            response: str = llm_request_answerer.handle_query(request)
 
         # Log and return the response
         log(f"Returning response: {response}", "info")
@@ -46,4 +86,101 @@ def query(request: QueryRequest) -> dict:
     except Exception as e:
         # Log the error and raise an HTTP exception
         log_error(f"Error handling query \"{request.query}\": {e}")
-        HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission_controller.release()
+
+
+@app.post("/query/compare")
+def query_compare(request: QueryComparisonRequest, x_api_key: Optional[str] = Header(default=None),
+                  x_profile: Optional[str] = Header(default=None)) -> dict:
+    """
+    Handle incoming queries comparing several companies to the /query/compare endpoint.
+    The comparison is answered with a single LLM call (see LlmRequestAnswerer.handle_comparison_query).
+
+    Args:
+        request (QueryComparisonRequest): The incoming query request containing the company_ids and raw query.
+
+    Returns:
+        dict: A dictionary containing the response string.
+
+    Raises:
+        HTTPException: If an error occurs while processing the request.
+    """
+    admit_request(x_api_key or f"company:{request.company_ids[0]}")
+    try:
+        log(f"Received comparison query: {request.query} for company_ids: {request.company_ids}", "info")
+        with request_profiler.profile("query_compare", x_profile):
+            return {"response": llm_request_answerer.handle_comparison_query(request)}
+    except Exception as e:
+        log_error(f"Error handling comparison query \"{request.query}\": {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        admission_controller.release()
+
+
+@app.get("/metrics")
+def metrics() -> dict:
+    """
+    Return the operational metrics of the application.
+
+    Returns:
+        dict: The coalescing metrics of the identical in-flight queries (see models.request_coalescing), the
+              metrics of the retrieval cache (see models.retrieval_cache) and of the precomputed answers, if served
+              (see models.answer_store).
+    """
+    metrics_dict = {
+        "coalescing"        : llm_request_answerer.single_flight.stats(),
+        "retrieval_cache"   : llm_request_answerer.rag_handler.retrieval_cache.stats(),
+    }
+    if llm_request_answerer.answer_store is not None:
+        metrics_dict["precomputed_answers"] = llm_request_answerer.answer_store.stats()
+    return metrics_dict
+
+
+@app.post("/query/batch")
+def query_batch(request: QueryBatchRequest, x_api_key: Optional[str] = Header(default=None),
+                x_profile: Optional[str] = Header(default=None)):
+    """
+    Handle incoming batches of queries to the /query/batch endpoint.
+    The queries are grouped by company so that the retrieval is done once per company.
+
+    Args:
+        request (QueryBatchRequest): The incoming query requests and the streaming option.
+
+    Returns:
+        dict | StreamingResponse: A dictionary containing the list of results (in the order of the requests),
+            or, if request.stream is set, a stream of these results formatted as NDJSON (1 line per request).
+            Each result is either {"response": str} or {"error": str}.
+
+    Raises:
+        HTTPException: If an error occurs while processing the batch.
+    """
+    tenant = x_api_key or (f"company:{request.requests[0].company_id}" if request.requests else "anonymous")
+    admit_request(tenant, query_count=len(request.requests))
+    released = False
+    try:
+        log(f"Received a batch of {len(request.requests)} queries", "info")
+
+        results = llm_request_answerer.handle_query_batch(request.requests)
+
+        if request.stream:
+            def stream_results():
+                # The concurrency slot is held until the stream is consumed
+                try:
+                    for result in results:
+                        yield json.dumps(result) + "\n"
+                finally:
+                    admission_controller.release()
+
+            released = True
+            return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+        # The batch is processed in a thread pool: all the threads are sampled
+        with request_profiler.profile("query_batch", x_profile, all_threads=True):
+            return {"responses": list(results)}
+    except Exception as e:
+        log_error(f"Error handling batch of queries: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if not released:
+            admission_controller.release()
@@ -0,0 +1,112 @@
+"""
+server.py
+
+Production entry point of the web application: a gunicorn master process managing uvicorn workers.
+    - The number of workers is sized to the CPU cores (the 'workers' parameter of the 'web_server' configuration
+      section, 0 meaning 1 worker per core), and the threads of the embedding runtime are shared between them.
+    - The application code is imported once in the master before forking the workers (copy-on-write). The embedding
+      model is downloaded and exported in a separate process before the fork, then loaded by each worker before it
+      accepts requests: the inference runtimes (PyTorch, ONNX Runtime) are not fork-safe once used. For the same
+      reason, the SQLite stores are opened by each worker on first use (see utils.sqlite_management).
+    - The state shared by the requests is shared between the workers: the conversation sessions and the retrieval
+      cache generations are stored in SQLite files (or Redis), and the LLM provider budget of the admission control is
+      split between the workers. The concurrency limits of the admission control apply per worker.
+    - Workers finish their in-flight requests on SIGTERM (graceful_timeout_s) and are recycled after max_requests.
+    - The uvicorn workers use uvloop and httptools when they are installed.
+
+Usage:
+    python src/web_app/server.py
+The development server (single process, reload on change) remains:
+    uvicorn src.web_app.app:app --reload
+"""
+
+import multiprocessing
+import os
+
+from gunicorn.app.base import BaseApplication
+
+from models.embedding_runtime import prepare_embedding_runtime, set_inference_thread_count
+from models.llm_utils import get_embedding
+from utils.config_management import Config
+from utils.log_management import log, log_error
+from web_app.admission_control import WORKER_COUNT_ENV
+
+
+def get_worker_count(server_config: dict) -> int:
+    """
+    Get the number of workers: the configured number, or 1 per CPU core if 0.
+    """
+    return server_config["workers"] or multiprocessing.cpu_count()
+
+
+def prepare_embedding_model(config: Config) -> None:
+    """
+    Download and export the embedding model in a spawned process, so that the master process never runs the model.
+    """
+    process = multiprocessing.get_context("spawn").Process(
+        target=prepare_embedding_runtime,
+        args=(config.load_config(["llm_semantic_matching", "model"]),
+              config.load_config(["llm_semantic_matching", "runtime"]),
+              config.load_config(["paths", "embedding_model_cache_path"]))
+    )
+    process.start()
+    process.join()
+    if process.exitcode != 0:
+        log(f"Failed to prepare the embedding model (exit code {process.exitcode}): the workers will prepare it", "warning")
+
+
+def post_worker_init(worker) -> None:
+    """
+    Gunicorn hook run in each worker before it accepts requests: share the cores between the workers and load the
+    embedding runtime (and embedding cache) with a first embedding.
+    """
+    config = Config()
+    thread_count = max(1, multiprocessing.cpu_count() // get_worker_count(config.load_config(["web_server"])))
+    set_inference_thread_count(thread_count)
+
+    get_embedding(config, "warm-up")
+    log(f"Worker {worker.pid} ready ({thread_count} inference threads)", "info")
+
+
+class WebServer(BaseApplication):
+    """
+    Gunicorn application serving web_app.app with the settings of the 'web_server' configuration section.
+    """
+
+    def __init__(self, config: Config):
+        self.server_config: dict = config.load_config(["web_server"])
+        super().__init__()
+
+    def load_config(self) -> None:
+        settings = {
+            "bind"                  : f"{self.server_config['host']}:{self.server_config['port']}",
+            "workers"               : get_worker_count(self.server_config),
+            "worker_class"          : self.server_config["worker_class"],
+            "preload_app"           : self.server_config["preload_app"],
+            "timeout"               : self.server_config["timeout_s"],
+            "graceful_timeout"      : self.server_config["graceful_timeout_s"],
+            "keepalive"             : self.server_config["keepalive_s"],
+            "max_requests"          : self.server_config["max_requests"],
+            "max_requests_jitter"   : self.server_config["max_requests_jitter"],
+            "post_worker_init"      : post_worker_init,
+        }
+        for key, value in settings.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        from web_app.app import app
+        return app
+
+
+if __name__ == "__main__":
+    try:
+        _config: Config = Config()
+        # The inference threads are sized per worker in post_worker_init
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+
+        prepare_embedding_model(_config)
+        # The application state local to a process is sized by the number of workers (see web_app.admission_control)
+        os.environ[WORKER_COUNT_ENV] = str(get_worker_count(_config.load_config(["web_server"])))
+        WebServer(_config).run()
+    except Exception as _e:
+        log_error(f"Failed to start the web server: {_e}", exception_to_raise=RuntimeError)
@@ -0,0 +1,66 @@
+import threading
+
+import pytest
+
+from utils.config_management import log, Config
+from web_app.admission_control import AdmissionController, AdmissionRejected, TokenBucket
+
+
+config: Config = Config()
+
+
+@pytest.fixture
+def admission_controller() -> AdmissionController:
+    controller = AdmissionController(config)
+    controller.max_concurrency              = 1
+    controller.max_queue_size               = 2
+    controller.max_queue_size_per_tenant    = 1
+    controller.queue_timeout_s              = 0.1
+    return controller
+
+
+def test_token_bucket():
+    log("Starting test: token_bucket", "info")
+    bucket = TokenBucket(rate_per_s=1, capacity=2)
+    assert bucket.try_consume(2) == 0
+    assert bucket.try_consume(1) > 0
+    log("Completed test: token_bucket", "info")
+
+
+def test_admission_queue_full(admission_controller):
+    log("Starting test: admission_queue_full", "info")
+    admission_controller.acquire("tenant_a")
+
+    waiter = threading.Thread(target=lambda: pytest.raises(AdmissionRejected, admission_controller.acquire, "tenant_a"))
+    waiter.start()
+    while admission_controller.queue_size == 0:
+        pass
+
+    # The queue of tenant_a is full
+    with pytest.raises(AdmissionRejected) as e:
+        admission_controller.acquire("tenant_a")
+    assert e.value.status_code == 503
+    waiter.join()
+    log("Completed test: admission_queue_full", "info")
+
+
+def test_admission_round_robin(admission_controller):
+    log("Starting test: admission_round_robin", "info")
+    admission_controller.queue_timeout_s = 5
+    admission_controller.acquire("tenant_a")
+
+    admitted = []
+    threads = [threading.Thread(target=lambda t=tenant: (admission_controller.acquire(t), admitted.append(t)))
+               for tenant in ["tenant_a", "tenant_b"]]
+    for queue_size, thread in enumerate(threads, start=1):
+        thread.start()
+        while admission_controller.queue_size < queue_size:
+            pass
+
+    # The slot goes to tenant_a (first waiting), then tenant_b
+    admission_controller.release()
+    threads[0].join()
+    admission_controller.release()
+    threads[1].join()
+    assert admitted == ["tenant_a", "tenant_b"]
+    log("Completed test: admission_round_robin", "info")
@@ -0,0 +1,22 @@
+from models.answer_store import AnswerStore, answer_key
+from utils.config_management import log
+
+
+def test_answer_store(tmp_path):
+    log("Starting test: answer_store", "info")
+    answer_store = AnswerStore(str(tmp_path / "answer_store.sqlite"))
+
+    answer_store.put(642, "What was the revenue in FY2023?", "gpt-3.5-turbo|two_step|0.1", "The revenue was $72.70 million.")
+
+    # Served on exact match of the normalized query, for the version it was generated with only
+    assert answer_store.get(642, "  what was the revenue in  FY2023? ", "gpt-3.5-turbo|two_step|0.1") == "The revenue was $72.70 million."
+    assert answer_store.get(642, "What was the revenue in FY2023?", "gpt-3.5-turbo|two_step|0.2") is None
+    assert answer_store.get(2434, "What was the revenue in FY2023?", "gpt-3.5-turbo|two_step|0.1") is None
+
+    # The lookups of the warm-up job are not counted
+    assert answer_store.get(642, "What was the revenue in FY2023?", "gpt-3.5-turbo|two_step|0.1", count=False) is not None
+    assert answer_store.get(642, "What was the revenue in FY2022?", "gpt-3.5-turbo|two_step|0.1", count=False) is None
+
+    answer_store.put(642, "What was the gross margin in FY2023?", "gpt-3.5-turbo|two_step|0.1", "The gross margin was 40%.")
+    assert answer_store.delete_other_keys([answer_key(642, "What was the gross margin in FY2023?")]) == 1
+    assert answer_store.stats() == {"answer_count": 1, "hit_count": 1, "miss_count": 2, "hit_ratio": 1 / 3}
@@ -0,0 +1,71 @@
+import openai
+import opensearchpy
+import pytest
+
+from utils.client_management import CircuitBreaker, CircuitOpenError, backoff_delay, call_with_retry, is_transient_error
+from utils.config_management import log
+
+
+retry_config: dict = {"max_attempts": 3, "base_delay_s": 0.0, "max_delay_s": 0.0}
+
+
+def test_backoff_delay():
+    log("Starting test: backoff_delay", "info")
+    for attempt in range(10):
+        assert 0 <= backoff_delay(attempt, base_delay_s=0.1, max_delay_s=1.0) <= 1.0
+    log("Completed test: backoff_delay", "info")
+
+
+def test_call_with_retry_recovers():
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise ConnectionError("flaky")
+        return "ok"
+
+    breaker = CircuitBreaker("test", failure_threshold=5, reset_timeout_s=30)
+    assert call_with_retry(flaky, breaker, retry_config) == "ok"
+    assert len(calls) == 3
+    assert breaker.failure_count == 0
+
+
+def test_circuit_breaker_opens():
+    def failing():
+        raise ConnectionError("down")
+
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout_s=30)
+    with pytest.raises(ConnectionError):
+        call_with_retry(failing, breaker, {"max_attempts": 2, "base_delay_s": 0.0, "max_delay_s": 0.0})
+    with pytest.raises(CircuitOpenError):
+        call_with_retry(failing, breaker, retry_config)
+
+
+def test_call_with_retry_does_not_retry_rejected_requests():
+    log("Starting test: call_with_retry_does_not_retry_rejected_requests", "info")
+    calls = []
+
+    def malformed():
+        calls.append(1)
+        raise openai.error.InvalidRequestError("malformed", param="messages")
+
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_timeout_s=30)
+    with pytest.raises(openai.error.InvalidRequestError):
+        call_with_retry(malformed, breaker, retry_config)
+    assert len(calls) == 1
+    assert breaker.allow_request() and breaker.failure_count == 0
+
+
+@pytest.mark.parametrize("error,transient", [
+    (openai.error.RateLimitError("throttled"), True),
+    (openai.error.APIError("server error", http_status=502), True),
+    (openai.error.AuthenticationError("bad key", http_status=401), False),
+    (opensearchpy.ConnectionTimeout("TIMEOUT", "timed out", None), True),
+    (opensearchpy.TransportError(503, "unavailable", None), True),
+    (opensearchpy.NotFoundError(404, "index_not_found_exception", None), False),
+    (opensearchpy.RequestError(400, "parsing_exception", None), False),
+    (ValueError("bug"), False),
+])
+def test_is_transient_error(error, transient):
+    assert is_transient_error(error) == transient
@@ -0,0 +1,39 @@
+import copy
+import json
+
+import pytest
+
+from utils.config_management import Config, log
+
+
+def test_config_snapshot_is_shared_and_read_only():
+    log("Starting test: config_snapshot_is_shared_and_read_only", "info")
+    config_a, config_b = Config(), Config()
+    assert config_a.config_dict is config_b.config_dict
+
+    # The returned containers are shared and read-only: they must be copied to be modified
+    index_body = config_a.load_config(["database", "company_data", "index_body"])
+    assert index_body is config_b.load_config(["database", "company_data", "index_body"])
+    with pytest.raises(TypeError):
+        index_body["settings"]["number_of_shards"] = -1
+    with pytest.raises(TypeError):
+        index_body["mappings"]["_source"]["excludes"].append("raw_data_line")
+
+    index_body_copy = copy.deepcopy(index_body)
+    index_body_copy["settings"]["number_of_shards"] = -1
+    assert type(index_body_copy["mappings"]["_source"]["excludes"]) is list
+    assert config_b.load_config(["database", "company_data", "index_body"])["settings"]["number_of_shards"] != -1
+    assert json.loads(json.dumps(index_body)) == index_body
+    log("Completed test: config_snapshot_is_shared_and_read_only", "info")
+
+
+def test_config_env_override_and_reload(monkeypatch):
+    log("Starting test: config_env_override_and_reload", "info")
+    monkeypatch.setenv("FINANCIAL_INSIGHTS__llm_request_answerer__batch_max_concurrency", "3")
+    Config.reload()
+    assert Config().load_config(["llm_request_answerer", "batch_max_concurrency"]) == 3
+
+    monkeypatch.delenv("FINANCIAL_INSIGHTS__llm_request_answerer__batch_max_concurrency")
+    Config.reload()
+    assert Config().load_config(["llm_request_answerer", "batch_max_concurrency"]) != 3
+    log("Completed test: config_env_override_and_reload", "info")
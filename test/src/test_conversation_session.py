@@ -0,0 +1,54 @@
+import pytest
+
+from models.conversation_session import ConversationSession, SessionStore
+from models.llm_request_parser import RequestContext
+from models.llm_utils import QueryRequest
+from models.rag import RequestRelatedData
+from utils.config_management import Config, log
+
+
+METRICS_DATA    = {"Revenue": {"metric_name": "Revenue", "description": "Total income generated from sales"}}
+KNOWN_METRICS   = ["revenue", "gross margin", "ebitda"]
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch) -> Config:
+    monkeypatch.setenv("FINANCIAL_INSIGHTS__paths__session_store_path", str(tmp_path / "sessions.sqlite"))
+    Config.reload()
+    yield Config()
+    monkeypatch.delenv("FINANCIAL_INSIGHTS__paths__session_store_path")
+    Config.reload()
+
+
+def test_session_store_is_shared_between_workers(config: Config):
+    log("Starting test: session_store_is_shared_between_workers", "info")
+    # Each worker of the web server has its own store on the same file
+    worker_a_store, worker_b_store = SessionStore(config), SessionStore(config)
+
+    with worker_a_store.lock("session"):
+        session = worker_a_store.get("session")
+        session.update(RequestContext(company_id=642, date="January 2021", query="What was the revenue in January 2021?"),
+                       RequestRelatedData(company_data=["Revenue January 2021: $2,390,000.00"], metrics_data=METRICS_DATA),
+                       "The revenue was $2.39 million.", worker_a_store.history_token_budget)
+        worker_a_store.put("session", session)
+
+    follow_up_session = worker_b_store.get("session")
+    follow_up_context = follow_up_session.get_reusable_context(QueryRequest(company_id=642, query="And how did the revenue evolve?"),
+                                                               KNOWN_METRICS)
+    assert follow_up_context.date == "January 2021"
+    assert follow_up_session.history_messages()[-1] == {"role": "assistant", "content": "The revenue was $2.39 million."}
+    assert worker_b_store.get("other_session").request_context is None
+    assert not worker_a_store.session_locks
+
+
+def test_follow_up_about_another_metric_is_resolved_again():
+    log("Starting test: follow_up_about_another_metric_is_resolved_again", "info")
+    session = ConversationSession()
+    session.update(RequestContext(company_id=642, date="January 2021", query="What was the revenue in January 2021?"),
+                   RequestRelatedData(company_data=["Revenue January 2021: $2,390,000.00"], metrics_data=METRICS_DATA),
+                   "The revenue was $2.39 million.", history_token_budget=1000)
+
+    assert session.get_reusable_context(QueryRequest(company_id=642, query="And the revenue growth?"), KNOWN_METRICS) is not None
+    # The data of the EBITDA were not retrieved for the previous request
+    assert session.get_reusable_context(QueryRequest(company_id=642, query="And EBITDA?"), KNOWN_METRICS) is None
+    assert session.get_reusable_context(QueryRequest(company_id=642, query="Revenue and gross margin?"), KNOWN_METRICS) is None
@@ -1,12 +1,17 @@
+import copy
 import pytest
 import json
 from opensearchpy import OpenSearch
 
-from db_scripts.create_index_script import create_index, instantiate_open_search_client
+from db_scripts.create_index_script import create_index, create_versioned_index, get_index_versions, instantiate_open_search_client, \
+    swap_alias, validate_index_body
 from db_scripts.update_index_script import upload_company_data, upload_metrics_and_templates_data
+from db_scripts.watch_company_data_script import current_positions, read_new_lines
+from models.fact_store import extract_fact
 from utils.log_management import log
 from utils.config_management import Config
 from utils.template_management import get_template_keyword_list, match_company_data_line_with_template
+from utils.value_normalization import normalize_key_word_values
 
 
 config: Config = Config()
@@ -49,6 +54,40 @@ def test_create_index(opensearch_client: OpenSearch, index_name, index_body):
     log(f"Completed test: test_create_index: {index_name}", "info")
 
 
+def test_swap_alias_deletes_versions_never_served(opensearch_client: OpenSearch):
+    log("Starting test: test_swap_alias_deletes_versions_never_served", "info")
+    alias               = "test_swap_alias_index"
+    index_body          = {"settings": {"number_of_shards": 1}, "mappings": {"properties": {"company_id": {"type": "integer"}}}}
+    lifecycle_config    = {**config.load_config(["database", "index_lifecycle"]), "keep_previous_versions": 1}
+
+    try:
+        index_v1 = create_versioned_index(opensearch_client, alias, index_body, lifecycle_config)
+        assert swap_alias(opensearch_client, alias, index_v1, lifecycle_config) == []
+        # Interrupted rebuild: the version is never served
+        index_v2 = create_versioned_index(opensearch_client, alias, index_body, lifecycle_config)
+
+        index_v3 = create_versioned_index(opensearch_client, alias, index_body, lifecycle_config)
+        assert swap_alias(opensearch_client, alias, index_v3, lifecycle_config) == [index_v2]
+        index_v4 = create_versioned_index(opensearch_client, alias, index_body, lifecycle_config)
+        assert swap_alias(opensearch_client, alias, index_v4, lifecycle_config) == [index_v1]
+        assert get_index_versions(opensearch_client, alias) == [index_v3, index_v4]
+    finally:
+        for index in get_index_versions(opensearch_client, alias):
+            opensearch_client.indices.delete(index=index)
+    log("Completed test: test_swap_alias_deletes_versions_never_served", "info")
+
+
+@pytest.mark.parametrize("index_key", ["company_data", "metrics_data", "templates_data"])
+def test_validate_index_body(index_key: str):
+    index_name = config.load_config(["database", index_key, "index_name"])
+    index_body = copy.deepcopy(config.load_config(["database", index_key, "index_body"]))
+    validate_index_body(index_name, index_body)
+
+    index_body["mappings"]["properties"]["invalid_field"] = {"type": "unknown"}
+    with pytest.raises(ValueError):
+        validate_index_body(index_name, index_body)
+
+
 def test_upload_company_data(opensearch_client: OpenSearch, templates_json: dict):
     log("Starting test: upload_company_data", "info")
     index_name = config.load_config(["database", "company_data", "index_name"])
@@ -117,3 +156,111 @@ def test_get_template_keyword_list():
 
     # Assert that the result contains all the expected keywords
     assert sorted(result) == sorted(expected_keywords)
+
+
+def test_extract_fact(templates_json: dict):
+    """
+    Test the extract_fact function to ensure it converts the values of a company-data line into a typed fact.
+    """
+    data_line = "The company's FY2023 Revenue was $6.66 million, compared to FY2022 Revenue in $7.80 million, a YoY decrease of -14.6%."
+
+    _, key_word_values = match_company_data_line_with_template(data_line, templates_json)
+    fact = extract_fact(4542, key_word_values)
+
+    assert fact["company_id"]           == 4542
+    assert fact["metric"]               == "Revenue"
+    assert fact["period"]               == "FY2023"
+    assert fact["value"]                == pytest.approx(6.66e6)
+    assert fact["unit"]                 == "USD"
+    assert fact["comparison_period"]    == "FY2022"
+    assert fact["comparison_value"]     == pytest.approx(7.80e6)
+    assert fact["pct_change"]           == pytest.approx(-14.6)
+
+
+@pytest.mark.parametrize("data_line,expected_fact", [
+    ("The company's April 2024 (LTM) Revenue was $80.26 million, compared to April 2023 (LTM) Revenue in $60.82 million, a YoY increase of 31.97%.\n",
+     ("Revenue", "April 2024 (LTM)", 80.26e6, "USD", "April 2023 (LTM)", 60.82e6, 31.97)),
+    ("The company's January 2022 Revenue was $1.49 million, compared to January 2021 Revenue in $701.94 thousand, a YoY increase of 111.58%.\n",
+     ("Revenue", "January 2022", 1.49e6, "USD", "January 2021", 701.94e3, 111.58)),
+    ("The company's Gross Margin decreased from 77.58% in March 2024, to 54.22% in April 2024, a MoM decrease of -30.11%.\n",
+     ("Gross Margin", "April 2024", 54.22, "%", "March 2024", 77.58, -30.11)),
+])
+def test_extract_fact_from_monthly_and_ltm_lines(templates_json: dict, data_line: str, expected_fact: tuple):
+    """
+    Test that the facts of the monthly and LTM lines keep the whole period, the metric name and the change.
+    """
+    _, key_word_values = match_company_data_line_with_template(data_line, templates_json)
+    fact = extract_fact(2434, key_word_values)
+
+    metric, period, value, unit, comparison_period, comparison_value, pct_change = expected_fact
+    assert (fact["metric"], fact["period"], fact["unit"], fact["comparison_period"]) == (metric, period, unit, comparison_period)
+    assert fact["value"]            == pytest.approx(value)
+    assert fact["comparison_value"] == pytest.approx(comparison_value)
+    assert fact["pct_change"]       == pytest.approx(pct_change)
+
+
+def test_normalize_key_word_values():
+    """
+    Test the normalize_key_word_values function to ensure it computes the typed fields indexed with a company-data line.
+    """
+    key_word_values = {
+        "current_period"    : "October 2021 (LTM)",
+        "current_value"     : "$37.06 million",
+        "last_period"       : "Q4-2020",
+        "last_value"        : "$18.33 thousand",
+        "pct_change"        : "102.15%"
+    }
+
+    expected_result = {
+        "current_value_num"         : pytest.approx(37.06e6),
+        "last_value_num"            : pytest.approx(18.33e3),
+        "pct_change_num"            : pytest.approx(102.15),
+        "current_period_start"      : "2020-11-01",
+        "current_period_end"        : "2021-10-31",
+        "current_period_granularity": "ltm",
+        "last_period_start"         : "2020-10-01",
+        "last_period_end"           : "2020-12-31"
+    }
+
+    assert normalize_key_word_values(key_word_values) == expected_result
+
+
+def test_normalize_key_word_values_from_data_line(templates_json: dict):
+    """
+    Test that the typed fields indexed with a company-data line are computed from the values matched in the raw line.
+    """
+    data_line = "The company's April 2024 (LTM) Revenue was $80.26 million, compared to April 2023 (LTM) Revenue in $60.82 million, a YoY increase of 31.97%.\n"
+
+    _, key_word_values = match_company_data_line_with_template(data_line, templates_json)
+
+    assert normalize_key_word_values(key_word_values) == {
+        "current_value_num"         : pytest.approx(80.26e6),
+        "last_value_num"            : pytest.approx(60.82e6),
+        "pct_change_num"            : pytest.approx(31.97),
+        "current_period_start"      : "2023-05-01",
+        "current_period_end"        : "2024-04-30",
+        "current_period_granularity": "ltm",
+        "last_period_start"         : "2022-05-01",
+        "last_period_end"           : "2023-04-30"
+    }
+
+
+def test_read_new_lines(tmp_path):
+    file_path = tmp_path / "1.txt"
+    file_path.write_bytes(b"first line\nsecond line\nincomplete")
+
+    line_list, offset = read_new_lines(str(file_path), 0, max_bytes=1024)
+    assert line_list == [(0, "first line\n"), (11, "second line\n")]
+    assert offset == 23
+
+    with open(file_path, 'ab') as file:
+        file.write(b" line\n")
+    assert read_new_lines(str(file_path), offset, max_bytes=1024) == ([(23, "incomplete line\n")], 39)
+
+
+def test_current_positions_skips_other_files(tmp_path):
+    (tmp_path / "1.txt").write_bytes(b"first line\nsecond line\n")
+    (tmp_path / "README.md").write_bytes(b"Company data files\n")
+    (tmp_path / "2.txt.swp").write_bytes(b"")
+
+    assert current_positions(str(tmp_path)) == {"1.txt": {"inode": (tmp_path / "1.txt").stat().st_ino, "offset": 23}}
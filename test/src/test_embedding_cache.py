@@ -0,0 +1,41 @@
+import numpy
+
+from models.embedding_cache import EmbeddingCache, embedding_key
+from utils.config_management import log
+
+
+def test_embedding_key():
+    log("Starting test: embedding_key", "info")
+    assert embedding_key("model", "Total  revenue\n") == embedding_key("model", "Total revenue")
+    assert embedding_key("model", "Total revenue")    != embedding_key("other_model", "Total revenue")
+    log("Completed test: embedding_key", "info")
+
+
+def test_embedding_cache_lru_eviction(tmp_path):
+    log("Starting test: embedding_cache_lru_eviction", "info")
+    cache = EmbeddingCache(str(tmp_path / "embedding_cache.sqlite"), max_entries=2)
+
+    cache.put_many({"a": numpy.ones(4), "b": numpy.zeros(4)})
+    assert numpy.array_equal(cache.get_many(["a"])["a"], numpy.ones(4, dtype=numpy.float32))
+
+    # "b" is the least recently used embedding: it is evicted first
+    cache.put_many({"c": numpy.full(4, 2.0)})
+    assert len(cache) == 2
+    assert set(cache.get_many(["a", "b", "c"])) == {"a", "c"}
+    log("Completed test: embedding_cache_lru_eviction", "info")
+
+
+def test_embedding_cache_batches_access_writes(tmp_path):
+    log("Starting test: embedding_cache_batches_access_writes", "info")
+    cache = EmbeddingCache(str(tmp_path / "embedding_cache.sqlite"), max_entries=10, access_flush_size=2)
+    cache.put_many({"a": numpy.ones(4), "b": numpy.zeros(4)})
+
+    def last_access(key):
+        return cache.connection.get().execute("SELECT last_access FROM embeddings WHERE key = ?", (key,)).fetchone()[0]
+
+    stored_access = last_access("a")
+    cache.get_many(["a"])
+    assert last_access("a") == stored_access
+    cache.get_many(["b"])
+    assert last_access("a") > stored_access
+    log("Completed test: embedding_cache_batches_access_writes", "info")
@@ -0,0 +1,29 @@
+import numpy
+from transformers import BertConfig, BertModel, BertTokenizer
+
+from models.embedding_runtime import ONNX_PARITY_TEXTS, OnnxEmbeddingRuntime, TorchEmbeddingRuntime
+from utils.config_management import log
+
+
+def save_tiny_bert_model(path: str) -> str:
+    """
+    Save a small randomly initialized BERT model and its tokenizer (vocabulary of the parity texts) in path.
+    """
+    words = sorted({word.strip(".,?$%()").lower() for text in ONNX_PARITY_TEXTS for word in text.split()})
+    with open(f"{path}/vocab.txt", 'w') as vocab_file:
+        vocab_file.write("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words))
+    BertTokenizer(f"{path}/vocab.txt").save_pretrained(path)
+    BertModel(BertConfig(vocab_size=5 + len(words), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                         intermediate_size=37)).save_pretrained(path)
+    return path
+
+
+def test_onnx_embedding_runtime_parity(tmp_path):
+    log("Starting test: onnx_embedding_runtime_parity", "info")
+    (tmp_path / "model").mkdir()
+    model_id = save_tiny_bert_model(str(tmp_path / "model"))
+
+    reference = TorchEmbeddingRuntime(model_id).embed(ONNX_PARITY_TEXTS)
+    embeddings = OnnxEmbeddingRuntime(model_id, str(tmp_path / "cache")).embed(ONNX_PARITY_TEXTS)
+
+    assert numpy.allclose(embeddings, reference, atol=1e-4)
@@ -0,0 +1,36 @@
+import pytest
+
+from models.fact_store import FactStore, write_fact_table
+from models.llm_request_parser import RequestContext
+from utils.config_management import Config, log
+
+
+def revenue_fact(period: str, value: float) -> dict:
+    return {"company_id": 642, "metric": "Revenue", "period": period, "value": value, "unit": "USD",
+            "comparison_period": "", "comparison_value": None, "pct_change": None}
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch) -> Config:
+    monkeypatch.setenv("FINANCIAL_INSIGHTS__paths__fact_store_path", str(tmp_path / "fact_store" / "company_facts.parquet"))
+    Config.reload()
+    yield Config()
+    monkeypatch.delenv("FINANCIAL_INSIGHTS__paths__fact_store_path")
+    Config.reload()
+
+
+def test_fact_store_reloads_modified_table(config: Config):
+    log("Starting test: fact_store_reloads_modified_table", "info")
+    fact_store_path = config.load_config(["paths", "fact_store_path"])
+    request_context = RequestContext(company_id=642, date="January 2021", query="What was the revenue in January 2021?")
+
+    fact_store = FactStore(config, check_interval_s=0)
+    assert fact_store.find_facts(request_context) == []
+
+    # Ingestion run writing the fact table while the store is serving
+    write_fact_table(fact_store_path, [revenue_fact("January 2021", 2390000.0)])
+    assert [fact["value"] for fact in fact_store.find_facts(request_context)] == [2390000.0]
+
+    write_fact_table(fact_store_path, [revenue_fact("January 2021", 2400000.0), revenue_fact("February 2021", 2500000.0)])
+    assert [fact["value"] for fact in fact_store.find_facts(request_context)] == [2400000.0]
+    assert len(fact_store.index) == 2
@@ -1,10 +1,12 @@
+import json
 from xml.dom.minidom import Document
 
 import pytest
 from docx import Document
 
-from models.llm_request_answerer import LlmRequestAnswerer
+from models.llm_request_answerer import PIPELINE_SINGLE_CALL, LlmRequestAnswerer
 from models.llm_utils import QueryRequest
+from models.rag import RequestRelatedData
 from utils.config_management import log, Config
 
 
@@ -42,3 +44,42 @@ def test_llm_request_answerer(llm_request_answerer, user_query):
     response: str = llm_request_answerer.handle_query(user_query)
 
     log(f"Answer: {response}", "info")
+
+
+def test_llm_request_answerer_session(llm_request_answerer):
+    log("Starting test: llm_request_answerer_session", "info")
+    session_id = "test_session"
+
+    llm_request_answerer.handle_query(QueryRequest(company_id=642, session_id=session_id,
+                                                   query="What was the revenue of the company in January 2021?"))
+    llm_request_answerer.handle_query(QueryRequest(company_id=642, session_id=session_id,
+                                                   query="How does it compare to the previous year?"))
+
+    session = llm_request_answerer.session_store.get(session_id)
+    assert session.request_context.date != ""
+    assert session.history_messages()[-1]["role"] == "assistant"
+    log("Completed test: llm_request_answerer_session", "info")
+
+
+def test_answer_with_malformed_function_call_arguments(llm_request_answerer, monkeypatch):
+    log("Starting test: answer_with_malformed_function_call_arguments", "info")
+    sent_messages = []
+    replies = [
+        {"role": "assistant", "content": None, "function_call": {"name": "fetch_company_data", "arguments": "{\"period\": "}},
+        {"role": "assistant", "content": "The revenue was $1.2 million."},
+    ]
+
+    def chat_completion(model, messages, **kwargs):
+        sent_messages.append(list(messages))
+        return {"choices": [{"message": replies[len(sent_messages) - 1]}]}
+
+    monkeypatch.setattr(llm_request_answerer, "pipeline", PIPELINE_SINGLE_CALL)
+    monkeypatch.setattr(llm_request_answerer.client_registry, "chat_completion", chat_completion)
+    monkeypatch.setattr(llm_request_answerer.rag_handler, "fetch_company_data", lambda request_context: pytest.fail("unexpected fetch"))
+
+    response = llm_request_answerer.answer_with_context(QueryRequest(company_id=642, query="What was the revenue?"),
+                                                        RequestRelatedData(company_data=[]))
+
+    assert response == "The revenue was $1.2 million."
+    assert sent_messages[1][-1]["role"] == "function"
+    assert "error" in json.loads(sent_messages[1][-1]["content"])
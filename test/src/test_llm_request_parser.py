@@ -27,3 +27,14 @@ def test_parse_user_request(llm_request_parser, user_query, expected_data_list):
     for expected_data in expected_data_list:
         assert expected_data in llm_request_parser.request_context.date
     log("Completed test: parse_user_request", "info")
+
+
+@pytest.mark.parametrize("user_query, expected_date", [
+    ("What was the total revenue for the company in FY 2023?"                   , "FY 2023"),
+    ("How did the revenue evolve from Q1-2022 to Q3-2022?"                      , "Q1-2022 - Q3-2022"),
+    ("What was the total revenue for the company?"                              , "")])
+def test_infer_request_context_locally(user_query, expected_date):
+    log("Starting test: infer_request_context_locally", "info")
+    query = QueryRequest(company_id=642, query=user_query)
+    assert LlmRequestParser.infer_request_context_locally(query).date == expected_date
+    log("Completed test: infer_request_context_locally", "info")
@@ -0,0 +1,37 @@
+import os
+import time
+
+from utils.config_management import Config, log
+from utils.profiling_management import RequestProfiler, profile
+
+
+def busy_function():
+    end = time.perf_counter() + 0.1
+    while time.perf_counter() < end:
+        pass
+
+
+def test_sampling_profile_writes_folded_stacks(tmp_path):
+    log("Starting test: sampling_profile_writes_folded_stacks", "info")
+    with profile("test", str(tmp_path), profiler="sampling", sampling_interval_s=0.001):
+        busy_function()
+
+    folded_files = os.listdir(tmp_path)
+    assert len(folded_files) == 1 and folded_files[0].endswith(".folded")
+    with open(tmp_path / folded_files[0]) as folded_file:
+        lines = folded_file.read().splitlines()
+    assert any("busy_function" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+
+def test_cprofile_profile_writes_stats(tmp_path):
+    with profile("test", str(tmp_path), profiler="cprofile"):
+        busy_function()
+
+    assert sorted(os.path.splitext(file_name)[1] for file_name in os.listdir(tmp_path)) == [".prof", ".txt"]
+
+
+def test_request_profiler_disabled_by_default():
+    request_profiler = RequestProfiler(Config())
+    assert not request_profiler.should_profile(None)
+    assert not request_profiler.should_profile("any token")
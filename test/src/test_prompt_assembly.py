@@ -0,0 +1,89 @@
+from models.llm_request_parser import RequestContext
+from models.llm_utils import QueryRequest
+from models.prompt_assembly import PromptAssembler, format_comparison_table, prompt_version
+from models.rag import RagHandler, RequestRelatedData
+from utils.config_management import Config, log
+
+
+METRICS_DATA    = {"Revenue": {"metric_name": "Revenue", "definition": "Total income from sales"}}
+TEMPLATES_HITS  = [{"_id": "t1", "_score": 0.9, "_source": {"analysis_type": "YoY Change", "template_embedding": [0.1, 0.2]}}]
+
+
+def test_build_messages_shares_prefix_between_companies():
+    log("Starting test: build_messages_shares_prefix_between_companies", "info")
+    prompt_assembler = PromptAssembler(cache_max_entries=2)
+
+    messages_list = [
+        prompt_assembler.build_messages(QueryRequest(query=query, company_id=company_id),
+                                        RequestRelatedData(company_data=[f"Data of company {company_id}"],
+                                                           metrics_data=METRICS_DATA, templates_data=TEMPLATES_HITS))
+        for query, company_id in [("What was the revenue in 2023?", 1), ("Revenue in Q1-2023?", 2)]
+    ]
+
+    assert messages_list[0][0] == messages_list[1][0]
+    assert "template_embedding" not in messages_list[0][0]["content"]
+    assert "_score" not in messages_list[0][0]["content"]
+    assert messages_list[1][-1]["content"].endswith("\"Revenue in Q1-2023?\"")
+    assert len(prompt_assembler.reference_blocks) == 1
+
+
+def test_reference_block_changes_with_generation():
+    log("Starting test: reference_block_changes_with_generation", "info")
+    prompt_assembler    = PromptAssembler(cache_max_entries=2)
+    new_metrics_data    = {"Revenue": {**METRICS_DATA["Revenue"], "definition": "Total income from operations"}}
+
+    assert "Total income from sales" in prompt_assembler.reference_block(METRICS_DATA, TEMPLATES_HITS, 0)
+    assert "Total income from operations" in prompt_assembler.reference_block(new_metrics_data, TEMPLATES_HITS, 1)
+
+
+def test_prompt_version_changes_with_definitions():
+    metrics_json    = {"m1": {"metric_name": "Revenue", "definition": "Total income from sales"}}
+    templates_json  = {"t1": {"analysis_type": "YoY Change", "template": "The {metric_name} was {current_value}."}}
+    assert prompt_version(metrics_json, templates_json) == prompt_version(dict(metrics_json), dict(templates_json))
+    assert prompt_version(metrics_json, templates_json) != prompt_version(
+        metrics_json, {"t1": {**templates_json["t1"], "template": "{metric_name}: {current_value}."}})
+    assert prompt_version(metrics_json, templates_json) != prompt_version(
+        {"m1": {**metrics_json["m1"], "definition": "Total income from operations"}}, templates_json)
+
+
+def test_format_comparison_table():
+    def fact(metric, period, value, unit="USD"):
+        return {"metric": metric, "period": period, "value": value, "unit": unit,
+                "comparison_period": "", "comparison_value": None, "pct_change": None}
+
+    table = format_comparison_table([642, 4542], {
+        642 : [fact("Revenue", "FY2023", 1200000.0), fact("Gross Margin", "FY2023", 40.0, "%")],
+        4542: [fact("revenue", "FY 2023", 900000.0)],
+    })
+
+    assert table.splitlines() == [
+        "Metric | Period | Company 642 | Company 4542",
+        "Revenue | FY2023 | $1,200,000.00 | $900,000.00",
+        "Gross Margin | FY2023 | 40.00% | -",
+    ]
+
+
+def test_format_comparison_table_from_data_lines():
+    log("Starting test: format_comparison_table_from_data_lines", "info")
+    rag_handler = RagHandler(Config())
+    data_lines  = {
+        2434: ["The company's April 2024 (LTM) Revenue was $80.26 million, compared to April 2023 (LTM) Revenue in $60.82 million, a YoY increase of 31.97%.\n",
+               "The company's April 2024 (LTM) Gross Margin was 74.24%, compared to April 2023 (LTM) Gross Margin in 69.33%, a YoY increase of 7.09%.\n"],
+        4542: ["The company's April 2024 (LTM) Revenue was $6.23 million, compared to April 2023 (LTM) Revenue in $7.78 million, a YoY decrease of -19.99%.\n",
+               "Company overview: no metric on this line.\n"],
+    }
+
+    facts_by_company, other_lines_by_company = {}, {}
+    for company_id, company_data in data_lines.items():
+        # Without period, the facts are extracted from the retrieved lines rather than looked up in the fact store
+        facts_by_company[company_id], other_lines_by_company[company_id] = rag_handler.get_company_facts(
+            RequestContext(company_id=company_id, date="", query="Compare the revenue and the gross margin"),
+            RequestRelatedData(company_data=company_data))
+
+    assert other_lines_by_company == {2434: [], 4542: ["Company overview: no metric on this line.\n"]}
+    assert format_comparison_table([2434, 4542], facts_by_company).splitlines() == [
+        "Metric | Period | Company 2434 | Company 4542",
+        "Revenue | April 2024 (LTM) | $80,260,000.00 (vs April 2023 (LTM): $60,820,000.00, +31.97%) "
+        "| $6,230,000.00 (vs April 2023 (LTM): $7,780,000.00, -19.99%)",
+        "Gross Margin | April 2024 (LTM) | 74.24% (vs April 2023 (LTM): 69.33%, +7.09%) | -",
+    ]
@@ -0,0 +1,105 @@
+import json
+
+import numpy
+
+from models.llm_request_parser import RequestContext
+from models.rag import RagHandler, build_metric_template_routes
+from utils.config_management import Config, log
+
+
+config: Config = Config()
+
+
+def test_build_metric_template_routes():
+    log("Starting test: build_metric_template_routes", "info")
+    with open(config.load_config(["paths", "metrics_data_path"]), 'r') as metrics_file:
+        metrics_json = json.load(metrics_file)
+    with open(config.load_config(["paths", "templates_data_path"]), 'r') as templates_file:
+        templates_json = json.load(templates_file)
+
+    routes = build_metric_template_routes(metrics_json, templates_json)
+
+    assert len(routes) == len(metrics_json)
+    assert [hit["_id"] for hit in routes["revenue"]] == ["t1", "t2"]
+    assert routes["revenue"][0]["_source"] == templates_json["t1"]
+
+
+def test_build_company_data_filter_keeps_undated_lines():
+    log("Starting test: build_company_data_filter_keeps_undated_lines", "info")
+    company_filter, period_filter = RagHandler.build_company_data_filter(RequestContext(company_id=2434, date="January 2024"))
+
+    assert company_filter == {"term": {"company_id": 2434}}
+    dated_clause, undated_clause = period_filter["bool"]["should"]
+    assert dated_clause["bool"]["filter"] == [
+        {"range": {"current_period_start"   : {"lte": "2024-01-31"}}},
+        {"range": {"current_period_end"     : {"gte": "2024-01-01"}}},
+    ]
+    assert undated_clause == {"bool": {"must_not": {"exists": {"field": "current_period_start"}}}}
+    assert RagHandler.build_company_data_filter(RequestContext(company_id=2434, date="")) == [company_filter]
+
+
+def test_build_company_data_queries_filters_during_knn_search():
+    log("Starting test: build_company_data_queries_filters_during_knn_search", "info")
+    rag_handler     = RagHandler(config)
+    request_context = RequestContext(company_id=2434, date="January 2024", query="What was the revenue in January 2024?")
+
+    _, knn_body = rag_handler.build_company_data_queries(request_context, numpy.zeros(384, dtype=numpy.float32))
+
+    knn_query = knn_body["query"]["knn"]["raw_data_line_embedding"]
+    assert knn_query["k"] == rag_handler.company_retrieval_config["knn_k"]
+    assert knn_query["filter"] == {"bool": {"filter": RagHandler.build_company_data_filter(request_context)}}
+
+
+def test_company_requests_answered_by_fact_store_skip_data_retrieval(monkeypatch):
+    log("Starting test: company_requests_answered_by_fact_store_skip_data_retrieval", "info")
+    rag_handler     = RagHandler(config)
+    fact            = {"metric": "Revenue", "period": "January 2024", "value": 1200000.0, "unit": "USD",
+                       "comparison_period": None, "comparison_value": None, "pct_change": None}
+    lookup_context  = RequestContext(company_id=2434, date="January 2024", query="What was the revenue in January 2024?")
+    open_context    = RequestContext(company_id=2434, date="January 2024", query="Why did the margins drop?")
+    searches        = []
+
+    def multi_search(index_name, body_list):
+        searches.append((index_name, body_list))
+        return [[] for _ in body_list]
+
+    monkeypatch.setattr(rag_handler.fact_store, "find_facts",
+                        lambda request_context: [fact] if request_context is lookup_context else [])
+    monkeypatch.setattr(rag_handler, "multi_search", multi_search)
+    monkeypatch.setattr(rag_handler, "fetch_metrics", lambda request_context: {})
+    monkeypatch.setattr("models.rag.get_embeddings", lambda _, texts: [numpy.zeros(384, dtype=numpy.float32) for _ in texts])
+
+    lookup_data, open_data = rag_handler.retrieve_context_related_to_company_requests([lookup_context, open_context])
+
+    assert lookup_data.company_data == ["Revenue January 2024: $1,200,000.00"]
+    assert open_data.company_data == []
+    company_index = config.load_config(["database", "company_data", "index_name"])
+    company_bodies = [body for index_name, body_list in searches if index_name == company_index for body in body_list]
+    assert company_bodies == rag_handler.build_company_data_queries(open_context, numpy.zeros(384, dtype=numpy.float32))
+
+
+def test_company_requests_metrics_are_fetched_per_request(monkeypatch):
+    log("Starting test: company_requests_metrics_are_fetched_per_request", "info")
+    rag_handler     = RagHandler(config)
+    metrics_index   = config.load_config(["database", "metrics_data", "index_name"])
+    metric_hits     = {"revenue"    : {"_source": {"metric_name": "Revenue"}},
+                       "ebitda"     : {"_source": {"metric_name": "EBITDA"}}}
+
+    def multi_search(index_name, body_list):
+        if index_name != metrics_index:
+            return [[] for _ in body_list]
+        return [[metric_hits[clause["match"]["metric_name"]] for clause in body["query"]["bool"]["should"]
+                 if clause["match"]["metric_name"] in metric_hits] for body in body_list]
+
+    monkeypatch.setattr(rag_handler.fact_store, "find_facts", lambda request_context: [])
+    monkeypatch.setattr(rag_handler, "multi_search", multi_search)
+    monkeypatch.setattr("models.rag.get_embeddings", lambda _, texts: [numpy.zeros(384, dtype=numpy.float32) for _ in texts])
+
+    revenue_data, ebitda_data = rag_handler.retrieve_context_related_to_company_requests([
+        RequestContext(company_id=2434, date="January 2024", query="What was the revenue in January 2024?"),
+        RequestContext(company_id=2434, date="January 2024", query="What was the EBITDA in January 2024?"),
+    ])
+
+    assert list(revenue_data.metrics_data) == ["Revenue"]
+    assert list(ebitda_data.metrics_data) == ["EBITDA"]
+    assert [hit["_id"] for hit in revenue_data.templates_data] == ["t1", "t2"]
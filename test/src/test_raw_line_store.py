@@ -0,0 +1,32 @@
+from models.raw_line_store import RawLineStore
+from utils.config_management import log
+
+
+def test_raw_line_store(tmp_path):
+    log("Starting test: raw_line_store", "info")
+    raw_line_store = RawLineStore(str(tmp_path))
+
+    position_list = raw_line_store.append("company_data_index_v1", 1, ["Revenue FY2023: $1.2M\n", "Gross margin FY2023: 42 %\n"])
+    assert raw_line_store.get("company_data_index_v1", 1, *position_list[1]) == "Gross margin FY2023: 42 %\n"
+
+    # Lines appended after the segment was mapped are read through a new mapping
+    (offset, length), = raw_line_store.append("company_data_index_v1", 1, ["Chiffre d'affaires 2023 : 1,2 M€\n"])
+    assert raw_line_store.get("company_data_index_v1", 1, offset, length) == "Chiffre d'affaires 2023 : 1,2 M€\n"
+    assert raw_line_store.get("company_data_index_v1", 1, *position_list[0]) == "Revenue FY2023: $1.2M\n"
+
+
+def test_raw_line_store_segments_of_index_versions(tmp_path):
+    log("Starting test: raw_line_store_segments_of_index_versions", "info")
+    raw_line_store = RawLineStore(str(tmp_path))
+    raw_line_store.append("company_data_index_v1", 1, ["Revenue FY2023: $1.2M\n"])
+
+    # A full upload replaces the segment instead of growing it
+    position_list = raw_line_store.replace("company_data_index_v2", 1, ["Revenue FY2023: $1.3M\n"])
+    assert raw_line_store.get("company_data_index_v2", 1, *position_list[0]) == "Revenue FY2023: $1.3M\n"
+    position_list = raw_line_store.replace("company_data_index_v2", 1, ["Revenue FY2023: $1.4M\n"])
+    assert position_list == [(0, len("Revenue FY2023: $1.4M\n"))]
+    assert raw_line_store.get("company_data_index_v2", 1, *position_list[0]) == "Revenue FY2023: $1.4M\n"
+
+    raw_line_store.delete_index("company_data_index_v1")
+    assert not (tmp_path / "company_data_index_v1").exists()
+    assert raw_line_store.get("company_data_index_v2", 1, *position_list[0]) == "Revenue FY2023: $1.4M\n"
@@ -0,0 +1,32 @@
+import threading
+import time
+
+from models.request_coalescing import SingleFlight, normalize_query
+from utils.config_management import log
+
+
+def test_normalize_query():
+    assert normalize_query("  What was the  Revenue?\n") == normalize_query("what was the revenue?")
+
+
+def test_single_flight_coalesces_identical_calls():
+    log("Starting test: single_flight_coalesces_identical_calls", "info")
+    single_flight   = SingleFlight()
+    computations    = []
+    results         = []
+
+    def compute():
+        computations.append(1)
+        time.sleep(0.2)
+        return "answer"
+
+    threads = [threading.Thread(target=lambda: results.append(single_flight.do("key", compute))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == ["answer"] * 5
+    assert len(computations) == 1
+    assert single_flight.stats()["coalesced_count"] == 4
+    log("Completed test: single_flight_coalesces_identical_calls", "info")
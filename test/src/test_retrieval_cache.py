@@ -0,0 +1,37 @@
+import pytest
+
+from models.llm_request_parser import RequestContext
+from models.retrieval_cache import RetrievalCache, company_generation_name, retrieval_cache_key
+from utils.config_management import Config, log
+
+
+@pytest.fixture
+def config(tmp_path, monkeypatch) -> Config:
+    monkeypatch.setenv("FINANCIAL_INSIGHTS__paths__retrieval_generations_path", str(tmp_path / "generations.sqlite"))
+    Config.reload()
+    yield Config()
+    monkeypatch.delenv("FINANCIAL_INSIGHTS__paths__retrieval_generations_path")
+    Config.reload()
+
+
+def test_retrieval_cache_key_normalizes_inputs():
+    assert retrieval_cache_key(RequestContext(company_id=1, date="FY2023", query="What was the  Revenue?")) \
+        == retrieval_cache_key(RequestContext(company_id=1, date="fy 2023", query="what was the revenue?"))
+    assert retrieval_cache_key(RequestContext(company_id=1, date="FY2023", query="Revenue?")) \
+        != retrieval_cache_key(RequestContext(company_id=2, date="FY2023", query="Revenue?"))
+
+
+def test_retrieval_cache_invalidated_by_company_generation(config: Config):
+    log("Starting test: retrieval_cache_invalidated_by_company_generation", "info")
+    retrieval_cache = RetrievalCache(config)
+    request_context = RequestContext(company_id=1, date="FY2023", query="What was the revenue?")
+    other_context   = RequestContext(company_id=2, date="FY2023", query="What was the revenue?")
+
+    retrieval_cache.put(retrieval_cache.key(request_context), "data of company 1")
+    retrieval_cache.put(retrieval_cache.key(other_context), "data of company 2")
+    assert retrieval_cache.get(retrieval_cache.key(request_context)) == "data of company 1"
+
+    retrieval_cache.bump_generation(company_generation_name(1))
+    assert retrieval_cache.get(retrieval_cache.key(request_context)) is None
+    assert retrieval_cache.get(retrieval_cache.key(other_context)) == "data of company 2"
+    assert retrieval_cache.stats()["hit_count"] == 2
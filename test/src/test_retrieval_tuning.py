@@ -0,0 +1,45 @@
+import json
+import os
+
+from db_scripts.retrieval_tuning_script import build_labelled_questions, recall, recommend, summarize
+from utils.config_management import Config, log
+
+
+config: Config = Config()
+
+
+def test_recommend_cheapest_combination_reaching_target_recall():
+    log("Starting test: recommend_cheapest_combination_reaching_target_recall", "info")
+
+    def entry(size, results):
+        return {"parameters": {"size": size}, **summarize(results)}
+
+    report = [
+        entry(size, [{"recall": recall(retrieved_ids, ["a", "b"]), "prompt_tokens": 10 * size, "time_ms": 1.0}])
+        for size, retrieved_ids in [(2, ["a", "c"]), (4, ["a", "c", "b", "d"]), (8, ["a", "b", "c", "d"])]
+    ]
+
+    assert [entry["recall"] for entry in report] == [0.5, 1.0, 1.0]
+    assert recommend(report, target_recall=0.95)["parameters"] == {"size": 4}
+    assert recommend(report, target_recall=0.4)["parameters"] == {"size": 2}
+    assert recall(["a"], []) is None
+
+
+def test_build_labelled_questions_from_data_lines():
+    log("Starting test: build_labelled_questions_from_data_lines", "info")
+    with open(config.load_config(["paths", "templates_data_path"]), 'r') as templates_file:
+        templates_json = json.load(templates_file)
+    company_data_path = config.load_config(["paths", "company_data_path"])
+
+    question_list = build_labelled_questions(config, templates_json, {"revenue": ["t1", "t2"]}, questions_per_company=5)
+
+    assert len(question_list) == 5 * len(os.listdir(company_data_path))
+    for question in question_list:
+        metric = question["query"][len("What was the "): -len(f" in {question['date']}?")]
+        assert question["relevant_templates"] == (["t1", "t2"] if metric.lower() == "revenue" else [])
+        # Each needed row is the line of the company holding the metric value for the period
+        with open(os.path.join(company_data_path, f"{question['company_id']}.txt"), 'rb') as company_file:
+            for document_id in question["relevant_ids"]:
+                company_file.seek(int(document_id.split(":")[1]))
+                data_line = company_file.readline().decode("utf-8")
+                assert metric in data_line and question["date"] in data_line
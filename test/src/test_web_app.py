@@ -1,5 +1,6 @@
+import anyio.to_thread
 from fastapi.testclient import TestClient
-from web_app.app import app
+from web_app.app import admission_controller, app
 from utils.config_management import log
 
 client = TestClient(app)
@@ -11,3 +12,35 @@ def test_query_endpoint():
     assert "response" in response.json()
     assert isinstance(response.json()["response"], str)
     log("Completed test: test_query_endpoint", "info")
+
+
+def test_query_batch_endpoint():
+    log("Starting test: test_query_batch_endpoint", "info")
+    queries = [
+        {"query": "What was the total revenue for the company in FY 2023?", "company_id": 642},
+        {"query": "What was the gross margin for the company in FY 2022?" , "company_id": 642},
+        {"query": "What was the total revenue for the company in FY 2023?", "company_id": 4542}
+    ]
+    response = client.post("/query/batch", json={"requests": queries})
+    assert response.status_code == 200
+    assert len(response.json()["responses"]) == len(queries)
+    log("Completed test: test_query_batch_endpoint", "info")
+
+
+def test_query_compare_endpoint():
+    log("Starting test: test_query_compare_endpoint", "info")
+    response = client.post("/query/compare", json={"query": "Compare the revenue growth in FY 2023", "company_ids": [642, 4542]})
+    assert response.status_code == 200
+    assert isinstance(response.json()["response"], str)
+
+    response = client.post("/query/compare", json={"query": "Compare the revenue growth in FY 2023", "company_ids": [642]})
+    assert response.status_code == 422
+    log("Completed test: test_query_compare_endpoint", "info")
+
+
+def test_thread_pool_sized_for_admission_queue():
+    log("Starting test: test_thread_pool_sized_for_admission_queue", "info")
+    with TestClient(app) as started_client:
+        thread_count = started_client.portal.call(lambda: anyio.to_thread.current_default_thread_limiter().total_tokens)
+    assert thread_count >= admission_controller.max_thread_count()
+    log("Completed test: test_thread_pool_sized_for_admission_queue", "info")